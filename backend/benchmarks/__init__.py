@@ -0,0 +1,10 @@
+"""
+Standalone benchmarks for the backend.
+
+Run them from the backend directory with the same .env the app uses, e.g.
+
+    python -m benchmarks.bench_pipeline
+
+Every benchmark runs against a throwaway test database and a stubbed LLM,
+so no network access or API key is needed.
+"""
@@ -0,0 +1,89 @@
+import os
+import time
+import tempfile
+import statistics
+import contextlib
+
+import django
+
+
+def setup_django():
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "djangoapp.settings")
+    django.setup()
+
+
+@contextlib.contextmanager
+def test_database(on_disk=False):
+    """
+    Create a throwaway test database and drop it on exit.
+
+    on_disk keeps sqlite in a temporary file so several threads can write to it.
+    """
+    from django.db import connection
+    from django.test.utils import setup_test_environment, teardown_test_environment
+
+    tmp_dir = None
+    if on_disk and connection.vendor == "sqlite":
+        tmp_dir = tempfile.TemporaryDirectory()
+        connection.settings_dict["TEST"]["NAME"] = os.path.join(
+            tmp_dir.name, "bench.sqlite3"
+        )
+
+    setup_test_environment()
+    old_name = connection.creation.create_test_db(verbosity=0, serialize=False)
+    try:
+        yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        teardown_test_environment()
+        if tmp_dir:
+            tmp_dir.cleanup()
+
+
+def measure(fn, iterations, warmup=5):
+    """
+    Call fn repeatedly and return the duration of every call in seconds
+    """
+    for _ in range(warmup):
+        fn()
+
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def summarize(samples):
+    """
+    mean/p50/p95/p99 of samples, in milliseconds
+    """
+    return {
+        "n": len(samples),
+        "mean": statistics.fmean(samples) * 1000,
+        "p50": percentile(samples, 50) * 1000,
+        "p95": percentile(samples, 95) * 1000,
+        "p99": percentile(samples, 99) * 1000,
+    }
+
+
+def report(title, rows):
+    """
+    Print a table of (label, summary) rows
+    """
+    print(f"\n{title}")
+    print(
+        f"{'case':<32}{'n':>8}{'mean ms':>12}{'p50 ms':>12}{'p95 ms':>12}{'p99 ms':>12}"
+    )
+    for label, stats in rows:
+        print(
+            f"{label:<32}{stats['n']:>8}{stats['mean']:>12.3f}{stats['p50']:>12.3f}"
+            f"{stats['p95']:>12.3f}{stats['p99']:>12.3f}"
+        )
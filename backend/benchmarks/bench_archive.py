@@ -0,0 +1,180 @@
+"""
+Cold storage of inactive chats (chats.archive): size of the message
+tables and their indexes before and after archive_chats moves the idle
+share of the chats into compressed ChatArchive rows, the archiving rate,
+and the latency of opening a live chat against opening an archived one
+(which restores it first).
+
+    python -m benchmarks.bench_archive --chats 2000 --messages 50
+"""
+
+import io
+import time
+import random
+import argparse
+from datetime import timedelta
+
+from benchmarks.base import setup_django, test_database, summarize, report
+
+WORDS = (
+    "weather rain sunny cloudy storm wind humid forecast temperature snow "
+    "umbrella jacket london paris tokyo dhaka degrees tomorrow today cold "
+    "the is in and what will be like it should i take a for this week"
+).split()
+
+
+def table_sizes():
+    """
+    bytes on disk of the message, context and archive tables with their
+    indexes (and on sqlite the full-text index of the messages)
+    """
+    from django.db import connection
+
+    groups = {
+        "messages": "chats_message",
+        "contexts": "chats_chatcontext",
+        "archives": "chats_chatarchive",
+    }
+    sizes = dict.fromkeys(groups, 0)
+    with connection.cursor() as cursor:
+        if connection.vendor == "postgresql":
+            for group, table in groups.items():
+                cursor.execute("SELECT pg_total_relation_size(%s)", [table])
+                sizes[group] = cursor.fetchone()[0]
+            return sizes
+
+        cursor.execute(
+            "SELECT m.tbl_name, s.name, SUM(s.pgsize) FROM dbstat s "
+            "LEFT JOIN sqlite_master m ON m.name = s.name GROUP BY s.name"
+        )
+        for table, name, size in cursor.fetchall():
+            table = table or name
+            for group, prefix in groups.items():
+                if table.startswith(prefix):
+                    sizes[group] += size
+    return sizes
+
+
+def seed(args):
+    from django.utils import timezone
+    from users.models import User
+    from chats.models import Chat, Message
+
+    rng = random.Random(args.seed)
+    users = User.objects.bulk_create(
+        User(telegram_id=300000 + i, username=f"archive{i}")
+        for i in range(max(1, args.chats // 5))
+    )
+    chats = Chat.objects.bulk_create_with_context(
+        [
+            Chat(user=users[i % len(users)], title=f"Chat {i}")
+            for i in range(args.chats)
+        ],
+        context_data="user asked about the weather in london and paris " * 10,
+    )
+    now = timezone.now()
+    batch = []
+    for chat in chats:
+        start = now - timedelta(days=rng.randint(1, 400))
+        for i in range(args.messages):
+            batch.append(
+                Message(
+                    chat=chat,
+                    sender="user" if i % 2 == 0 else "model",
+                    content=" ".join(rng.choices(WORDS, k=rng.randint(10, 80))),
+                    timestamp=start + timedelta(minutes=i),
+                )
+            )
+            if len(batch) == 5000:
+                Message.objects.bulk_create(batch)
+                batch = []
+    Message.objects.bulk_create(batch)
+
+    # idle_share of the chats were last used long ago
+    idle = set(rng.sample(range(len(chats)), int(len(chats) * args.idle_share)))
+    for i, chat in enumerate(chats):
+        days = rng.randint(args.days + 1, 2 * args.days + 400) if i in idle else 1
+        chat.updated_at = now - timedelta(days=days)
+    Chat.objects.bulk_update(chats, ["updated_at"], batch_size=1000)
+    return chats, idle
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--chats", type=int, default=2000)
+    parser.add_argument("--messages", type=int, default=50, help="messages per chat")
+    parser.add_argument("--idle-share", type=float, default=0.8)
+    parser.add_argument("--days", type=int, default=90)
+    parser.add_argument("--batch-size", type=int, default=200)
+    parser.add_argument("--iterations", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    setup_django()
+
+    from django.db import connection
+    from django.core.management import call_command
+    from chats import service
+    from chats.archive import archive_chat, idle_since
+
+    with test_database(on_disk=True):
+        chats, idle = seed(args)
+
+        def vacuum():
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    "VACUUM" if connection.vendor == "sqlite" else "VACUUM FULL"
+                )
+
+        vacuum()
+        before = table_sizes()
+        start = time.perf_counter()
+        call_command(
+            "archive_chats",
+            "--days",
+            str(args.days),
+            "--batch-size",
+            str(args.batch_size),
+            stdout=io.StringIO(),
+        )
+        elapsed = time.perf_counter() - start
+        vacuum()
+        after = table_sizes()
+
+        live = [chats[i] for i in range(len(chats)) if i not in idle]
+        archived = [chats[i] for i in sorted(idle)]
+        rng = random.Random(args.seed)
+        rows = []
+        samples = []
+        for _ in range(args.iterations):
+            chat = rng.choice(live)
+            start = time.perf_counter()
+            service.get_single_chat(chat.user, chat.unique_hex_id)
+            samples.append(time.perf_counter() - start)
+        rows.append(("open live chat", summarize(samples)))
+
+        samples = []
+        for _ in range(args.iterations):
+            chat = rng.choice(archived)
+            start = time.perf_counter()
+            service.get_single_chat(chat.user, chat.unique_hex_id)
+            samples.append(time.perf_counter() - start)
+            # put it back for the next draw, not timed
+            archive_chat(chat.pk, idle_since(-1))
+        rows.append(("open archived chat (restore)", summarize(samples)))
+
+    report(
+        f"{args.chats} chats x {args.messages} messages on {connection.vendor}, "
+        f"{len(idle)} idle chats archived in {elapsed:.1f}s "
+        f"({len(idle) / elapsed:,.0f} chats/s)",
+        rows,
+    )
+    print(f"\n{'table':<12}{'before MiB':>12}{'after MiB':>12}")
+    for group in before:
+        print(f"{group:<12}{before[group] / 2**20:>12.1f}{after[group] / 2**20:>12.1f}")
+    total_before, total_after = sum(before.values()), sum(after.values())
+    print(f"{'total':<12}{total_before / 2**20:>12.1f}{total_after / 2**20:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
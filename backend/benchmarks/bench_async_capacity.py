@@ -0,0 +1,142 @@
+"""
+Concurrent request capacity of the sync (gunicorn WSGI workers) and async
+(ASGI event loop) chat paths against a stub LLM that sleeps.
+
+The sync deployment is modelled as a pool of --workers threads calling
+chats.service.inbox, the async one as a single event loop awaiting
+chats.service.ainbox. Both get --requests messages at once.
+
+    python -m benchmarks.bench_async_capacity --requests 100 --latency 0.2
+"""
+
+import json
+import time
+import asyncio
+import argparse
+import threading
+from unittest.mock import patch
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.base import setup_django, test_database
+
+STUB_RESPONSE = json.dumps(
+    {"reply": "It is sunny in Dhaka.", "context_summary": "User asked about Dhaka."}
+)
+
+
+class InFlight:
+    """
+    counts LLM calls running at the same time
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.current = 0
+        self.peak = 0
+
+    def enter(self):
+        with self.lock:
+            self.current += 1
+            self.peak = max(self.peak, self.current)
+
+    def exit(self):
+        with self.lock:
+            self.current -= 1
+
+
+def seed(count):
+    from users.models import User
+    from chats.models import Chat, ChatContext
+
+    user = User.objects.create(telegram_id=1, username="bench")
+    chats = []
+    for i in range(count):
+        chat = Chat.objects.create(user=user, title=f"Bench Chat {i}")
+        ChatContext.objects.create(chat=chat, context_data="no context availabl")
+        chats.append(chat)
+    return user, chats
+
+
+def run_sync(user, chats, workers, latency):
+    from django.db import connection
+    from chats import service
+    from utils import ai
+
+    in_flight = InFlight()
+
+    def stub_chat(self, query, context_summary):
+        in_flight.enter()
+        time.sleep(latency)
+        in_flight.exit()
+        return STUB_RESPONSE
+
+    def send(chat):
+        try:
+            return service.inbox(
+                {"chat_id": chat.id, "content": "hi"}, user
+            ).status_code
+        finally:
+            connection.close()
+
+    with patch.object(ai.WeatherInformationPipeline, "chat", stub_chat):
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            statuses = list(pool.map(send, chats))
+        elapsed = time.perf_counter() - start
+    return statuses, elapsed, in_flight.peak
+
+
+def run_async(user, chats, latency):
+    from chats import service
+    from utils import ai
+
+    in_flight = InFlight()
+
+    async def stub_achat(self, query, context_summary):
+        in_flight.enter()
+        await asyncio.sleep(latency)
+        in_flight.exit()
+        return STUB_RESPONSE
+
+    async def send_all():
+        return await asyncio.gather(
+            *(service.ainbox({"chat_id": c.id, "content": "hi"}, user) for c in chats)
+        )
+
+    with patch.object(ai.WeatherInformationPipeline, "achat", stub_achat):
+        start = time.perf_counter()
+        responses = asyncio.run(send_all())
+        elapsed = time.perf_counter() - start
+    return [r.status_code for r in responses], elapsed, in_flight.peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--latency", type=float, default=0.2, help="stub LLM seconds")
+    parser.add_argument("--workers", type=int, default=4, help="sync gunicorn workers")
+    args = parser.parse_args()
+
+    setup_django()
+
+    with test_database(on_disk=True):
+        user, chats = seed(args.requests)
+        results = [
+            (
+                f"sync, {args.workers} workers",
+                run_sync(user, chats, args.workers, args.latency),
+            ),
+            ("async, 1 worker", run_async(user, chats, args.latency)),
+        ]
+
+    print(f"\n{args.requests} concurrent messages, stub LLM latency {args.latency}s")
+    print(
+        f"{'deployment':<24}{'ok':>6}{'wall s':>10}{'req/s':>10}{'peak in-flight':>16}"
+    )
+    for label, (statuses, elapsed, peak) in results:
+        ok = sum(1 for status in statuses if status == 200)
+        print(f"{label:<24}{ok:>6}{elapsed:>10.2f}{ok / elapsed:>10.1f}{peak:>16}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""
+Auth overhead per request of check_tg_data_string, with and without the
+verified session cache, plus the cost of deriving the HMAC secret on
+every request as the decorator used to.
+
+    python -m benchmarks.bench_auth --requests 2000
+"""
+
+import hmac
+import json
+import time
+import hashlib
+import argparse
+from urllib.parse import urlencode
+
+from benchmarks.base import setup_django, test_database, measure, summarize, report
+
+
+def sign_init_data(bot_token, user):
+    fields = {
+        "auth_date": str(int(time.time())),
+        "query_id": "AAEPsHoIAwAAAA-bench",
+        "user": json.dumps(user),
+    }
+    data_check_string = "\n".join(f"{k}={v}" for k, v in sorted(fields.items()))
+    secret_key = hmac.new(b"WebAppData", bot_token.encode(), hashlib.sha256).digest()
+    fields["hash"] = hmac.new(
+        secret_key, data_check_string.encode(), hashlib.sha256
+    ).hexdigest()
+    return urlencode(fields)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=2000)
+    args = parser.parse_args()
+
+    setup_django()
+
+    from django.http import HttpRequest
+    from utils import helper
+
+    def view(request, current_user):
+        return current_user
+
+    wrapped_view = helper.check_tg_data_string(view)
+    init_data = sign_init_data(helper.BOT_TOKEN, {"id": 1, "username": "bench"})
+    request = HttpRequest()
+    request.headers = {"X-Telegram-Init-Data": init_data}
+
+    def derive_secret():
+        hmac.new(b"WebAppData", helper.BOT_TOKEN.encode(), hashlib.sha256).digest()
+
+    def cached_secret():
+        helper.webapp_secret_key(helper.BOT_TOKEN)
+
+    def uncached_request():
+        helper.verified_sessions.clear()
+        wrapped_view(request)
+
+    def cached_request():
+        wrapped_view(request)
+
+    with test_database():
+        rows = [
+            (
+                "derive secret per request",
+                summarize(measure(derive_secret, args.requests)),
+            ),
+            ("cached secret", summarize(measure(cached_secret, args.requests))),
+            (
+                "verify + db, no session cache",
+                summarize(measure(uncached_request, args.requests)),
+            ),
+            ("session cache hit", summarize(measure(cached_request, args.requests))),
+        ]
+
+    report("Telegram init data auth overhead per request", rows)
+
+
+if __name__ == "__main__":
+    main()
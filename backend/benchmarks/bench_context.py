@@ -0,0 +1,94 @@
+"""
+Prompt size over a simulated conversation: the context sent with every
+message when the whole history is replayed versus summary + window with
+compaction (chats.context). The model is stubbed, its summaries are
+sized like real ones (previous summary plus a fifth of the folded text,
+capped at CONTEXT_SUMMARY_MAX_CHARS).
+
+    python -m benchmarks.bench_context --turns 200
+"""
+
+import json
+import argparse
+from unittest.mock import patch
+
+from benchmarks.base import setup_django, test_database
+
+USER_MESSAGE = (
+    "What is the weather like in Dhaka today, and should I carry an umbrella?"
+)
+MODEL_REPLY = (
+    "It is 31°C and humid in Dhaka with scattered clouds. There is a 40% chance "
+    "of rain in the evening, so a small umbrella is a good idea. Winds are light "
+    "from the south, and the humidity will stay around 75% for the rest of the day."
+)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--turns", type=int, default=200)
+    args = parser.parse_args()
+
+    setup_django()
+
+    from users.models import User
+    from chats import service
+    from chats.context import CONTEXT_SUMMARY_MAX_CHARS, estimate_tokens
+    from chats.models import Chat, ChatContext
+    from jobs.queue import claim_jobs, run_job
+
+    prompts = []
+    summaries = []
+
+    def chat(self, query, context_summary):
+        prompts.append(len(context_summary) + len(query))
+        return json.dumps({"reply": MODEL_REPLY})
+
+    def summarize_context(self, context_summary, transcript, max_chars=1500):
+        summaries.append(len(transcript))
+        size = min(max_chars, len(context_summary) + len(transcript) // 5)
+        return "s" * size
+
+    with test_database(), patch(
+        "utils.ai.WeatherInformationPipeline.chat", chat
+    ), patch(
+        "utils.ai.WeatherInformationPipeline.summarize_context", summarize_context
+    ):
+        user = User.objects.create(telegram_id=1, username="bench")
+        chat_row = Chat.objects.create(user=user, title="Bench Chat")
+        ChatContext.objects.create(
+            chat=chat_row, context_data=ChatContext.DEFAULT_CONTEXT
+        )
+        data = {"chat_id": chat_row.id, "content": USER_MESSAGE}
+        for _ in range(args.turns):
+            service.inbox(data, user)
+            # queued compactions run before the next turn, as a worker would
+            for job in claim_jobs("bench", limit=10):
+                run_job(job)
+
+    turn_size = len(USER_MESSAGE) + len(MODEL_REPLY) + len("user: \nmodel: \n")
+    base = len(ChatContext.DEFAULT_CONTEXT) + len(USER_MESSAGE)
+
+    print(f"\nPrompt context over {args.turns} turns (characters, ~tokens)")
+    print(f"{'turn':>6}{'full history':>16}{'compacted':>14}{'~tokens':>10}")
+    checkpoints = sorted(
+        {1, 10, 25, 50, 100, 150, args.turns} & set(range(1, args.turns + 1))
+    )
+    for turn in checkpoints:
+        full = base + turn_size * (turn - 1)
+        compacted = prompts[turn - 1]
+        print(f"{turn:>6}{full:>16}{compacted:>14}" f"{estimate_tokens(compacted):>10}")
+
+    full_total = sum(base + turn_size * t for t in range(args.turns))
+    print(
+        f"\ntotal prompt chars: full history {full_total}, compacted {sum(prompts)} "
+        f"({sum(prompts) / full_total:.1%})"
+    )
+    print(
+        f"max compacted prompt: {max(prompts)} chars, "
+        f"summarization calls: {len(summaries)} (summary cap {CONTEXT_SUMMARY_MAX_CHARS})"
+    )
+
+
+if __name__ == "__main__":
+    main()
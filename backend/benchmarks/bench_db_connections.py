@@ -0,0 +1,101 @@
+"""
+Per request database connection overhead of an authenticated API call
+(GET chat-list) through the WSGI handler, as gunicorn runs it, with a new
+connection for every request (CONN_MAX_AGE=0, the old setting), with
+persistent connections and health checks, and with django's psycopg 3
+pool when the database is postgres and psycopg[pool] is installed.
+
+Uses the configured database: sqlite with DEBUG=True, where connecting is
+cheap, postgres with DEBUG=False and the POSTGRES_* settings, where the
+difference shows.
+
+    python -m benchmarks.bench_db_connections --requests 500
+    DEBUG=False python -m benchmarks.bench_db_connections
+"""
+
+import argparse
+from importlib.util import find_spec
+
+from benchmarks.base import setup_django, test_database, measure, summarize, report
+from benchmarks.bench_auth import sign_init_data
+
+
+def configure(connection, max_age, health_checks=False, pool=None):
+    connection.close()
+    if connection.vendor == "postgresql":
+        connection.close_pool()
+    connection.settings_dict["CONN_MAX_AGE"] = max_age
+    connection.settings_dict["CONN_HEALTH_CHECKS"] = health_checks
+    options = connection.settings_dict.setdefault("OPTIONS", {})
+    options.pop("pool", None)
+    if pool:
+        options["pool"] = pool
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=500)
+    args = parser.parse_args()
+
+    setup_django()
+
+    from django.db import connection
+    from django.core.handlers.wsgi import WSGIHandler
+    from django.test import RequestFactory
+    from utils.db import CONNECTIONS_OPENED
+    from utils.helper import BOT_TOKEN
+
+    with test_database(on_disk=True):
+        handler = WSGIHandler()
+        factory = RequestFactory()
+        init_data = sign_init_data(
+            BOT_TOKEN, {"id": 4242, "first_name": "bench", "username": "bench"}
+        )
+
+        def api_call():
+            environ = factory.get(
+                "/api-v2/chat/chat-list/", HTTP_X_TELEGRAM_INIT_DATA=init_data
+            ).environ
+            response = handler(environ, lambda status, headers: None)
+            b"".join(response)
+            # fires request_finished, which closes or keeps the connection
+            response.close()
+
+        def connect():
+            connection.connect()
+            connection.close()
+
+        cases = [
+            ("new connection per request", {"max_age": 0}),
+            ("persistent + health checks", {"max_age": 60, "health_checks": True}),
+        ]
+        if connection.vendor == "postgresql" and find_spec("psycopg_pool"):
+            cases.append(
+                (
+                    "psycopg pool",
+                    {"max_age": 0, "health_checks": True, "pool": {"max_size": 4}},
+                )
+            )
+
+        rows = []
+        opened = []
+        configure(connection, 0)
+        rows.append(("connect + close", summarize(measure(connect, args.requests))))
+        for label, options in cases:
+            configure(connection, **options)
+            api_call()
+            before = CONNECTIONS_OPENED.value(alias="default")
+            rows.append((label, summarize(measure(api_call, args.requests))))
+            count = CONNECTIONS_OPENED.value(alias="default") - before
+            # measure() runs 5 warmup calls too
+            opened.append((label, count / (args.requests + 5)))
+        configure(connection, 0)
+
+    report(f"{args.requests} GET chat-list on {connection.vendor}", rows)
+    print(f"\n{'case':<32}{'connections per request':>24}")
+    for label, per_request in opened:
+        print(f"{label:<32}{per_request:>24.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""
+Deleting a chat with --messages messages: the old synchronous
+chat.delete() against the soft delete the endpoint does now plus the
+batched purge that runs later in a job worker. Reports how long the
+request takes and the longest single statement, which is about how long
+other writers can be kept waiting.
+
+    python -m benchmarks.bench_delete --messages 50000
+"""
+
+import time
+import argparse
+import contextlib
+
+from benchmarks.base import setup_django, test_database
+
+
+@contextlib.contextmanager
+def statement_timer(durations):
+    """
+    append the duration of every sql statement run inside to durations
+    """
+    from django.db import connection
+
+    def wrapper(execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            durations.append(time.perf_counter() - start)
+
+    with connection.execute_wrapper(wrapper):
+        yield
+
+
+def seed(user, messages, content_length):
+    from chats.models import Chat, ChatContext, Message
+
+    chat = Chat.objects.create(user=user, title="Long chat")
+    ChatContext.objects.create(chat=chat, context_data="summary")
+    content = ("snow storm in oslo tomorrow " * content_length)[:content_length]
+    Message.objects.bulk_create(
+        (
+            Message(chat=chat, sender="user" if i % 2 else "model", content=content)
+            for i in range(messages)
+        ),
+        batch_size=5000,
+    )
+    return chat
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--messages", type=int, default=50000)
+    parser.add_argument("--content-length", type=int, default=300)
+    parser.add_argument("--batch-size", type=int, default=None)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    setup_django()
+
+    from django.db import connection
+    from users.models import User
+    from chats import service
+    from chats.purge import PURGE_BATCH_SIZE, purge_chat
+
+    batch_size = args.batch_size or PURGE_BATCH_SIZE
+    rows = []
+    with test_database(on_disk=True):
+        user = User.objects.create(telegram_id=1, username="delete")
+        for _ in range(args.repeat):
+            chat = seed(user, args.messages, args.content_length)
+            durations = []
+            with statement_timer(durations):
+                start = time.perf_counter()
+                chat.delete()
+                elapsed = time.perf_counter() - start
+            rows.append(("chat.delete() in the request", elapsed, max(durations)))
+
+            chat = seed(user, args.messages, args.content_length)
+            durations = []
+            with statement_timer(durations):
+                start = time.perf_counter()
+                response = service.delete_user_chat(user, chat.id)
+                elapsed = time.perf_counter() - start
+            assert response.status_code == 204
+            rows.append(("soft delete request", elapsed, max(durations)))
+
+            durations = []
+            with statement_timer(durations):
+                start = time.perf_counter()
+                purge_chat(chat.id, batch_size)
+                elapsed = time.perf_counter() - start
+            rows.append(
+                (f"purge job, batches of {batch_size}", elapsed, max(durations))
+            )
+
+    print(
+        f"\ndeleting a chat of {args.messages} messages on {connection.vendor}, "
+        f"best of {args.repeat}"
+    )
+    print(f"{'case':<36}{'total ms':>12}{'longest statement ms':>24}")
+    best = {}
+    for label, elapsed, longest in rows:
+        if label not in best or elapsed < best[label][0]:
+            best[label] = (elapsed, longest)
+    for label, (elapsed, longest) in best.items():
+        print(f"{label:<36}{elapsed * 1000:>12.1f}{longest * 1000:>24.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+Peak Python memory and time of exporting a chat history with the
+streaming export (chats.export) against loading it the way single-chat
+does, for growing history sizes.
+
+    python -m benchmarks.bench_export --sizes 10000 50000 200000
+"""
+
+import time
+import argparse
+import tracemalloc
+
+from benchmarks.base import setup_django, test_database
+
+
+def peak(fn):
+    """
+    (seconds, peak traced MiB) of one call
+    """
+    tracemalloc.start()
+    start = time.perf_counter()
+    fn()
+    elapsed = time.perf_counter() - start
+    _, peak_bytes = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak_bytes / 2**20
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 50000, 200000])
+    parser.add_argument("--content-length", type=int, default=300)
+    args = parser.parse_args()
+
+    setup_django()
+
+    from users.models import User
+    from chats.models import Chat, Message
+    from chats import service
+    from chats.export import export_stream
+
+    rows = []
+    with test_database(on_disk=True):
+        user = User.objects.create(telegram_id=1, username="export")
+        chat = Chat.objects.create(user=user)
+        content = ("weather report " * args.content_length)[: args.content_length]
+        stored = 0
+        for size in sorted(args.sizes):
+            Message.objects.bulk_create(
+                (
+                    Message(chat=chat, sender="user", content=content)
+                    for _ in range(size - stored)
+                ),
+                batch_size=5000,
+            )
+            stored = size
+
+            def single_chat():
+                service.get_single_chat(user, chat.unique_hex_id).content
+
+            def stream(fmt, compress=False):
+                def consume():
+                    for _ in export_stream(user, fmt, compress):
+                        pass
+
+                return consume
+
+            for label, fn in (
+                ("single-chat (whole history)", single_chat),
+                ("export ndjson", stream("ndjson")),
+                ("export csv", stream("csv")),
+                ("export ndjson gzip", stream("ndjson", True)),
+            ):
+                elapsed, mib = peak(fn)
+                rows.append((size, label, elapsed, mib))
+
+    print(f"\nexport of one chat, {args.content_length} character messages")
+    print(f"{'messages':>10}  {'case':<32}{'seconds':>10}{'peak MiB':>12}")
+    for size, label, elapsed, mib in rows:
+        print(f"{size:>10}  {label:<32}{elapsed:>10.2f}{mib:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+"""
+Tail latency and error rate of LLM calls through utils.llm.ResilientCaller
+against a fake provider that injects latency and errors.
+
+Every call takes --latency seconds with some jitter; --stall-rate of the
+calls hang for --stall seconds and --error-rate of them fail. The same
+load runs with a bare call, with retries, with retries plus hedging, and
+with the primary model down behind a fallback model.
+
+    python -m benchmarks.bench_llm_resilience --calls 300 --threads 8
+"""
+
+import time
+import random
+import logging
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.base import setup_django, summarize, report
+
+
+class FakeProvider:
+    """
+    LLM stand-in with injected latency, stalls and errors per model
+    """
+
+    def __init__(self, latency, stall, stall_rate, error_rate, down=(), seed=7):
+        self.latency = latency
+        self.stall = stall
+        self.stall_rate = stall_rate
+        self.error_rate = error_rate
+        self.down = set(down)
+        self.calls = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def __call__(self, model):
+        with self._lock:
+            self.calls += 1
+            roll = self._random.random()
+            jitter = self._random.uniform(0.8, 1.2)
+
+        if model in self.down:
+            time.sleep(self.latency / 10)
+            raise Exception(f"{model} 503 service unavailable")
+        if roll < self.stall_rate:
+            time.sleep(self.stall)
+        else:
+            time.sleep(self.latency * jitter)
+        if roll > 1 - self.error_rate:
+            raise Exception(f"{model} 502 bad gateway")
+        return "ok"
+
+
+def run(caller, provider, calls, threads):
+    """
+    latencies of the successful calls and the number of failed ones
+    """
+    samples = []
+    failures = [0]
+    lock = threading.Lock()
+
+    def one():
+        start = time.perf_counter()
+        try:
+            caller.call(provider)
+        except Exception:
+            with lock:
+                failures[0] += 1
+            return
+        with lock:
+            samples.append(time.perf_counter() - start)
+
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        for _ in range(calls):
+            pool.submit(one)
+    return samples, failures[0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--calls", type=int, default=300)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--latency", type=float, default=0.02)
+    parser.add_argument("--stall", type=float, default=0.5)
+    parser.add_argument("--stall-rate", type=float, default=0.05)
+    parser.add_argument("--error-rate", type=float, default=0.05)
+    args = parser.parse_args()
+
+    setup_django()
+    # every injected failure would log a warning
+    logging.disable(logging.WARNING)
+
+    from utils.llm import ResilientCaller
+
+    def provider(down=()):
+        return FakeProvider(
+            args.latency, args.stall, args.stall_rate, args.error_rate, down
+        )
+
+    hedge_after = args.latency * 3
+    cases = [
+        ("bare call", ["primary"], {"max_retries": 0}, ()),
+        ("retries", ["primary"], {"max_retries": 2}, ()),
+        (
+            "retries + hedging",
+            ["primary"],
+            {"max_retries": 2, "hedge": True, "hedge_min_seconds": hedge_after},
+            (),
+        ),
+        (
+            "primary down, fallback",
+            ["primary", "backup"],
+            {"max_retries": 2, "breaker_failures": 5},
+            ("primary",),
+        ),
+    ]
+
+    rows = []
+    outcomes = []
+    for label, models, options, down in cases:
+        caller = ResilientCaller(
+            models,
+            backoff=args.latency,
+            hedge=options.pop("hedge", False),
+            **options,
+        )
+        fake = provider(down)
+        samples, failures = run(caller, fake, args.calls, args.threads)
+        rows.append((label, summarize(samples)))
+        outcomes.append((label, failures, fake.calls))
+
+    report(
+        f"{args.calls} LLM calls, {args.latency * 1000:.0f} ms typical, "
+        f"{args.stall_rate:.0%} stall {args.stall * 1000:.0f} ms, "
+        f"{args.error_rate:.0%} errors",
+        rows,
+    )
+    print(f"\n{'case':<32}{'failed':>8}{'provider calls':>16}")
+    for label, failures, provider_calls in outcomes:
+        print(f"{label:<32}{failures:>8}{provider_calls:>16}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""
+Latency of loading chat history: the full single-chat payload versus
+keyset pages from the messages endpoint, on a chat seeded with
+--messages rows (plus --noise rows spread over other chats).
+
+    python -m benchmarks.bench_message_history --messages 10000
+"""
+
+import argparse
+from datetime import timedelta
+
+from benchmarks.base import setup_django, test_database, measure, summarize, report
+
+
+def seed(user, count, noise):
+    from django.utils import timezone
+    from chats.models import Chat, Message
+
+    chat = Chat.objects.create(user=user, title="Long Chat")
+    others = [Chat.objects.create(user=user, title=f"Other {i}") for i in range(10)]
+    start = timezone.now() - timedelta(days=30)
+
+    def rows():
+        for i in range(count):
+            yield Message(
+                chat=chat,
+                sender="user" if i % 2 == 0 else "model",
+                content=f"message number {i} " * 8,
+                timestamp=start + timedelta(seconds=i),
+            )
+        for i in range(noise):
+            yield Message(
+                chat=others[i % len(others)],
+                sender="user",
+                content=f"noise {i}",
+                timestamp=start + timedelta(seconds=i),
+            )
+
+    batch = []
+    for message in rows():
+        batch.append(message)
+        if len(batch) == 5000:
+            Message.objects.bulk_create(batch)
+            batch = []
+    Message.objects.bulk_create(batch)
+    return chat
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--messages", type=int, default=10000)
+    parser.add_argument("--noise", type=int, default=20000)
+    parser.add_argument("--page-size", type=int, default=30)
+    parser.add_argument("--iterations", type=int, default=30)
+    args = parser.parse_args()
+
+    setup_django()
+
+    from users.models import User
+    from chats import service
+    from chats.pagination import encode_cursor
+
+    with test_database():
+        user = User.objects.create(telegram_id=1, username="bench")
+        chat = seed(user, args.messages, args.noise)
+        hex_id = chat.unique_hex_id
+
+        # cursor pointing at the oldest page
+        oldest = chat.messages.order_by("timestamp", "id")[args.page_size]
+        deep_cursor = encode_cursor(oldest.timestamp, oldest.id)
+
+        def full_history():
+            service.get_single_chat(user, hex_id)
+
+        def first_page():
+            service.get_chat_messages(user, hex_id, None, args.page_size)
+
+        def oldest_page():
+            service.get_chat_messages(user, hex_id, deep_cursor, args.page_size)
+
+        n = args.iterations
+        rows = [
+            ("single-chat, all messages", summarize(measure(full_history, n, 2))),
+            (f"first page ({args.page_size})", summarize(measure(first_page, n))),
+            (f"oldest page ({args.page_size})", summarize(measure(oldest_page, n))),
+        ]
+
+    report(f"Chat history with {args.messages} messages", rows)
+
+
+if __name__ == "__main__":
+    main()
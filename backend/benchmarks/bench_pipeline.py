@@ -0,0 +1,82 @@
+"""
+Per-message overhead of building a WeatherInformationPipeline for every
+message versus reusing the per-process registry (utils.ai.get_pipeline).
+
+The LLM itself is stubbed, so the numbers only contain pipeline setup,
+validation and DB work done by chats.service.inbox.
+
+    python -m benchmarks.bench_pipeline --messages 200
+"""
+
+import json
+import argparse
+from unittest.mock import patch
+
+from benchmarks.base import setup_django, test_database, measure, summarize, report
+
+STUB_RESPONSE = json.dumps(
+    {"reply": "It is sunny in Dhaka.", "context_summary": "User asked about Dhaka."}
+)
+
+
+def stub_chat(self, query, context_summary):
+    return STUB_RESPONSE
+
+
+def build_per_message():
+    """
+    what inbox did before the registry: init graphbit and build a new pipeline
+    """
+    from graphbit import init
+    from utils.ai import WeatherInformationPipeline
+
+    init(log_level="info", enable_tracing=False)
+    return WeatherInformationPipeline()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--messages", type=int, default=200)
+    args = parser.parse_args()
+
+    setup_django()
+
+    from users.models import User
+    from chats.models import Chat, ChatContext
+    from chats import service
+    from utils import ai
+
+    with test_database(), patch.object(
+        ai.WeatherInformationPipeline, "chat", stub_chat
+    ):
+        user = User.objects.create(telegram_id=1, username="bench")
+        chat = Chat.objects.create(user=user, title="Bench Chat")
+        ChatContext.objects.create(chat=chat, context_data="no context availabl")
+        payload = {"chat_id": chat.id, "content": "weather in Dhaka"}
+
+        def send():
+            response = service.inbox(payload, user)
+            assert response.status_code == 200, response.content
+
+        rows = [
+            (
+                "pipeline build only",
+                summarize(measure(build_per_message, args.messages)),
+            ),
+            (
+                "pipeline registry only",
+                summarize(measure(ai.get_pipeline, args.messages)),
+            ),
+        ]
+
+        with patch("chats.service.get_pipeline", build_per_message):
+            rows.append(
+                ("inbox, new pipeline", summarize(measure(send, args.messages)))
+            )
+        rows.append(("inbox, shared pipeline", summarize(measure(send, args.messages))))
+
+    report("Per-message pipeline overhead (stubbed LLM)", rows)
+
+
+if __name__ == "__main__":
+    main()
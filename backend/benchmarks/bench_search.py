@@ -0,0 +1,142 @@
+"""
+Full-text search (chats.search) against the icontains scan it replaces,
+on a seeded corpus spread over --users users. One heavy user owns
+--heavy-share of all messages, the others share the rest evenly.
+
+Also reports the insert rate with the search index kept in sync by the
+database, the write cost of the index.
+
+    python -m benchmarks.bench_search --messages 1000000
+"""
+
+import time
+import random
+import argparse
+
+from benchmarks.base import setup_django, test_database, measure, summarize, report
+
+WEATHER_WORDS = (
+    "weather rain sunny cloudy storm wind humid forecast temperature snow "
+    "umbrella jacket london paris tokyo dhaka degrees tomorrow today cold"
+).split()
+SYLLABLES = "ka lo mi ra te su no vi pa de lu zo be ti gra mon sel tor an fi".split()
+
+
+def vocabulary(rng, size):
+    words = set(WEATHER_WORDS)
+    while len(words) < size:
+        words.add("".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))))
+    words = sorted(words)
+    rng.shuffle(words)
+    return words
+
+
+def seed(args):
+    """
+    users, the heavy user and the typical user, plus inserts per second
+    """
+    from users.models import User
+    from chats.models import Chat, Message
+
+    rng = random.Random(args.seed)
+    words = vocabulary(rng, args.vocabulary)
+    # zipf like word frequencies, a few words are everywhere
+    weights = [1 / (rank + 1) for rank in range(len(words))]
+
+    users = User.objects.bulk_create(
+        User(telegram_id=100000 + i, username=f"search{i}") for i in range(args.users)
+    )
+    chats = Chat.objects.bulk_create_with_context(
+        [
+            Chat(user=user, title=" ".join(rng.choices(words, weights, k=3)))
+            for user in users
+            for _ in range(args.chats)
+        ]
+    )
+    chats_of = {}
+    for chat in chats:
+        chats_of.setdefault(chat.user_id, []).append(chat)
+
+    heavy = users[0]
+    heavy_messages = int(args.messages * args.heavy_share)
+    start = time.perf_counter()
+    batch = []
+    for i in range(args.messages):
+        user = heavy if i < heavy_messages else users[1 + i % (len(users) - 1)]
+        content = " ".join(rng.choices(words, weights, k=rng.randint(8, 30)))
+        batch.append(
+            Message(
+                chat=rng.choice(chats_of[user.pk]),
+                sender="user" if i % 2 else "model",
+                content=content,
+            )
+        )
+        if len(batch) == 5000:
+            Message.objects.bulk_create(batch)
+            batch = []
+    Message.objects.bulk_create(batch)
+    rate = args.messages / (time.perf_counter() - start)
+
+    return heavy, users[len(users) // 2], words, rate
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--messages", type=int, default=1_000_000)
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--chats", type=int, default=5, help="chats per user")
+    parser.add_argument("--heavy-share", type=float, default=0.05)
+    parser.add_argument("--vocabulary", type=int, default=5000)
+    parser.add_argument("--iterations", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    setup_django()
+
+    from django.db import connection
+    from chats.models import Message
+    from chats.search import search
+
+    with test_database(on_disk=True):
+        heavy, typical, words, rate = seed(args)
+        common, rare = words[0], words[len(words) // 2]
+
+        rows = []
+        matches = []
+        terms = (
+            ("common", common),
+            ("rare", rare),
+            ("two words", f"{common} {words[1]}"),
+        )
+        for who, user in (("heavy", heavy), ("typical", typical)):
+            for kind, term in terms:
+
+                def scan():
+                    queryset = Message.objects.filter(chat__user=user)
+                    for word in term.split():
+                        queryset = queryset.filter(content__icontains=word)
+                    list(queryset.order_by("-timestamp")[:20])
+
+                def indexed():
+                    search(user, term, 20)
+
+                for how, fn in (("icontains", scan), ("search", indexed)):
+                    samples = measure(fn, args.iterations, warmup=2)
+                    rows.append((f"{who} {kind} {how}", summarize(samples)))
+                found = Message.objects.filter(chat__user=user)
+                for word in term.split():
+                    found = found.filter(content__icontains=word)
+                matches.append((f"{who} {kind} '{term}'", found.count()))
+
+    report(
+        f"{args.messages} messages of {args.users} users on {connection.vendor}, "
+        f"heavy user {args.heavy_share:.0%}, inserts with index {rate:,.0f}/s",
+        rows,
+    )
+    print(f"\n{'case':<40}{'matches':>10}")
+    for label, count in matches:
+        print(f"{label:<40}{count:>10}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""
+DRF ModelSerializer + JsonResponse versus the fast serialization layer
+(values() rows, bulk datetime formatting, orjson when installed) for
+message and chat lists of 10, 1k and 10k rows. Each case goes from a
+queryset to encoded response bytes.
+
+    python -m benchmarks.bench_serializers --sizes 10 1000 10000
+"""
+
+import argparse
+from datetime import timedelta
+
+from benchmarks.base import setup_django, test_database, measure, summarize, report
+
+
+def seed(size):
+    from django.utils import timezone
+    from users.models import User
+    from chats.models import Chat, Message
+
+    user = User.objects.create(telegram_id=size, username=f"bench{size}")
+    chats = [Chat(user=user, title=f"Chat {i}") for i in range(size)]
+    for chat in chats:
+        chat.save()
+    start = timezone.now() - timedelta(days=1)
+    Message.objects.bulk_create(
+        (
+            Message(
+                chat=chats[0],
+                sender="user" if i % 2 == 0 else "model",
+                content=f"message number {i} " * 6,
+                timestamp=start + timedelta(seconds=i),
+            )
+            for i in range(size)
+        ),
+        batch_size=5000,
+    )
+    return user, chats[0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 1000, 10000])
+    parser.add_argument("--iterations", type=int, default=20)
+    args = parser.parse_args()
+
+    setup_django()
+
+    from django.http import JsonResponse
+    from chats.models import Chat, Message
+    from chats import fast_serializers
+    from chats.serializers import ChatSerializer, MessageSerializer
+
+    print(f"encoder: {'orjson' if fast_serializers.orjson else 'stdlib json'}")
+    with test_database():
+        for size in args.sizes:
+            user, chat = seed(size)
+            messages = Message.objects.filter(chat=chat).order_by("timestamp")
+            chats = Chat.objects.filter(user=user)
+
+            def drf_messages():
+                data = MessageSerializer(messages.all(), many=True).data
+                JsonResponse({"messages": data})
+
+            def fast_messages():
+                rows = fast_serializers.message_rows(messages.all())
+                fast_serializers.FastJsonResponse({"messages": rows})
+
+            def drf_chats():
+                JsonResponse({"chat_list": ChatSerializer(chats.all(), many=True).data})
+
+            def fast_chats():
+                rows = fast_serializers.chat_rows(chats.all())
+                fast_serializers.FastJsonResponse({"chat_list": rows})
+
+            n = max(3, args.iterations * 1000 // max(size, 1000))
+            report(
+                f"{size} rows",
+                [
+                    ("messages, DRF", summarize(measure(drf_messages, n, 1))),
+                    ("messages, fast", summarize(measure(fast_messages, n, 1))),
+                    ("chats, DRF", summarize(measure(drf_chats, n, 1))),
+                    ("chats, fast", summarize(measure(fast_chats, n, 1))),
+                ],
+            )
+
+
+if __name__ == "__main__":
+    main()
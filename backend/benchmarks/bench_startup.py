@@ -0,0 +1,196 @@
+"""
+Cold start of a Django process: time from spawning the interpreter to
+the response of its first request, split into interpreter start,
+django.setup(), building the WSGI handler and the first request, and the
+heaviest imports on the way as reported by python -X importtime (from an
+extra run, importtime itself slows imports down).
+
+Every run is a fresh process serving one GET chat-list/ (signed init
+data, sqlite on disk), optionally after warmup (utils.warmup), then a
+second request. Also reports whether graphbit and requests were loaded.
+
+    python -m benchmarks.bench_startup --repeat 10
+    python -m benchmarks.bench_startup --warmup
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import statistics
+import subprocess
+
+from benchmarks.base import setup_django
+from benchmarks.bench_auth import sign_init_data
+
+CHAT_LIST = "/api-v2/chat/chat-list/"
+WATCHED_MODULES = ("graphbit", "requests", "rest_framework", "utils.ai")
+
+
+def child(args):
+    """
+    runs in the spawned process, prints one JSON line of milestones
+    """
+    marks = {"start": time.time()}
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "djangoapp.settings")
+    import django
+
+    django.setup()
+    marks["setup"] = time.time()
+
+    from django.db import connection
+    from django.core.handlers.wsgi import WSGIHandler
+
+    connection.settings_dict["NAME"] = args.database
+    handler = WSGIHandler()
+    marks["handler"] = time.time()
+
+    if args.warmup:
+        from utils.warmup import warmup
+
+        warmup()
+        marks["warmup"] = time.time()
+
+    environ = {
+        "REQUEST_METHOD": "GET",
+        "PATH_INFO": CHAT_LIST,
+        "QUERY_STRING": "",
+        "SERVER_NAME": "localhost",
+        "SERVER_PORT": "80",
+        "HTTP_HOST": "localhost",
+        "HTTP_X_TELEGRAM_INIT_DATA": args.init_data,
+        "wsgi.url_scheme": "http",
+        "wsgi.input": sys.stdin.buffer,
+    }
+    statuses = []
+    for mark in ("first_request", "second_request"):
+        response = handler(
+            dict(environ), lambda status, headers: statuses.append(status)
+        )
+        b"".join(response)
+        response.close()
+        marks[mark] = time.time()
+
+    loaded = {name: name in sys.modules for name in WATCHED_MODULES}
+    print(json.dumps({"marks": marks, "statuses": statuses, "loaded": loaded}))
+
+
+def parse_importtime(stderr):
+    """
+    {module: cumulative microseconds} of the top level imports
+    """
+    imports = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:") :].split("|")
+        if not name.startswith("  "):
+            name = name.strip()
+            imports[name] = imports.get(name, 0) + int(cumulative)
+    return imports
+
+
+def spawn(args, database, init_data, importtime=False):
+    command = [
+        sys.executable,
+        *(["-X", "importtime"] if importtime else []),
+        "-m",
+        "benchmarks.bench_startup",
+        "--child",
+        "--database",
+        database,
+        "--init-data",
+        init_data,
+    ]
+    if args.warmup:
+        command.append("--warmup")
+    spawned = time.time()
+    result = subprocess.run(command, capture_output=True, text=True, check=True)
+    data = json.loads(result.stdout.strip().splitlines()[-1])
+    data["spawned"] = spawned
+    if importtime:
+        data["imports"] = parse_importtime(result.stderr)
+    return data
+
+
+def prepare_database(path):
+    """
+    create the tables in a sqlite file the children can share
+    """
+    setup_django()
+
+    from django.db import connection
+    from django.core.management import call_command
+
+    connection.settings_dict["NAME"] = path
+    call_command("migrate", run_syncdb=True, verbosity=0)
+    connection.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--warmup", action="store_true", help="warm up before serving")
+    parser.add_argument("--top", type=int, default=12, help="heaviest imports shown")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--database", help=argparse.SUPPRESS)
+    parser.add_argument("--init-data", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        return child(args)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        database = os.path.join(tmp_dir, "startup.sqlite3")
+        prepare_database(database)
+        from utils.helper import BOT_TOKEN
+
+        init_data = sign_init_data(
+            BOT_TOKEN, {"id": 4343, "first_name": "cold", "username": "cold"}
+        )
+        runs = [spawn(args, database, init_data) for _ in range(args.repeat)]
+        # importtime slows the imports down, it gets a run of its own
+        imports = spawn(args, database, init_data, importtime=True)["imports"]
+
+    phases = [
+        ("interpreter + django.setup()", "spawned", "setup"),
+        ("wsgi handler", "setup", "handler"),
+    ]
+    if args.warmup:
+        phases.append(("warmup", "handler", "warmup"))
+    phases += [
+        ("first request", "warmup" if args.warmup else "handler", "first_request"),
+        ("second request", "first_request", "second_request"),
+        ("time to first request", "spawned", "first_request"),
+    ]
+
+    def elapsed(run, start, end):
+        marks = dict(run["marks"], spawned=run["spawned"])
+        return (marks[end] - marks[start]) * 1000
+
+    print(
+        f"\ncold start, median of {args.repeat} processes"
+        + (", warmed up before serving" if args.warmup else "")
+        + f", statuses {runs[0]['statuses']}"
+    )
+    print(f"{'phase':<32}{'median ms':>12}{'min ms':>10}")
+    for label, start, end in phases:
+        samples = [elapsed(run, start, end) for run in runs]
+        print(f"{label:<32}{statistics.median(samples):>12.1f}{min(samples):>10.1f}")
+
+    print(f"\n{'loaded after the requests':<32}")
+    for name, loaded in runs[0]["loaded"].items():
+        print(f"  {name:<30}{'yes' if loaded else 'no'}")
+
+    heaviest = sorted(
+        ((micros / 1000, name) for name, micros in imports.items()), reverse=True
+    )[: args.top]
+    print(f"\n{'heaviest top level imports':<32}{'ms':>12}")
+    for ms, name in heaviest:
+        print(f"  {name:<30}{ms:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
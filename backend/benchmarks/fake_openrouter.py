@@ -0,0 +1,164 @@
+"""
+OpenRouter compatible fake LLM for load tests.
+
+Answers POST .../chat/completions after a log-normal latency (median
+--latency-ms, spread --sigma) with replies of about --tokens words, and
+counts the requests it served on GET /stats. Chat prompts get a JSON
+{"reply": ...} answer, title and summary prompts plain text. The latency
+and length sequence is fixed by --seed.
+
+    python -m benchmarks.fake_openrouter --port 8765 --latency-ms 400
+
+Point a deployment at it with LLM_BASE_URL=http://127.0.0.1:8765/v1
+"""
+
+import json
+import math
+import time
+import random
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+WORDS = (
+    "sunny cloudy rain wind humid breeze warm cold mild forecast today "
+    "tomorrow city weather degrees clear storm evening morning light"
+).split()
+
+
+class FakeLlm:
+    """
+    latency, length and content of every fake completion
+    """
+
+    def __init__(self, latency_ms=400, sigma=0.3, tokens=40, seed=1):
+        self.latency_ms = latency_ms
+        self.sigma = sigma
+        self.tokens = tokens
+        self.served = {}
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def completion(self, body):
+        """
+        returns (seconds to wait, response body)
+        """
+        messages = body.get("messages") or [{}]
+        prompt = messages[-1].get("content") or ""
+        if not isinstance(prompt, str):
+            prompt = json.dumps(prompt)
+
+        if body.get("max_tokens") == 1:
+            kind = "ping"
+        elif "chat title generator" in prompt:
+            kind = "title"
+        elif "compress conversations" in prompt:
+            kind = "summary"
+        else:
+            kind = "reply"
+
+        with self._lock:
+            self.served[kind] = self.served.get(kind, 0) + 1
+            delay = self._random.lognormvariate(
+                math.log(self.latency_ms / 1000), self.sigma
+            )
+            size = max(1, int(self._random.gauss(self.tokens, self.tokens / 3)))
+            words = [self._random.choice(WORDS) for _ in range(size)]
+
+        if kind == "reply":
+            content = json.dumps({"reply": " ".join(words)})
+        elif kind == "title":
+            content = " ".join(words[:4]).title()
+        else:
+            content = " ".join(words)
+
+        return delay, {
+            "id": f"fake-{kind}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "fake"),
+            "choices": [
+                {
+                    "index": 0,
+                    "message": {"role": "assistant", "content": content},
+                    "finish_reason": "stop",
+                }
+            ],
+            "usage": {
+                "prompt_tokens": len(prompt.split()),
+                "completion_tokens": size,
+                "total_tokens": len(prompt.split()) + size,
+            },
+        }
+
+
+def make_handler(llm):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            if self.path.rstrip("/") != "/stats":
+                return self.send_json(404, {"error": "not found"})
+            with llm._lock:
+                served = dict(llm.served)
+            self.send_json(200, {"served": served})
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length", 0))
+            body = json.loads(self.rfile.read(length) or b"{}")
+            if not self.path.endswith("/chat/completions"):
+                return self.send_json(404, {"error": "not found"})
+
+            delay, response = llm.completion(body)
+            time.sleep(delay)
+            self.send_json(200, response)
+
+        def send_json(self, status, data):
+            payload = json.dumps(data).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, *args):
+            pass
+
+    return Handler
+
+
+def serve(port=0, **options):
+    """
+    bound server, call serve_forever() on it
+    """
+    server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(FakeLlm(**options)))
+    server.daemon_threads = True
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency-ms", type=float, default=400)
+    parser.add_argument("--sigma", type=float, default=0.3)
+    parser.add_argument("--tokens", type=int, default=40)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    server = serve(
+        args.port,
+        latency_ms=args.latency_ms,
+        sigma=args.sigma,
+        tokens=args.tokens,
+        seed=args.seed,
+    )
+    # the load test reads the url from the first line
+    print(f"http://127.0.0.1:{server.server_port}/v1", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,359 @@
+"""
+Load test of the HTTP API against a fake OpenRouter server.
+
+Starts benchmarks.fake_openrouter in its own process, points the LLM
+pipeline at it through LLM_BASE_URL and signs X-Telegram-Init-Data for
+--users synthetic users. Every user creates a chat, then runs --requests
+calls drawn from a seeded mix of chat-list, new-chat, chatting and
+single-chat. Reports requests per second, latency per call type, SQL
+queries per call type and the LLM calls the fake server answered.
+
+By default the calls go through django.test.Client against a throwaway
+on-disk database, so queries are counted per call. graphbit holds the GIL
+while it waits on the network, in-process users therefore queue behind
+each other's LLM calls. Use --url to send the same mix over HTTP to a
+running multi-worker deployment started with LLM_BASE_URL pointing at
+`python -m benchmarks.fake_openrouter` (the same --bot-token, no query
+counts).
+
+    python -m benchmarks.loadtest --users 10 --requests 20 --latency-ms 200
+    python -m benchmarks.loadtest --json baseline.json
+    python -m benchmarks.loadtest --baseline baseline.json --tolerance 0.2
+    python -m benchmarks.loadtest --url http://127.0.0.1:8000/api-v2 --bot-token ...
+"""
+
+import sys
+import json
+import time
+import random
+import logging
+import argparse
+import threading
+import subprocess
+from pathlib import Path
+
+from benchmarks.base import setup_django, test_database, summarize, report
+from benchmarks.bench_auth import sign_init_data
+
+DEFAULT_MIX = "chat-list=30,single-chat=25,chatting=35,new-chat=10"
+
+QUESTIONS = [
+    "What's the weather in Dhaka?",
+    "Will it rain in London tomorrow?",
+    "Is it windy in Chicago today?",
+    "How humid is Singapore right now?",
+    "Should I take a jacket in Oslo?",
+]
+
+
+def parse_mix(mix):
+    weights = {}
+    for part in mix.split(","):
+        name, _, weight = part.partition("=")
+        weights[name.strip()] = float(weight or 1)
+    unknown = set(weights) - {"chat-list", "single-chat", "chatting", "new-chat"}
+    if unknown:
+        raise SystemExit(f"unknown call types in --mix: {', '.join(sorted(unknown))}")
+    return weights
+
+
+class InProcessClient:
+    """
+    django.test.Client of one user thread, counts queries per call
+    """
+
+    prefix = "/api-v2"
+
+    def __init__(self, init_data):
+        from django.test import Client
+
+        self.client = Client(HTTP_X_TELEGRAM_INIT_DATA=init_data)
+
+    def send(self, method, path, body=None):
+        from utils.db import QueryCounter
+
+        with QueryCounter() as queries:
+            if method == "GET":
+                response = self.client.get(self.prefix + path)
+            else:
+                response = self.client.post(
+                    self.prefix + path,
+                    data=json.dumps(body or {}),
+                    content_type="application/json",
+                )
+        return response.status_code, json.loads(response.content), queries.count
+
+    def close(self):
+        from django.db import connection
+
+        connection.close()
+
+
+class HttpClient:
+    """
+    requests session of one user thread against a running deployment
+    """
+
+    def __init__(self, base_url, init_data):
+        import requests
+
+        self.base_url = base_url.rstrip("/")
+        self.session = requests.Session()
+        self.session.headers["X-Telegram-Init-Data"] = init_data
+
+    def send(self, method, path, body=None):
+        response = self.session.request(
+            method, self.base_url + path, json=body, timeout=120
+        )
+        try:
+            data = response.json()
+        except ValueError:
+            data = {}
+        return response.status_code, data, None
+
+    def close(self):
+        self.session.close()
+
+
+class VirtualUser:
+    """
+    one synthetic Telegram user running its share of the mix
+    """
+
+    def __init__(self, client, rng):
+        self.client = client
+        self.rng = rng
+        self.chats = []
+        self.results = []
+
+    def call(self, op):
+        if op == "chat-list":
+            request = ("GET", "/chat/chat-list/", None)
+        elif op == "single-chat":
+            hex_id = self.rng.choice(self.chats)["unique_hex_id"]
+            request = ("GET", f"/chat/single-chat/{hex_id}/", None)
+        elif op == "chatting":
+            chat = self.rng.choice(self.chats)
+            body = {"chat_id": chat["id"], "content": self.rng.choice(QUESTIONS)}
+            request = ("POST", "/chat/chatting/", body)
+        else:
+            request = ("POST", "/chat/new-chat/", {})
+
+        start = time.perf_counter()
+        try:
+            status, data, queries = self.client.send(*request)
+        except Exception as e:
+            logging.error(f"{op} failed. error: {str(e)}")
+            status, data, queries = 0, {}, None
+        self.results.append((op, time.perf_counter() - start, status, queries))
+
+        if op == "new-chat" and status == 201:
+            self.chats.append(data["new_chat"])
+
+    def run(self, ops):
+        try:
+            self.call("new-chat")
+            for op in ops:
+                # every call but new-chat needs a chat to work on
+                self.call(op if self.chats else "new-chat")
+        finally:
+            self.client.close()
+
+
+def start_fake_llm(args):
+    """
+    fake server process and its base url
+    """
+    process = subprocess.Popen(
+        [
+            sys.executable,
+            "-m",
+            "benchmarks.fake_openrouter",
+            "--port",
+            str(args.llm_port),
+            "--latency-ms",
+            str(args.latency_ms),
+            "--sigma",
+            str(args.sigma),
+            "--tokens",
+            str(args.tokens),
+            "--seed",
+            str(args.seed),
+        ],
+        cwd=Path(__file__).resolve().parent.parent,
+        stdout=subprocess.PIPE,
+        text=True,
+    )
+    return process, process.stdout.readline().strip()
+
+
+def llm_calls_served(base_url):
+    import requests
+
+    try:
+        return requests.get(base_url.rsplit("/v1", 1)[0] + "/stats", timeout=5).json()[
+            "served"
+        ]
+    except Exception:
+        return {}
+
+
+def run_users(args, make_client):
+    from utils.helper import BOT_TOKEN
+
+    weights = parse_mix(args.mix)
+    bot_token = args.bot_token or BOT_TOKEN
+    users = []
+    for index in range(args.users):
+        rng = random.Random(args.seed * 1000 + index)
+        ops = rng.choices(list(weights), list(weights.values()), k=args.requests)
+        init_data = sign_init_data(
+            bot_token,
+            {
+                "id": 900000 + index,
+                "first_name": f"load{index}",
+                "username": f"load{index}",
+            },
+        )
+        users.append((VirtualUser(make_client(init_data), rng), ops))
+
+    threads = [threading.Thread(target=user.run, args=(ops,)) for user, ops in users]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    return [result for user, _ in users for result in user.results], elapsed
+
+
+def summarize_results(results, elapsed):
+    ops = {}
+    for op in sorted({result[0] for result in results}) + ["all"]:
+        rows = [r for r in results if op in ("all", r[0])]
+        stats = summarize([seconds for _, seconds, _, _ in rows])
+        stats["errors"] = sum(1 for _, _, status, _ in rows if not 200 <= status < 300)
+        queries = [count for _, _, _, count in rows if count is not None]
+        if queries:
+            stats["queries_mean"] = sum(queries) / len(queries)
+            stats["queries_max"] = max(queries)
+        ops[op] = stats
+    return {
+        "requests": len(results),
+        "seconds": elapsed,
+        "rps": len(results) / elapsed,
+        "ops": ops,
+    }
+
+
+def regressions(current, baseline, tolerance):
+    """
+    p95, query count and throughput regressions against a saved run
+    """
+    found = []
+    if current["rps"] < baseline["rps"] * (1 - tolerance):
+        found.append(f"rps {current['rps']:.1f} < {baseline['rps']:.1f}")
+    for op, before in baseline["ops"].items():
+        now = current["ops"].get(op)
+        if now is None:
+            continue
+        if now["p95"] > before["p95"] * (1 + tolerance):
+            found.append(f"{op} p95 {now['p95']:.1f} ms > {before['p95']:.1f} ms")
+        if (
+            "queries_mean" in before
+            and now.get("queries_mean", 0) > before["queries_mean"] + 0.5
+        ):
+            found.append(
+                f"{op} queries {now['queries_mean']:.1f} > {before['queries_mean']:.1f}"
+            )
+        if now["errors"] > before["errors"]:
+            found.append(f"{op} errors {now['errors']} > {before['errors']}")
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--users", type=int, default=10)
+    parser.add_argument("--requests", type=int, default=20, help="calls per user")
+    parser.add_argument("--mix", default=DEFAULT_MIX)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--latency-ms", type=float, default=200)
+    parser.add_argument("--sigma", type=float, default=0.3)
+    parser.add_argument("--tokens", type=int, default=40)
+    parser.add_argument("--llm-port", type=int, default=0)
+    parser.add_argument("--url", help="base url of a running deployment")
+    parser.add_argument("--llm-url", help="fake server of that deployment, for stats")
+    parser.add_argument("--bot-token", help="BOT_TOKEN of that deployment")
+    parser.add_argument("--rate-limits", action="store_true")
+    parser.add_argument("--json", help="write the results to this file")
+    parser.add_argument("--baseline", help="results of an earlier --json run")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    args = parser.parse_args()
+
+    setup_django()
+    # failed calls are counted, not logged one by one
+    logging.disable(logging.WARNING)
+
+    if args.url:
+        results, elapsed = run_users(
+            args, lambda init_data: HttpClient(args.url, init_data)
+        )
+        served = llm_calls_served(args.llm_url) if args.llm_url else {}
+    else:
+        from utils import ai
+        from utils.ratelimit import chat_limiter
+
+        process, llm_url = start_fake_llm(args)
+        ai.LLM_BASE_URL = llm_url
+        ai._reset_pipelines()
+        if not args.rate_limits:
+            chat_limiter.rate_per_minute = 0
+            chat_limiter.max_in_flight = 0
+        try:
+            with test_database(on_disk=True):
+                results, elapsed = run_users(args, InProcessClient)
+        finally:
+            served = llm_calls_served(llm_url)
+            process.terminate()
+            process.wait()
+
+    summary = summarize_results(results, elapsed)
+    summary["llm_calls"] = served
+
+    report(
+        f"{args.users} users x {args.requests} calls, {summary['rps']:.1f} req/s "
+        f"over {elapsed:.2f} s, fake LLM {args.latency_ms:.0f} ms median",
+        [(op, stats) for op, stats in summary["ops"].items()],
+    )
+    print(f"\n{'case':<32}{'errors':>8}{'queries':>12}{'max':>8}")
+    for op, stats in summary["ops"].items():
+        queries = (
+            f"{stats['queries_mean']:>12.2f}{stats['queries_max']:>8}"
+            if "queries_mean" in stats
+            else f"{'-':>12}{'-':>8}"
+        )
+        print(f"{op:<32}{stats['errors']:>8}{queries}")
+    if served:
+        print(
+            "\nLLM calls served: "
+            + ", ".join(f"{k} {v}" for k, v in sorted(served.items()))
+        )
+
+    if args.json:
+        Path(args.json).write_text(json.dumps(summary, indent=2))
+
+    if args.baseline:
+        baseline = json.loads(Path(args.baseline).read_text())
+        found = regressions(summary, baseline, args.tolerance)
+        for line in found:
+            print(f"REGRESSION {line}")
+        if found:
+            sys.exit(1)
+        print(f"\nno regressions against {args.baseline}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,7 @@
 from django.contrib import admin
-from .models import Chat, ChatContext, Message
+from .models import Chat, ChatArchive, ChatContext, Message
 
 admin.site.register(Chat)
 admin.site.register(ChatContext)
-admin.site.register(Message)
\ No newline at end of file
+admin.site.register(Message)
+admin.site.register(ChatArchive)
\ No newline at end of file
@@ -1,5 +1,27 @@
 from django.apps import AppConfig
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_migrate, pre_migrate
 
 class ChatsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'chats'
+
+    def ready(self):
+        from .schema import (
+            backfill_summarized_until,
+            backfill_unique_hex_ids,
+            install_search_index,
+        )
+
+        pre_migrate.connect(backfill_unique_hex_ids, sender=self)
+        post_migrate.connect(backfill_summarized_until, sender=self)
+        post_migrate.connect(install_search_index, sender=self)
+
+        from utils.db import count_new_connection
+
+        connection_created.connect(count_new_connection)
+
+        # their metrics collectors register on import, otherwise both only
+        # load with the llm stack and /metrics/ would miss them until then
+        import utils.weather  # noqa: F401
+        import utils.response_cache  # noqa: F401
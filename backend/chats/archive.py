@@ -0,0 +1,234 @@
+"""
+Cold storage for inactive chats.
+
+archive_chat packs the messages and context summary of a chat into one
+compressed ChatArchive row and deletes them from the hot tables, so
+chats_message and its indexes only hold chats that are in use.
+restore_chat puts them back, with their original ids, the first time the
+chat is opened again (see chats.service). Chats are archived in batches
+by the archive_chats management command.
+
+The blob is NDJSON: a header line with the context summary, then one
+[id, sender, timestamp, content] line per message, oldest first.
+"""
+
+import os
+import json
+import zlib
+from datetime import datetime, timedelta
+from itertools import islice
+from dotenv import load_dotenv
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+try:
+    import zstandard
+except ImportError:  # optional, zlib is used instead
+    zstandard = None
+
+from utils.metrics import registry, timed
+from .models import Chat, ChatArchive, ChatContext, Message
+
+load_dotenv()
+
+# chats without activity for this many days are archived by archive_chats
+ARCHIVE_AFTER_DAYS = int(os.getenv("ARCHIVE_AFTER_DAYS", "90"))
+# "zlib", or "zstd" when the zstandard package is installed
+ARCHIVE_CODEC = os.getenv("ARCHIVE_CODEC", "zlib").lower()
+# messages read, written and decompressed at a time
+ARCHIVE_CHUNK_SIZE = 2000
+
+ZLIB_LEVEL = 9
+ZSTD_LEVEL = 10
+
+CHAT_ARCHIVE = registry.counter(
+    "chat_archive_total", "Chats moved to and restored from the archive", ["action"]
+)
+
+
+def _chunks(iterator, size):
+    iterator = iter(iterator)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+def idle_since(days=ARCHIVE_AFTER_DAYS):
+    return timezone.now() - timedelta(days=days)
+
+
+def default_codec():
+    if ARCHIVE_CODEC == "zstd" and zstandard is not None:
+        return "zstd"
+    return "zlib"
+
+
+def _compressor(codec):
+    if codec == "zstd":
+        return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compressobj()
+    return zlib.compressobj(ZLIB_LEVEL)
+
+
+def _decompressor(codec):
+    if codec == "zstd":
+        if zstandard is None:
+            raise RuntimeError("zstd archives need the zstandard package")
+        return zstandard.ZstdDecompressor().decompressobj()
+    return zlib.decompressobj()
+
+
+def _line(value):
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode() + b"\n"
+
+
+def pack(context_data, messages, codec="zlib"):
+    """
+    Compress the context summary and (id, sender, timestamp, content)
+    message rows, streamed, so only the compressed blob is held in memory.
+
+    Returns (blob, message count).
+    """
+    compressor = _compressor(codec)
+    parts = [compressor.compress(_line({"context": context_data}))]
+    count = 0
+    for pk, sender, timestamp, content in messages:
+        compressed = compressor.compress(
+            _line([pk, sender, timestamp.isoformat(), content])
+        )
+        if compressed:
+            parts.append(compressed)
+        count += 1
+    parts.append(compressor.flush())
+    return b"".join(parts), count
+
+
+def unpack(codec, data, read_size=1 << 16):
+    """
+    The header dict, then (id, sender, timestamp, content) of every
+    message, decompressed read_size bytes of blob at a time.
+    """
+    decompressor = _decompressor(codec)
+    data = bytes(data)
+    pending = b""
+    for start in range(0, len(data), read_size):
+        pending += decompressor.decompress(data[start : start + read_size])
+        *lines, pending = pending.split(b"\n")
+        for line in lines:
+            yield _row(json.loads(line))
+    if pending:
+        yield _row(json.loads(pending))
+
+
+def _row(value):
+    if isinstance(value, dict):
+        return value
+    pk, sender, timestamp, content = value
+    return pk, sender, datetime.fromisoformat(timestamp), content
+
+
+def archived_messages(archive):
+    """
+    (id, sender, timestamp, content) of the messages in archive, oldest first
+    """
+    rows = unpack(archive.codec, archive.data)
+    next(rows)
+    return rows
+
+
+@timed("archive")
+def archive_chat(chat_id, before, codec=None):
+    """
+    Move the messages and context summary of one chat into a ChatArchive,
+    in one transaction.
+
+    Returns the number of messages archived, or None when the chat is
+    already archived or was active after before.
+    """
+    codec = codec or default_codec()
+    with transaction.atomic():
+        # storing an exchange updates the chat row, so it waits for this lock
+        chat = (
+            Chat.objects.visible()
+            .select_for_update()
+            .filter(pk=chat_id, archived_at__isnull=True, updated_at__lt=before)
+            .first()
+        )
+        if chat is None:
+            return None
+
+        context_data = (
+            ChatContext.objects.filter(chat_id=chat_id)
+            .values_list("context_data", flat=True)
+            .first()
+        )
+        ids = []
+
+        def rows():
+            messages = (
+                Message.objects.filter(chat_id=chat_id)
+                .order_by("timestamp", "id")
+                .values_list("id", "sender", "timestamp", "content")
+            )
+            for row in messages.iterator(chunk_size=ARCHIVE_CHUNK_SIZE):
+                ids.append(row[0])
+                yield row
+
+        data, count = pack(context_data, rows(), codec)
+        now = timezone.now()
+        ChatArchive.objects.create(
+            chat_id=chat_id,
+            codec=codec,
+            data=data,
+            message_count=count,
+            archived_at=now,
+        )
+        # only the packed ids, never a message this transaction didn't see
+        for chunk in _chunks(ids, ARCHIVE_CHUNK_SIZE):
+            Message.objects.filter(id__in=chunk).delete()
+        ChatContext.objects.filter(chat_id=chat_id).update(context_data="")
+        # update() leaves updated_at alone
+        Chat.objects.filter(pk=chat_id).update(archived_at=now)
+
+    CHAT_ARCHIVE.inc(action="archived")
+    return count
+
+
+@timed("restore")
+def restore_chat(chat):
+    """
+    Put the archived messages and context summary of chat back, with
+    their original ids, and mark it live again. Messages stored while it
+    was archived stay where they are.
+    """
+    try:
+        with transaction.atomic():
+            archive = (
+                ChatArchive.objects.select_for_update().filter(chat_id=chat.pk).first()
+            )
+            if archive is not None:
+                rows = unpack(archive.codec, archive.data)
+                context_data = next(rows)["context"]
+                for chunk in _chunks(rows, ARCHIVE_CHUNK_SIZE):
+                    Message.objects.bulk_create(
+                        Message(
+                            id=pk,
+                            chat_id=chat.pk,
+                            sender=sender,
+                            timestamp=timestamp,
+                            content=content,
+                        )
+                        for pk, sender, timestamp, content in chunk
+                    )
+                if context_data is not None:
+                    ChatContext.objects.filter(chat_id=chat.pk).update(
+                        context_data=context_data
+                    )
+                    if Chat.context.is_cached(chat):
+                        chat.context.context_data = context_data
+                archive.delete()
+                CHAT_ARCHIVE.inc(action="restored")
+            Chat.objects.filter(pk=chat.pk).update(archived_at=None)
+    except IntegrityError:
+        # sqlite has no row locks, a concurrent request restored it first
+        if Chat.context.is_cached(chat):
+            chat.context.refresh_from_db(fields=["context_data"])
+    chat.archived_at = None
@@ -0,0 +1,200 @@
+import os
+import logging
+from asgiref.sync import sync_to_async
+from dotenv import load_dotenv
+from jobs.models import Job
+from jobs.queue import enqueue, run_if_unclaimed
+from utils.warmup import get_pipeline
+from utils.metrics import timed
+from .models import ChatContext, Message
+
+load_dotenv()
+
+# summary + verbatim messages sent with every prompt, in characters
+CONTEXT_BUDGET_CHARS = int(os.getenv("CONTEXT_BUDGET_CHARS", "6000"))
+# newest messages that always stay verbatim when compacting
+CONTEXT_WINDOW_MESSAGES = int(os.getenv("CONTEXT_WINDOW_MESSAGES", "6"))
+# target size of the summary a compaction produces
+CONTEXT_SUMMARY_MAX_CHARS = int(os.getenv("CONTEXT_SUMMARY_MAX_CHARS", "1500"))
+# transcript sent with one summarization call, a longer backlog (a chat
+# from before compaction, a long queue) is folded in several calls
+CONTEXT_COMPACT_CHUNK_CHARS = int(
+    os.getenv("CONTEXT_COMPACT_CHUNK_CHARS", str(CONTEXT_SUMMARY_MAX_CHARS * 8))
+)
+# rough average for english text, good enough for budgeting
+CHARS_PER_TOKEN = 4
+# times a reply is generated again because another message of the same
+# chat was stored while it ran
+CHAT_ORDER_RETRIES = int(os.getenv("CHAT_ORDER_RETRIES", "2"))
+
+
+class StaleContext(Exception):
+    """
+    another exchange was stored after the context of a reply was loaded
+    """
+
+
+def estimate_tokens(size):
+    """
+    approximate token count of `size` characters
+    """
+    return -(-size // CHARS_PER_TOKEN)
+
+
+def format_transcript(rows):
+    return "\n".join(f"{sender}: {content}" for _, sender, content in rows)
+
+
+def transcript_chunks(rows, max_chars):
+    """
+    Split rows into runs whose transcript stays within max_chars, a
+    single longer message is cut to fit.
+    """
+    chunk, size = [], 0
+    for pk, sender, content in rows:
+        line = (pk, sender, content[: max(max_chars - len(sender) - 2, 0)])
+        length = len(line[1]) + len(line[2]) + 3
+        if chunk and size + length > max_chars:
+            yield chunk
+            chunk, size = [], 0
+        chunk.append(line)
+        size += length
+    if chunk:
+        yield chunk
+
+
+def pending_messages(context):
+    """
+    queryset of (id, sender, content) not folded into the summary yet
+    """
+    return (
+        Message.objects.filter(chat_id=context.chat_id, id__gt=context.summarized_until)
+        .order_by("id")
+        .values_list("id", "sender", "content")
+    )
+
+
+def build_context(context, rows):
+    """
+    Context sent to the model: the stored summary followed by every
+    message that is not part of it yet. A chat without messages sends
+    the bare summary, so openers still share response cache entries.
+    """
+    if not rows:
+        return context.context_data
+    return f"{context.context_data}\nRecent messages:\n{format_transcript(rows)}"
+
+
+@timed("context_load")
+def load_prompt_context(chat):
+    """
+    Returns (prompt context, pending message rows).
+    """
+    rows = list(pending_messages(chat.context))
+    return build_context(chat.context, rows), rows
+
+
+@timed("context_load")
+async def aload_prompt_context(chat):
+    """
+    Async version of load_prompt_context.
+    """
+    rows = [row async for row in pending_messages(chat.context)]
+    return build_context(chat.context, rows), rows
+
+
+def context_size(context, rows):
+    return len(context.context_data) + sum(len(row[2]) for row in rows)
+
+
+def needs_compaction(context, rows):
+    """
+    Over budget and there is something older than the window to fold.
+    """
+    return (
+        context_size(context, rows) > CONTEXT_BUDGET_CHARS
+        and len(rows) > CONTEXT_WINDOW_MESSAGES
+    )
+
+
+def compact_context(chat_id, force=False):
+    """
+    Fold every pending message older than the window into the summary
+    with dedicated summarization calls, CONTEXT_COMPACT_CHUNK_CHARS of
+    transcript per call. summarized_until moves forward after each one,
+    so a failed call keeps the chunks folded before it. Only runs when
+    the context is over budget, unless force is set.
+
+    Returns True when the summary was replaced.
+    """
+    context = ChatContext.objects.get(chat_id=chat_id)
+    rows = list(pending_messages(context))
+
+    if len(rows) <= CONTEXT_WINDOW_MESSAGES:
+        return False
+    if not force and not needs_compaction(context, rows):
+        return False
+
+    overflow = rows[:-CONTEXT_WINDOW_MESSAGES] if CONTEXT_WINDOW_MESSAGES else rows
+    summary, summarized_until = context.context_data, context.summarized_until
+    compacted = False
+    for chunk in transcript_chunks(overflow, CONTEXT_COMPACT_CHUNK_CHARS):
+        summary = get_pipeline().summarize_context(
+            summary, format_transcript(chunk), max_chars=CONTEXT_SUMMARY_MAX_CHARS
+        )
+
+        # a concurrent compaction of the same chat wins, this result is dropped
+        updated = ChatContext.objects.filter(
+            chat_id=chat_id, summarized_until=summarized_until
+        ).update(context_data=summary, summarized_until=chunk[-1][0])
+        if not updated:
+            return compacted
+        summarized_until = chunk[-1][0]
+        compacted = True
+
+    kept = len(summary) + sum(len(row[2]) for row in rows[len(overflow) :])
+    logging.debug(
+        "Compacted chat %s, folded %s messages, context ~%s tokens",
+        chat_id,
+        len(overflow),
+        estimate_tokens(kept),
+    )
+    return compacted
+
+
+def enqueue_context_summary(chat, force=True):
+    """
+    Queue a compaction of the chat context, run by the chat_summary job
+    handler in manage.py run_llm_workers, or in this process when no
+    worker picks it up. force folds everything older than the window
+    even under budget.
+
+    Returns the job, or None when one is already pending for the chat.
+    """
+    pending = Job.objects.filter(
+        kind="chat_summary", status=Job.PENDING, payload__chat_id=chat.id
+    )
+    if pending.exists():
+        return None
+    job = enqueue("chat_summary", {"chat_id": chat.id, "force": force}, user=chat.user)
+    run_if_unclaimed(job)
+    return job
+
+
+def schedule_compaction(chat, rows, *new_messages):
+    """
+    After an exchange, queue a compaction when the context (pending rows
+    plus the new messages) went over budget. The summarization call runs
+    in a job worker, or on the background threads when none is running.
+    """
+    rows = rows + [(None, None, content) for content in new_messages]
+    if not needs_compaction(chat.context, rows):
+        return None
+    return enqueue_context_summary(chat, force=False)
+
+
+async def aschedule_compaction(chat, rows, *new_messages):
+    """
+    Async version of schedule_compaction.
+    """
+    return await sync_to_async(schedule_compaction)(chat, rows, *new_messages)
@@ -0,0 +1,200 @@
+"""
+Streaming export of a user's chats and messages as NDJSON or CSV.
+
+Chats and messages are read with .iterator(chunk_size) and written out a
+chunk at a time, so memory stays flat however long the history is.
+Archived chats are exported from their archive without restoring them.
+Used by the export/ endpoint and the export_chats management command.
+"""
+
+import os
+import csv
+import zlib
+from itertools import islice
+from dotenv import load_dotenv
+from .models import Chat, ChatArchive, Message
+from .archive import archived_messages
+from .fast_serializers import (
+    CHAT_DATETIME_FIELDS,
+    CHAT_FIELDS,
+    MESSAGE_DATETIME_FIELDS,
+    dumps,
+    format_rows,
+)
+
+load_dotenv()
+
+# rows fetched from the database, and written out, at a time
+EXPORT_CHUNK_SIZE = int(os.getenv("EXPORT_CHUNK_SIZE", "2000"))
+
+FORMATS = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+}
+MESSAGE_EXPORT_FIELDS = ("chat_id", "id", "sender", "content", "timestamp")
+CSV_HEADER = (
+    "chat_id",
+    "chat_unique_hex_id",
+    "chat_title",
+    "chat_created_at",
+    "message_id",
+    "sender",
+    "timestamp",
+    "content",
+)
+
+
+class InvalidExport(ValueError):
+    """
+    raised for an unknown export format
+    """
+
+
+def parse_format(value):
+    value = (value or "ndjson").lower()
+    if value not in FORMATS:
+        raise InvalidExport(f"Unknown export format, use one of {', '.join(FORMATS)}.")
+    return value
+
+
+def _chunks(iterator, size):
+    iterator = iter(iterator)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+def _formatted(queryset, fields, chunk_size):
+    """
+    values() rows of queryset with their datetimes formatted, streamed
+    """
+    for chunk in _chunks(queryset.iterator(chunk_size=chunk_size), chunk_size):
+        yield from format_rows(chunk, fields)
+
+
+def export_events(user, chat_ids=None, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    ("chat", row) followed by ("message", row) for each of its messages,
+    chats by id and messages oldest first. Two streamed queries merged on
+    the chat id.
+    """
+    chats = Chat.objects.visible().filter(user=user)
+    messages = Message.objects.filter(chat__user=user, chat__deleted_at__isnull=True)
+    if chat_ids is not None:
+        chats = chats.filter(id__in=chat_ids)
+        messages = messages.filter(chat_id__in=chat_ids)
+
+    chats = _formatted(
+        chats.order_by("id").values(*CHAT_FIELDS, "archived_at"),
+        CHAT_DATETIME_FIELDS,
+        chunk_size,
+    )
+    messages = _formatted(
+        messages.order_by("chat_id", "timestamp", "id").values(*MESSAGE_EXPORT_FIELDS),
+        MESSAGE_DATETIME_FIELDS,
+        chunk_size,
+    )
+
+    chat = None
+    for message in messages:
+        while chat is None or chat["id"] < message["chat_id"]:
+            chat = next(chats, None)
+            if chat is None:
+                return
+            yield from _chat_events(chat, chunk_size)
+        # a chat created after the chat query started is left out
+        if chat["id"] == message["chat_id"]:
+            yield "message", message
+    for chat in chats:
+        yield from _chat_events(chat, chunk_size)
+
+
+def _chat_events(chat, chunk_size):
+    """
+    the chat row, then the messages of its archive when it is archived
+    """
+    archived = chat.pop("archived_at") is not None
+    yield "chat", chat
+    if not archived:
+        return
+    archive = ChatArchive.objects.filter(chat_id=chat["id"]).first()
+    if archive is None:
+        return
+    rows = (
+        {
+            "chat_id": chat["id"],
+            "id": pk,
+            "sender": sender,
+            "content": content,
+            "timestamp": timestamp,
+        }
+        for pk, sender, timestamp, content in archived_messages(archive)
+    )
+    for chunk in _chunks(rows, chunk_size):
+        for row in format_rows(chunk, MESSAGE_DATETIME_FIELDS):
+            yield "message", row
+
+
+def _ndjson(events):
+    for kind, row in events:
+        yield dumps({"type": kind, **row}) + b"\n"
+
+
+class _Echo:
+    """
+    file-like object handing back what csv.writer writes
+    """
+
+    def write(self, value):
+        return value
+
+
+def _csv(events):
+    """
+    one row per message, a chat without messages gets one row of its own
+    """
+    writer = csv.writer(_Echo())
+    yield writer.writerow(CSV_HEADER).encode("utf-8")
+
+    chat, empty = None, False
+    for kind, row in events:
+        if kind == "chat":
+            if empty:
+                yield writer.writerow(_csv_chat(chat) + [""] * 4).encode("utf-8")
+            chat, empty = row, True
+            continue
+        empty = False
+        yield writer.writerow(
+            _csv_chat(chat)
+            + [row["id"], row["sender"], row["timestamp"], row["content"]]
+        ).encode("utf-8")
+    if empty:
+        yield writer.writerow(_csv_chat(chat) + [""] * 4).encode("utf-8")
+
+
+def _csv_chat(chat):
+    return [chat["id"], chat["unique_hex_id"], chat["title"], chat["created_at"]]
+
+
+def _gzip(chunks):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+def export_stream(
+    user, fmt="ndjson", compress=False, chat_ids=None, chunk_size=EXPORT_CHUNK_SIZE
+):
+    """
+    the export as an iterator of bytes, one piece per chunk_size rows
+    """
+    events = export_events(user, chat_ids, chunk_size)
+    lines = _ndjson(events) if fmt == "ndjson" else _csv(events)
+    chunks = (b"".join(chunk) for chunk in _chunks(lines, chunk_size))
+    return _gzip(chunks) if compress else chunks
+
+
+def export_filename(user, fmt, compress=False):
+    return f"chats-{user.telegram_id}.{fmt}" + (".gz" if compress else "")
@@ -0,0 +1,103 @@
+"""
+Fast path for the hot read endpoints (chat-list, single-chat, messages).
+
+Rows come from values() instead of model instances, datetimes are
+formatted in one pass and the body is encoded with orjson when it is
+installed. Decoded output is identical to the DRF serializers in
+serializers.py; with the stdlib encoder the bytes are identical too.
+"""
+
+import os
+import json
+from datetime import timezone as dt_timezone
+from django.conf import settings
+from django.http import HttpResponse, JsonResponse
+from django.utils import timezone
+
+try:
+    import orjson
+except ImportError:  # optional, stdlib json is used instead
+    orjson = None
+
+from utils.metrics import timed
+from .serializers import _datetime_field
+
+FAST_SERIALIZERS = os.getenv("FAST_SERIALIZERS", "True").lower() == "true"
+
+# same fields, same order as ChatSerializer / MessageSerializer
+CHAT_FIELDS = ("id", "unique_hex_id", "title", "created_at", "updated_at")
+CHAT_DATETIME_FIELDS = ("created_at", "updated_at")
+MESSAGE_FIELDS = ("id", "sender", "content", "timestamp")
+MESSAGE_DATETIME_FIELDS = ("timestamp",)
+
+
+def _is_utc(tz):
+    return tz is dt_timezone.utc or getattr(tz, "key", None) == "UTC"
+
+
+def format_datetimes(values):
+    """
+    Format datetimes like DRF DateTimeField (ISO 8601, 'Z' suffix for UTC).
+    """
+    if not (settings.USE_TZ and _is_utc(timezone.get_current_timezone())):
+        return [_datetime_field.to_representation(value) for value in values]
+
+    formatted = []
+    for value in values:
+        if value is None:
+            formatted.append(None)
+            continue
+        if value.utcoffset() is None or value.utcoffset().total_seconds():
+            formatted.append(_datetime_field.to_representation(value))
+            continue
+        text = value.isoformat()
+        formatted.append(text[:-6] + "Z" if text.endswith("+00:00") else text)
+    return formatted
+
+
+def format_rows(rows, fields):
+    """
+    format the datetime fields of values() rows in place
+    """
+    for field in fields:
+        formatted = format_datetimes([row[field] for row in rows])
+        for row, value in zip(rows, formatted):
+            row[field] = value
+    return rows
+
+
+def chat_rows(queryset):
+    """
+    chats as dicts shaped like ChatSerializer(many=True).data
+    """
+    return format_rows(list(queryset.values(*CHAT_FIELDS)), CHAT_DATETIME_FIELDS)
+
+
+def message_rows(queryset):
+    """
+    messages as dicts shaped like MessageSerializer(many=True).data
+    """
+    return format_rows(list(queryset.values(*MESSAGE_FIELDS)), MESSAGE_DATETIME_FIELDS)
+
+
+def dumps(data):
+    if orjson is not None:
+        return orjson.dumps(data)
+    return json.dumps(data).encode("utf-8")
+
+
+class FastJsonResponse(JsonResponse):
+    """
+    JsonResponse encoded with dumps(), for plain dict/list/str/int payloads
+    """
+
+    def __init__(self, data, **kwargs):
+        kwargs.setdefault("content_type", "application/json")
+        HttpResponse.__init__(self, content=dumps(data), **kwargs)
+
+
+@timed("serialize")
+def json_response(data, status=200):
+    if not FAST_SERIALIZERS:
+        return JsonResponse(data, status=status)
+    return FastJsonResponse(data, status=status)
@@ -0,0 +1,85 @@
+import time
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+from chats.models import Chat
+from chats.archive import ARCHIVE_AFTER_DAYS, archive_chat, idle_since
+
+
+class Command(BaseCommand):
+    help = (
+        "Move the messages of chats inactive for --days into compressed "
+        "archive rows, in batches. Safe to stop and run again, every chat is "
+        "archived in its own transaction."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--days",
+            type=int,
+            default=ARCHIVE_AFTER_DAYS,
+            help="archive chats without activity for this many days",
+        )
+        parser.add_argument(
+            "--batch-size", type=int, default=100, help="chats selected at a time"
+        )
+        parser.add_argument(
+            "--limit", type=int, help="stop after archiving this many chats"
+        )
+        parser.add_argument(
+            "--sleep",
+            type=float,
+            default=0,
+            help="seconds to pause between batches, to go easy on the database",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="only count the chats that would be archived",
+        )
+
+    def handle(self, *args, **options):
+        before = idle_since(options["days"])
+        candidates = Chat.objects.visible().filter(
+            archived_at__isnull=True, updated_at__lt=before
+        )
+
+        if options["dry_run"]:
+            self.stdout.write(
+                f"{candidates.count()} chats inactive since {before:%Y-%m-%d}"
+            )
+            return
+
+        limit = options["limit"]
+        chats = messages = 0
+        # keyset over (updated_at, id), oldest first, served by
+        # chat_live_updated_idx; archived chats drop out of the scan so a
+        # new run picks up where the last one stopped
+        position = None
+        while limit is None or chats < limit:
+            batch = candidates.order_by("updated_at", "id")
+            if position is not None:
+                updated_at, chat_id = position
+                batch = batch.filter(
+                    Q(updated_at__gt=updated_at)
+                    | Q(updated_at=updated_at, id__gt=chat_id)
+                )
+            size = options["batch_size"]
+            if limit is not None:
+                size = min(size, limit - chats)
+            batch = list(batch.values_list("updated_at", "id")[:size])
+            if not batch:
+                break
+
+            for _, chat_id in batch:
+                archived = archive_chat(chat_id, before)
+                if archived is not None:
+                    chats += 1
+                    messages += archived
+            position = batch[-1]
+            self.stdout.write(
+                f"archived {chats} chats, {messages} messages, up to chat {position[1]}"
+            )
+            if options["sleep"]:
+                time.sleep(options["sleep"])
+
+        self.stdout.write(f"done: archived {chats} chats, {messages} messages")
@@ -0,0 +1,72 @@
+import sys
+from django.core.management.base import BaseCommand, CommandError
+from users.models import User
+from chats.models import Chat
+from chats.export import EXPORT_CHUNK_SIZE, FORMATS, export_stream
+
+
+class Command(BaseCommand):
+    help = "Export the chats and messages of a user as NDJSON or CSV, streamed."
+
+    def add_arguments(self, parser):
+        parser.add_argument("telegram_id", type=int, help="telegram id of the user")
+        parser.add_argument("--format", choices=list(FORMATS), default="ndjson")
+        parser.add_argument("--gzip", action="store_true", help="gzip the output")
+        parser.add_argument(
+            "--chat",
+            action="append",
+            dest="chats",
+            metavar="UNIQUE_HEX_ID",
+            help="only this chat, can be repeated",
+        )
+        parser.add_argument(
+            "--output", "-o", help="file to write, standard output by default"
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=EXPORT_CHUNK_SIZE,
+            help="rows read and written at a time",
+        )
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(telegram_id=options["telegram_id"])
+        except User.DoesNotExist:
+            raise CommandError(f"No user with telegram id {options['telegram_id']}.")
+
+        chat_ids = None
+        if options["chats"]:
+            chat_ids = list(
+                Chat.objects.filter(
+                    user=user, unique_hex_id__in=options["chats"]
+                ).values_list("id", flat=True)
+            )
+            if len(chat_ids) != len(set(options["chats"])):
+                raise CommandError("Some chats don't exist or belong to another user.")
+
+        chunks = export_stream(
+            user,
+            options["format"],
+            options["gzip"],
+            chat_ids,
+            options["chunk_size"],
+        )
+        if options["output"]:
+            with open(options["output"], "wb") as output:
+                written = self.write(chunks, output)
+            self.stderr.write(f"wrote {written} bytes to {options['output']}")
+        else:
+            self.write(chunks, self.stdout_binary())
+
+    def stdout_binary(self):
+        return getattr(self.stdout._out, "buffer", sys.stdout.buffer)
+
+    @staticmethod
+    def write(chunks, output):
+        written = 0
+        for chunk in chunks:
+            output.write(chunk)
+            written += len(chunk)
+        output.flush()
+        return written
@@ -0,0 +1,52 @@
+from datetime import timedelta
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from chats.models import Chat
+from chats.purge import PURGE_BATCH_SIZE, purge_chat
+
+
+class Command(BaseCommand):
+    help = (
+        "Remove chats that were deleted but not purged yet, for example "
+        "because no job worker was running. Deleted chats are normally "
+        "purged by the purge_chats job."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--older-than",
+            type=int,
+            default=10,
+            metavar="MINUTES",
+            help="only chats deleted this long ago, leaving recent ones to the job",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=PURGE_BATCH_SIZE,
+            help="messages deleted per statement",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="only count the chats waiting to be purged",
+        )
+
+    def handle(self, *args, **options):
+        deleted_before = timezone.now() - timedelta(minutes=options["older_than"])
+        chat_ids = list(
+            Chat.objects.filter(deleted_at__lt=deleted_before)
+            .order_by("deleted_at", "id")
+            .values_list("id", flat=True)
+        )
+        if options["dry_run"]:
+            self.stdout.write(f"{len(chat_ids)} deleted chats waiting to be purged")
+            return
+
+        chats = messages = 0
+        for chat_id in chat_ids:
+            purged = purge_chat(chat_id, options["batch_size"])
+            if purged is not None:
+                chats += 1
+                messages += purged
+        self.stdout.write(f"purged {chats} chats, {messages} messages")
@@ -1,8 +1,47 @@
+import time
 import secrets
-from django.db import models
+from django.db import models, connections, IntegrityError
 from users.models import User
 from django.utils import timezone
 
+# attempts for a new chat when its unique_hex_id collides
+HEX_ID_ATTEMPTS = 3
+
+
+def generate_hex_id():
+    """
+    20 character, time ordered hex id: 10 hex chars of unix seconds
+    followed by 10 random hex chars (40 bits).
+
+    Ids created close together sort and insert next to each other in the
+    unique index, and no lookup is needed to make them unique.
+    """
+    return f"{int(time.time()):010x}{secrets.token_hex(5)}"
+
+
+class ChatManager(models.Manager):
+    def visible(self):
+        """
+        chats that are not deleted, deleted ones wait for chats.purge
+        """
+        return self.filter(deleted_at__isnull=True)
+
+    def bulk_create_with_context(self, chats, context_data=None, batch_size=500):
+        """
+        Insert many chats and their ChatContext rows in batches, for imports
+        and data migrations. Chats get their unique_hex_id from the field
+        default, so no per-chat query is needed.
+        """
+        if context_data is None:
+            context_data = ChatContext.DEFAULT_CONTEXT
+
+        chats = self.bulk_create(chats, batch_size=batch_size)
+        ChatContext.objects.bulk_create(
+            [ChatContext(chat=chat, context_data=context_data) for chat in chats],
+            batch_size=batch_size,
+        )
+        return chats
+
 
 class Chat(models.Model):
     """
@@ -12,20 +51,36 @@ class Chat(models.Model):
     DEFAULT_TITLE = "New Chat"
 
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="chats")
+    # unique=True also creates the index
     unique_hex_id = models.CharField(
-        max_length=20,
-        unique=True,
-        blank=True,
-        null=True,  # Allow NULL in database for existing records before migration
+        max_length=20, unique=True, default=generate_hex_id
     )
     title = models.CharField(max_length=35, default=DEFAULT_TITLE)
     created_at = models.DateTimeField(default=timezone.now)
     updated_at = models.DateTimeField(auto_now=True)
+    # set while the messages are packed into a ChatArchive (chats.archive)
+    archived_at = models.DateTimeField(null=True, blank=True)
+    # set when the user deletes the chat, the rows are removed by chats.purge
+    deleted_at = models.DateTimeField(null=True, blank=True)
+
+    objects = ChatManager()
 
     class Meta:
         verbose_name = "Chat"
         verbose_name_plural = "Chats"
         ordering = ["-updated_at"]
+        indexes = [
+            # serves a user's chat list ordered by (updated_at, id) descending
+            models.Index(
+                fields=["user", "-updated_at", "-id"], name="chat_user_updated_idx"
+            ),
+            # serves the archive_chats scan for live chats idle the longest
+            models.Index(
+                fields=["updated_at", "id"],
+                name="chat_live_updated_idx",
+                condition=models.Q(archived_at__isnull=True),
+            ),
+        ]
 
     def __str__(self):
         return (
@@ -33,18 +88,24 @@ class Chat(models.Model):
         )
 
     def save(self, *args, **kwargs):
-        # Overrides the default save method to generate a unique_hex_id
-        # Check if the object is new (has no primary key yet)
-        if not self.pk:
-            while True:
-                # Generate a 20-character hex string (10 bytes)
-                new_hex_id = secrets.token_hex(10)
-                # Check if this ID already exists in the database
-                if not Chat.objects.filter(unique_hex_id=new_hex_id).exists():
-                    self.unique_hex_id = new_hex_id
-                    # Exit the loop once a unique ID is found
-                    break
-        super().save(*args, **kwargs)
+        # new chats already carry a unique_hex_id from the field default,
+        # the unique constraint catches the (very unlikely) collision
+        if not self._state.adding:
+            return super().save(*args, **kwargs)
+
+        # inside a transaction a failed insert can't be retried without
+        # a savepoint, leave the error to the caller
+        using = kwargs.get("using") or "default"
+        if connections[using].in_atomic_block:
+            return super().save(*args, **kwargs)
+
+        for attempt in range(HEX_ID_ATTEMPTS):
+            try:
+                return super().save(*args, **kwargs)
+            except IntegrityError as e:
+                if attempt == HEX_ID_ATTEMPTS - 1 or "unique_hex_id" not in str(e):
+                    raise
+                self.unique_hex_id = generate_hex_id()
 
 
 class ChatContext(models.Model):
@@ -52,12 +113,20 @@ class ChatContext(models.Model):
     represent a context of an conversation/chat
     """
 
+    DEFAULT_CONTEXT = "no context availabl"
+
     chat = models.OneToOneField(
         Chat, on_delete=models.CASCADE, related_name="context", primary_key=True
     )
 
-    # store context data
+    # store context data, a compressed summary of older messages
     context_data = models.TextField()
+    # id of the newest message folded into context_data, later messages
+    # are sent to the model verbatim
+    summarized_until = models.BigIntegerField(default=0)
+    # bumped by every stored exchange, a reply generated from an older
+    # version is generated again (see chats.service.reply_in_order)
+    version = models.PositiveIntegerField(default=0)
 
     class Meta:
         verbose_name = "Chat Context"
@@ -84,6 +153,35 @@ class Message(models.Model):
         verbose_name = "Message"
         verbose_name_plural = "Messages"
         ordering = ["-timestamp"]
+        indexes = [
+            # serves keyset pagination of a chat's history on (timestamp, id)
+            models.Index(
+                fields=["chat", "timestamp", "id"], name="message_chat_ts_idx"
+            ),
+        ]
 
     def __str__(self):
         return f"message-id: {self.id} -> chat: {self.chat.id} -> sender: {self.sender}"
+
+
+class ChatArchive(models.Model):
+    """
+    the messages and context summary of an inactive chat, packed into one
+    compressed blob (see chats.archive)
+    """
+
+    chat = models.OneToOneField(
+        Chat, on_delete=models.CASCADE, related_name="archive", primary_key=True
+    )
+    # "zlib" or "zstd"
+    codec = models.CharField(max_length=8)
+    data = models.BinaryField()
+    message_count = models.PositiveIntegerField()
+    archived_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        verbose_name = "Chat Archive"
+        verbose_name_plural = "Chat Archives"
+
+    def __str__(self):
+        return f"Archive for Chat ID: {self.chat_id}, {self.message_count} messages"
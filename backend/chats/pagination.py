@@ -0,0 +1,74 @@
+import base64
+from datetime import datetime
+from django.db.models import Q
+
+# keyset pagination helpers, a cursor is the (datetime, id) of the last row sent
+
+DEFAULT_PAGE_SIZE = 30
+MAX_PAGE_SIZE = 100
+
+
+class InvalidPageRequest(ValueError):
+    """
+    raised for a malformed cursor or page size
+    """
+
+
+def encode_cursor(moment, pk):
+    raw = f"{moment.isoformat()}|{pk}".encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor):
+    """
+    return (datetime, id) from a cursor, None for an empty cursor
+    """
+    if not cursor:
+        return None
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        moment, pk = base64.urlsafe_b64decode(padded).decode("utf-8").split("|")
+        return datetime.fromisoformat(moment), int(pk)
+    except Exception:
+        raise InvalidPageRequest("Invalid cursor.")
+
+
+def parse_page_size(value, default=DEFAULT_PAGE_SIZE):
+    """
+    page size from a query parameter, clamped to MAX_PAGE_SIZE
+    """
+    if value in (None, ""):
+        return default
+    try:
+        size = int(value)
+    except (TypeError, ValueError):
+        raise InvalidPageRequest("Invalid page size.")
+    if size < 1:
+        raise InvalidPageRequest("Invalid page size.")
+    return min(size, MAX_PAGE_SIZE)
+
+
+def keyset_page(queryset, field, cursor, page_size):
+    """
+    Newest page_size rows of queryset strictly before cursor, ordered on
+    (field, id) descending. Works for model instances and values() rows.
+
+    Returns (rows, next_cursor), next_cursor is None on the last page.
+    """
+    if cursor:
+        moment, pk = cursor
+        queryset = queryset.filter(
+            Q(**{f"{field}__lt": moment}) | Q(**{field: moment, "id__lt": pk})
+        )
+
+    # one extra row tells whether another page exists
+    rows = list(queryset.order_by(f"-{field}", "-id")[: page_size + 1])
+    next_cursor = None
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        last = rows[-1]
+        if isinstance(last, dict):
+            next_cursor = encode_cursor(last[field], last["id"])
+        else:
+            next_cursor = encode_cursor(getattr(last, field), last.id)
+    return rows, next_cursor
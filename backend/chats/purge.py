@@ -0,0 +1,92 @@
+"""
+Chat deletion that doesn't hold up the request.
+
+delete_chats only marks the chats deleted, which hides them from every
+endpoint, and queues a purge_chats job. The job removes the messages of
+each chat PURGE_BATCH_SIZE at a time, each batch a short transaction of
+its own, and then the chat row with its context and archive. A long chat
+never turns into one big delete that holds locks.
+A job no worker claims runs on the background threads of the web process
+after JOB_PICKUP_SECONDS, manage.py purge_chats sweeps up chats whose job
+never ran at all.
+"""
+
+import os
+from dotenv import load_dotenv
+from django.db import transaction
+from django.utils import timezone
+from jobs.queue import enqueue, run_if_unclaimed
+from utils.metrics import registry, timed
+from .models import Chat, Message
+
+load_dotenv()
+
+# messages deleted per statement while purging a chat
+PURGE_BATCH_SIZE = int(os.getenv("PURGE_BATCH_SIZE", "2000"))
+# chats one bulk delete request may name
+MAX_BULK_DELETE = 100
+
+CHATS_PURGED = registry.counter(
+    "chats_purged_total", "Deleted chats removed from the database"
+)
+
+
+class InvalidDelete(ValueError):
+    """
+    raised for a malformed bulk delete request
+    """
+
+
+def parse_chat_ids(value):
+    if not isinstance(value, list) or not value:
+        raise InvalidDelete("chat_ids must be a non-empty list.")
+    if len(value) > MAX_BULK_DELETE:
+        raise InvalidDelete(f"At most {MAX_BULK_DELETE} chats can be deleted at once.")
+    if not all(isinstance(pk, int) and not isinstance(pk, bool) for pk in value):
+        raise InvalidDelete("chat_ids must be integers.")
+    return list(dict.fromkeys(value))
+
+
+def delete_chats(user, chat_ids):
+    """
+    Mark the chats of user among chat_ids deleted and queue their purge.
+
+    Returns the ids that were deleted, chats of other users, unknown and
+    already deleted ones are left out.
+    """
+    with transaction.atomic():
+        ids = list(
+            Chat.objects.visible()
+            .filter(user=user, id__in=chat_ids)
+            .values_list("id", flat=True)
+        )
+        if ids:
+            Chat.objects.filter(id__in=ids).update(deleted_at=timezone.now())
+            job = enqueue("purge_chats", {"chat_ids": ids}, user=user)
+            transaction.on_commit(lambda: run_if_unclaimed(job))
+    return ids
+
+
+@timed("purge")
+def purge_chat(chat_id, batch_size=PURGE_BATCH_SIZE):
+    """
+    Remove a deleted chat, its messages batch_size at a time.
+
+    Returns the number of messages removed, or None when the chat doesn't
+    exist or isn't marked deleted.
+    """
+    if not Chat.objects.filter(pk=chat_id, deleted_at__isnull=False).exists():
+        return None
+
+    purged = 0
+    batch = Message.objects.filter(chat_id=chat_id).values("id")[:batch_size]
+    # nothing points at a message and no signals are connected, so django
+    # deletes each batch with one DELETE ... WHERE id IN (SELECT ... LIMIT)
+    # without loading the rows
+    while deleted := Message.objects.filter(id__in=batch).delete()[0]:
+        purged += deleted
+
+    # the context, the archive and any message stored since the last batch
+    Chat.objects.filter(pk=chat_id).delete()
+    CHATS_PURGED.inc()
+    return purged
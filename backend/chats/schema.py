@@ -0,0 +1,177 @@
+"""
+Database hooks run around migrate. Migrations are generated at deploy
+time, so data fixes that must happen before a schema change live here.
+"""
+
+import logging
+from django.db import connections
+from django.db.models import Exists, OuterRef, Subquery
+
+
+def backfill_unique_hex_ids(sender, using="default", **kwargs):
+    """
+    pre_migrate: give chats created before unique_hex_id existed an id,
+    so the column can be made NOT NULL.
+    """
+    from .models import Chat, generate_hex_id
+
+    connection = connections[using]
+    table = Chat._meta.db_table
+    with connection.cursor() as cursor:
+        if table not in connection.introspection.table_names(cursor):
+            return
+        columns = [
+            column.name
+            for column in connection.introspection.get_table_description(cursor, table)
+        ]
+    if "unique_hex_id" not in columns:
+        return
+
+    missing = list(
+        Chat.objects.using(using)
+        .filter(unique_hex_id__isnull=True)
+        .values_list("pk", flat=True)
+    )
+    for pk in missing:
+        Chat.objects.using(using).filter(pk=pk).update(unique_hex_id=generate_hex_id())
+    if missing:
+        logging.info(f"Backfilled unique_hex_id for {len(missing)} chats")
+
+
+def backfill_summarized_until(sender, using="default", **kwargs):
+    """
+    post_migrate: chats from before compaction kept their whole history
+    in context_data, rewritten every turn. Mark their messages as folded
+    so they are not sent again on top of that summary.
+
+    Such a context has a summary but nothing folded: compaction always
+    moves summarized_until forward together with context_data.
+    """
+    from .models import ChatContext, Message
+
+    connection = connections[using]
+    with connection.cursor() as cursor:
+        if ChatContext._meta.db_table not in connection.introspection.table_names(
+            cursor
+        ):
+            return
+
+    messages = Message.objects.using(using).filter(chat_id=OuterRef("chat_id"))
+    backfilled = (
+        ChatContext.objects.using(using)
+        .filter(summarized_until=0, context_data__gt="")
+        .exclude(context_data=ChatContext.DEFAULT_CONTEXT)
+        .filter(Exists(messages))
+        .update(summarized_until=Subquery(messages.order_by("-id").values("id")[:1]))
+    )
+    if backfilled:
+        logging.info(f"Backfilled summarized_until for {backfilled} chats")
+
+
+def install_search_index(sender, using="default", **kwargs):
+    """
+    post_migrate: create the full-text search indexes of chats.search.
+    Safe to run again, sqlite indexes are rebuilt when their triggers
+    went missing (a table rebuild by migrate drops them).
+    """
+    from .models import Chat, Message
+    from .search import CHAT_FTS, MESSAGE_FTS, MESSAGE_FTS_SOURCE, SEARCH_CONFIG
+
+    connection = connections[using]
+    message = connection.ops.quote_name(Message._meta.db_table)
+    chat = connection.ops.quote_name(Chat._meta.db_table)
+
+    with connection.cursor() as cursor:
+        tables = connection.introspection.table_names(cursor)
+        if Message._meta.db_table not in tables or Chat._meta.db_table not in tables:
+            return
+
+        if connection.vendor == "postgresql":
+            for table, column, index in (
+                (message, "content", "chats_message_search_idx"),
+                (chat, "title", "chats_chat_search_idx"),
+            ):
+                cursor.execute(
+                    f"ALTER TABLE {table} ADD COLUMN IF NOT EXISTS search_vector "
+                    f"tsvector GENERATED ALWAYS AS (to_tsvector('{SEARCH_CONFIG}', "
+                    f"coalesce({column}, ''))) STORED"
+                )
+                cursor.execute(
+                    f"CREATE INDEX IF NOT EXISTS {index} ON {table} "
+                    f"USING GIN (search_vector)"
+                )
+            return
+
+        if connection.vendor != "sqlite":
+            return
+
+        # external content tables, the text itself stays in the chat tables
+        cursor.execute(
+            f"CREATE VIEW IF NOT EXISTS {MESSAGE_FTS_SOURCE} AS "
+            f"SELECT m.id AS id, m.content AS content, c.user_id AS user_id "
+            f"FROM {message} m JOIN {chat} c ON c.id = m.chat_id"
+        )
+        cursor.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {MESSAGE_FTS} USING fts5("
+            f"content, user_id, content='{MESSAGE_FTS_SOURCE}', content_rowid='id', "
+            f"tokenize='porter unicode61')"
+        )
+        cursor.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {CHAT_FTS} USING fts5("
+            f"title, user_id, content={chat}, content_rowid='id', "
+            f"tokenize='porter unicode61')"
+        )
+
+        # messages are deleted before their chat, the owner is still there
+        owner = f"(SELECT user_id FROM {chat} WHERE id = {{row}}.chat_id)"
+        triggers = {
+            f"{MESSAGE_FTS}_insert": (
+                f"AFTER INSERT ON {message} BEGIN "
+                f"INSERT INTO {MESSAGE_FTS}(rowid, content, user_id) "
+                f"VALUES (new.id, new.content, {owner.format(row='new')}); END"
+            ),
+            f"{MESSAGE_FTS}_delete": (
+                f"AFTER DELETE ON {message} BEGIN "
+                f"INSERT INTO {MESSAGE_FTS}({MESSAGE_FTS}, rowid, content, user_id) "
+                f"VALUES ('delete', old.id, old.content, {owner.format(row='old')}); END"
+            ),
+            f"{MESSAGE_FTS}_update": (
+                f"AFTER UPDATE OF content ON {message} BEGIN "
+                f"INSERT INTO {MESSAGE_FTS}({MESSAGE_FTS}, rowid, content, user_id) "
+                f"VALUES ('delete', old.id, old.content, {owner.format(row='old')}); "
+                f"INSERT INTO {MESSAGE_FTS}(rowid, content, user_id) "
+                f"VALUES (new.id, new.content, {owner.format(row='new')}); END"
+            ),
+            f"{CHAT_FTS}_insert": (
+                f"AFTER INSERT ON {chat} BEGIN "
+                f"INSERT INTO {CHAT_FTS}(rowid, title, user_id) "
+                f"VALUES (new.id, new.title, new.user_id); END"
+            ),
+            f"{CHAT_FTS}_delete": (
+                f"AFTER DELETE ON {chat} BEGIN "
+                f"INSERT INTO {CHAT_FTS}({CHAT_FTS}, rowid, title, user_id) "
+                f"VALUES ('delete', old.id, old.title, old.user_id); END"
+            ),
+            f"{CHAT_FTS}_update": (
+                f"AFTER UPDATE OF title ON {chat} BEGIN "
+                f"INSERT INTO {CHAT_FTS}({CHAT_FTS}, rowid, title, user_id) "
+                f"VALUES ('delete', old.id, old.title, old.user_id); "
+                f"INSERT INTO {CHAT_FTS}(rowid, title, user_id) "
+                f"VALUES (new.id, new.title, new.user_id); END"
+            ),
+        }
+        cursor.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'trigger' AND name IN "
+            f"({', '.join(['%s'] * len(triggers))})",
+            list(triggers),
+        )
+        existing = {row[0] for row in cursor.fetchall()}
+        for name, body in triggers.items():
+            if name not in existing:
+                cursor.execute(f"CREATE TRIGGER {name} {body}")
+
+        if len(existing) < len(triggers):
+            # rows written while a trigger was missing are not indexed
+            for table in (MESSAGE_FTS, CHAT_FTS):
+                cursor.execute(f"INSERT INTO {table}({table}) VALUES ('rebuild')")
+            logging.info("Rebuilt the full-text search index")
@@ -0,0 +1,237 @@
+"""
+Ranked full-text search over a user's messages and chat titles.
+
+The indexes live outside the generated migrations and are installed by
+chats.schema.install_search_index after every migrate:
+
+- postgres: a generated tsvector column with a GIN index on chats_message
+  and chats_chat, kept up to date by postgres itself
+- sqlite: FTS5 external content tables kept in sync by triggers; the
+  message index also holds the owner's user_id, so a search intersects
+  the user's postings instead of scanning every match
+"""
+
+import re
+import html
+from django.db import connection
+from utils.metrics import timed
+from .models import Chat, Message
+from .fast_serializers import format_rows
+
+SEARCH_CONFIG = "english"
+MAX_QUERY_LENGTH = 200
+MAX_QUERY_TERMS = 10
+SNIPPET_WORDS = 16
+# a chat title match counts this much more than a message match
+TITLE_WEIGHT = 2
+
+MESSAGE_FTS = "chats_message_fts"
+MESSAGE_FTS_SOURCE = "chats_message_search"
+CHAT_FTS = "chats_chat_fts"
+
+# highlight markers, turned into <mark> once the snippet is html escaped
+START_SEL = "\x02"
+STOP_SEL = "\x03"
+
+
+class InvalidSearch(ValueError):
+    """
+    raised for an empty or too long search query
+    """
+
+
+def parse_query(query):
+    query = (query or "").strip()
+    if not query:
+        raise InvalidSearch("Search query is required.")
+    if len(query) > MAX_QUERY_LENGTH:
+        raise InvalidSearch(
+            f"Search query is longer than {MAX_QUERY_LENGTH} characters."
+        )
+    return query
+
+
+def highlight(snippet):
+    """
+    html escaped snippet with the matched words in <mark>
+    """
+    return (
+        html.escape(snippet or "")
+        .replace(START_SEL, "<mark>")
+        .replace(STOP_SEL, "</mark>")
+    )
+
+
+def _fts_terms(query):
+    """
+    every word of the query as a quoted FTS5 string, all of them must match
+    """
+    words = re.findall(r"\w+", query.lower())[:MAX_QUERY_TERMS]
+    return [f'"{word}"' for word in words]
+
+
+def _postgres_hits(user, query, limit, offset):
+    message = connection.ops.quote_name(Message._meta.db_table)
+    chat = connection.ops.quote_name(Chat._meta.db_table)
+    options = (
+        f'StartSel="{START_SEL}", StopSel="{STOP_SEL}", '
+        f"MaxWords={SNIPPET_WORDS}, MinWords=6, MaxFragments=2"
+    )
+    # ts_headline only runs for the rows of the page
+    sql = f"""
+        SELECT hits.kind, hits.id, ts_headline(%s::regconfig, hits.body, q, %s)
+        FROM (
+            SELECT 'message' AS kind, m.id, ts_rank(m.search_vector, q) AS rank,
+                   m.content AS body
+            FROM {message} m JOIN {chat} c ON c.id = m.chat_id,
+                 plainto_tsquery(%s::regconfig, %s) q
+            WHERE c.user_id = %s AND c.deleted_at IS NULL AND m.search_vector @@ q
+            UNION ALL
+            SELECT 'chat', c.id, %s * ts_rank(c.search_vector, q), c.title
+            FROM {chat} c, plainto_tsquery(%s::regconfig, %s) q
+            WHERE c.user_id = %s AND c.deleted_at IS NULL AND c.search_vector @@ q
+            ORDER BY rank DESC, id DESC
+            LIMIT %s OFFSET %s
+        ) hits, plainto_tsquery(%s::regconfig, %s) q
+        ORDER BY hits.rank DESC, hits.id DESC
+    """
+    params = [SEARCH_CONFIG, options]
+    params += [SEARCH_CONFIG, query, user.pk]
+    params += [TITLE_WEIGHT, SEARCH_CONFIG, query, user.pk]
+    params += [limit, offset, SEARCH_CONFIG, query]
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return cursor.fetchall()
+
+
+def _sqlite_hits(user, query, limit, offset):
+    terms = _fts_terms(query)
+    if not terms:
+        return []
+    message_match = " AND ".join(
+        [f'user_id : "{user.pk}"'] + [f"content : {term}" for term in terms]
+    )
+    chat_match = " AND ".join(
+        [f'user_id : "{user.pk}"'] + [f"title : {term}" for term in terms]
+    )
+
+    message = connection.ops.quote_name(Message._meta.db_table)
+    chat = connection.ops.quote_name(Chat._meta.db_table)
+
+    # bm25 is lower for better matches, the user_id column does not score;
+    # deleted chats stay indexed until they are purged, they are left out
+    # here so LIMIT/OFFSET only count visible hits
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            SELECT kind, id FROM (
+                SELECT 'message' AS kind, f.rowid AS id,
+                       -bm25({MESSAGE_FTS}, 1.0, 0.0) AS rank
+                FROM {MESSAGE_FTS} f
+                JOIN {message} m ON m.id = f.rowid
+                JOIN {chat} c ON c.id = m.chat_id AND c.deleted_at IS NULL
+                WHERE {MESSAGE_FTS} MATCH %s
+                UNION ALL
+                SELECT 'chat', f.rowid, -%s * bm25({CHAT_FTS}, 1.0, 0.0)
+                FROM {CHAT_FTS} f
+                JOIN {chat} c ON c.id = f.rowid AND c.deleted_at IS NULL
+                WHERE {CHAT_FTS} MATCH %s
+            )
+            ORDER BY rank DESC, id DESC
+            LIMIT %s OFFSET %s
+            """,
+            [message_match, TITLE_WEIGHT, chat_match, limit, offset],
+        )
+        hits = cursor.fetchall()
+
+        # snippets only for the page
+        snippets = {}
+        for kind, table, match, function in (
+            (
+                "message",
+                MESSAGE_FTS,
+                message_match,
+                "snippet({t}, 0, %s, %s, '...', %s)",
+            ),
+            ("chat", CHAT_FTS, chat_match, "highlight({t}, 0, %s, %s)"),
+        ):
+            ids = [pk for hit_kind, pk in hits if hit_kind == kind]
+            if not ids:
+                continue
+            params = [START_SEL, STOP_SEL]
+            if kind == "message":
+                params.append(SNIPPET_WORDS)
+            cursor.execute(
+                f"SELECT rowid, {function.format(t=table)} FROM {table} "
+                f"WHERE {table} MATCH %s AND rowid IN ({', '.join(['%s'] * len(ids))})",
+                params + [match] + ids,
+            )
+            snippets.update(((kind, pk), text) for pk, text in cursor.fetchall())
+
+    return [(kind, pk, snippets.get((kind, pk))) for kind, pk in hits]
+
+
+@timed("search")
+def search(user, query, limit, offset=0):
+    """
+    One page of matches, best first. Each result is a dict with the
+    matched chat, the matched message (None for a title match) and a
+    highlighted snippet.
+
+    Returns (results, has_more).
+    """
+    if connection.vendor == "postgresql":
+        hits = _postgres_hits(user, query, limit + 1, offset)
+    else:
+        hits = _sqlite_hits(user, query, limit + 1, offset)
+    has_more = len(hits) > limit
+    hits = hits[:limit]
+
+    message_ids = [pk for kind, pk, _ in hits if kind == "message"]
+    chat_ids = [pk for kind, pk, _ in hits if kind == "chat"]
+    messages = {}
+    if message_ids:
+        rows = Message.objects.filter(id__in=message_ids).values(
+            "id", "sender", "timestamp", "chat__unique_hex_id", "chat__title"
+        )
+        messages = {row["id"]: row for row in format_rows(list(rows), ["timestamp"])}
+    chats = {}
+    if chat_ids:
+        chats = {
+            row["id"]: row
+            for row in Chat.objects.filter(id__in=chat_ids).values(
+                "id", "unique_hex_id", "title"
+            )
+        }
+
+    results = []
+    for kind, pk, snippet in hits:
+        if kind == "message" and pk in messages:
+            row = messages[pk]
+            results.append(
+                {
+                    "chat": {
+                        "unique_hex_id": row["chat__unique_hex_id"],
+                        "title": row["chat__title"],
+                    },
+                    "message": {
+                        "id": row["id"],
+                        "sender": row["sender"],
+                        "timestamp": row["timestamp"],
+                    },
+                    "snippet": highlight(snippet),
+                }
+            )
+        elif kind == "chat" and pk in chats:
+            row = chats[pk]
+            results.append(
+                {
+                    "chat": {
+                        "unique_hex_id": row["unique_hex_id"],
+                        "title": row["title"],
+                    },
+                    "message": None,
+                    "snippet": highlight(snippet),
+                }
+            )
+    return results, has_more
@@ -1,6 +1,9 @@
 from rest_framework import serializers
 from .models import Chat, Message
 
+# shared by fast_serializers to format datetimes like the serializers below
+_datetime_field = serializers.DateTimeField()
+
 
 # serialize chat without messages
 class ChatSerializer(serializers.ModelSerializer):
@@ -1,27 +1,85 @@
 import logging
+from asgiref.sync import sync_to_async
 from django.db import transaction
-from django.http import JsonResponse
-from django.db.models import Prefetch
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.db.models import F, Prefetch, prefetch_related_objects
 from django.shortcuts import get_object_or_404
+from django.utils import timezone
 
-from utils.ai import WeatherInformationPipeline
+from utils.warmup import get_pipeline
+from utils.db import QueryCounter
 from utils.helper import extract_data_from_model_response
+from utils.llm import LlmUnavailable
+from utils.metrics import registry, timed
+from utils.stream import ReplyStreamParser, sse_event
+from utils.ratelimit import chat_limiter, rate_limited_response
+from jobs.models import Job
+from jobs.queue import enqueue
 from .models import Chat, Message, ChatContext
+from .context import (
+    CHAT_ORDER_RETRIES,
+    StaleContext,
+    load_prompt_context,
+    aload_prompt_context,
+    schedule_compaction,
+    aschedule_compaction,
+)
+from .archive import restore_chat
+from .purge import InvalidDelete, delete_chats, parse_chat_ids
+from .search import InvalidSearch, parse_query, search
+from .export import FORMATS, InvalidExport, export_filename, export_stream, parse_format
+from .titles import start_title, ready_title, start_atitle, aready_title
+from .pagination import (
+    DEFAULT_PAGE_SIZE,
+    InvalidPageRequest,
+    decode_cursor,
+    keyset_page,
+    parse_page_size,
+)
 from .serializers import (
     ChatSerializer,
     ChatDetailSerializer,
     MessageInputSerializer,
     MessageSerializer,
 )
+from . import fast_serializers
+from .fast_serializers import (
+    CHAT_DATETIME_FIELDS,
+    CHAT_FIELDS,
+    MESSAGE_DATETIME_FIELDS,
+    MESSAGE_FIELDS,
+    format_rows,
+    json_response,
+)
 
 
-def user_chats(current_user):
-    # Get all current_user chats, ordered by updated_at
-    chats = Chat.objects.filter(user=current_user)
+def user_chats(current_user, cursor=None, limit=None):
+    """
+    current_user chats, most recently updated first.
 
-    # Serialize the queryset. 'many=True' indicates that we are serializing a list of objects.
-    serializer = ChatSerializer(chats, many=True)
-    return JsonResponse({"chat_list": serializer.data}, status=200)
+    With a cursor or limit a keyset page on (updated_at, id) is returned
+    together with next_cursor.
+    """
+    paginate = cursor is not None or limit is not None
+    try:
+        page_size = parse_page_size(limit)
+        position = decode_cursor(cursor)
+    except InvalidPageRequest as e:
+        return JsonResponse({"error": str(e)}, status=400)
+
+    chats = Chat.objects.visible().filter(user=current_user)
+    if not paginate:
+        if not fast_serializers.FAST_SERIALIZERS:
+            serializer = ChatSerializer(chats, many=True)
+            return JsonResponse({"chat_list": serializer.data}, status=200)
+        chat_list = fast_serializers.chat_rows(chats.order_by("-updated_at", "-id"))
+        return json_response({"chat_list": chat_list}, status=200)
+
+    rows, next_cursor = keyset_page(
+        chats.values(*CHAT_FIELDS), "updated_at", position, page_size
+    )
+    chat_list = format_rows(rows, CHAT_DATETIME_FIELDS)
+    return json_response({"chat_list": chat_list, "next_cursor": next_cursor})
 
 
 def create_new_chat(data, current_user):
@@ -31,7 +89,9 @@ def create_new_chat(data, current_user):
     if serializer.is_valid():
         # new chat -> linked to the authenticated user. crate context for chat
         chat = serializer.save(user=current_user)
-        _ = ChatContext.objects.create(chat=chat, context_data="no context availabl")
+        _ = ChatContext.objects.create(
+            chat=chat, context_data=ChatContext.DEFAULT_CONTEXT
+        )
         return JsonResponse({"new_chat": serializer.data}, status=201)
     else:
         logging.error(f"Failed to create new chat for user -> {current_user.username}")
@@ -56,105 +116,672 @@ def check_chat_permission(chat, current_user):
     return None
 
 
-def get_single_chat(current_user, unique_hex_id):
+def _history_prefetch():
+    return Prefetch("messages", queryset=Message.objects.order_by("timestamp", "id"))
+
+
+def get_single_chat(current_user, unique_hex_id, limit=None):
+    """
+    Load a chat with its messages. When limit is given only the newest
+    page of messages is returned together with a cursor for older ones.
+    """
+    if not (len(unique_hex_id) == 20 and unique_hex_id.isalnum()):
+        return JsonResponse({"error": "Invalid conversation ID format."}, status=400)
+
+    try:
+        page_size = None if limit is None else parse_page_size(limit)
+    except InvalidPageRequest as e:
+        return JsonResponse({"error": str(e)}, status=400)
+
+    if page_size is None and not fast_serializers.FAST_SERIALIZERS:
+        # load the chat
+        chat = get_object_or_404(
+            Chat.objects.visible()
+            .select_related("user", "context")
+            .prefetch_related(_history_prefetch()),
+            unique_hex_id=unique_hex_id,
+        )
+    else:
+        chat = get_object_or_404(
+            Chat.objects.visible().select_related("user"), unique_hex_id=unique_hex_id
+        )
+
+    permission = check_chat_permission(chat, current_user)
+    if permission:
+        return permission
+
+    if chat.archived_at is not None:
+        restore_chat(chat)
+        if hasattr(chat, "_prefetched_objects_cache"):
+            chat._prefetched_objects_cache.pop("messages", None)
+            prefetch_related_objects([chat], _history_prefetch())
+
+    if page_size is None and not fast_serializers.FAST_SERIALIZERS:
+        serializer = ChatDetailSerializer(chat)
+        return JsonResponse({"single_chat": serializer.data}, status=200)
+
+    single_chat = format_rows(
+        [{field: getattr(chat, field) for field in CHAT_FIELDS}], CHAT_DATETIME_FIELDS
+    )[0]
+    if page_size is None:
+        single_chat["messages"] = fast_serializers.message_rows(
+            Message.objects.filter(chat=chat).order_by("timestamp", "id")
+        )
+    else:
+        single_chat["messages"], single_chat["next_cursor"] = message_page(
+            chat, page_size=page_size
+        )
+    return json_response({"single_chat": single_chat}, status=200)
+
+
+def message_page(chat, cursor=None, page_size=DEFAULT_PAGE_SIZE):
+    """
+    Keyset page of a chat's messages on (timestamp, id).
+
+    Returns the newest page_size messages older than cursor as rows
+    shaped like MessageSerializer, oldest first, and the cursor of the
+    next (older) page or None.
+    """
+    rows, next_cursor = keyset_page(
+        Message.objects.filter(chat=chat).values(*MESSAGE_FIELDS),
+        "timestamp",
+        cursor,
+        page_size,
+    )
+    rows.reverse()
+    return format_rows(rows, MESSAGE_DATETIME_FIELDS), next_cursor
+
+
+def get_chat_messages(current_user, unique_hex_id, cursor=None, limit=None):
+    """
+    One page of chat history, newest first page, "load older" via cursor.
+    """
     if not (len(unique_hex_id) == 20 and unique_hex_id.isalnum()):
         return JsonResponse({"error": "Invalid conversation ID format."}, status=400)
 
-    # load the chat
+    try:
+        page_size = parse_page_size(limit)
+        position = decode_cursor(cursor)
+    except InvalidPageRequest as e:
+        return JsonResponse({"error": str(e)}, status=400)
+
     chat = get_object_or_404(
-        Chat.objects.select_related("user", "context").prefetch_related(
-            Prefetch("messages", queryset=Message.objects.order_by("timestamp"))
-        ),
-        unique_hex_id=unique_hex_id,
+        Chat.objects.visible().select_related("user"), unique_hex_id=unique_hex_id
     )
 
     permission = check_chat_permission(chat, current_user)
     if permission:
         return permission
 
-    serializer = ChatDetailSerializer(chat)
-    return JsonResponse({"single_chat": serializer.data}, status=200)
+    if chat.archived_at is not None:
+        restore_chat(chat)
+
+    messages, next_cursor = message_page(chat, position, page_size)
+    return json_response({"messages": messages, "next_cursor": next_cursor})
+
+
+def search_messages(current_user, query, limit=None, offset=None):
+    """
+    Ranked full-text search over current_user messages and chat titles,
+    one page of results from offset with next_offset for the following one.
+
+    Messages of archived chats are not indexed until the chat is opened
+    again, archived_chats counts the chats whose messages were skipped.
+    """
+    try:
+        query = parse_query(query)
+        page_size = parse_page_size(limit)
+        offset = int(offset or 0)
+        if offset < 0:
+            raise ValueError
+    except (InvalidSearch, InvalidPageRequest) as e:
+        return JsonResponse({"error": str(e)}, status=400)
+    except ValueError:
+        return JsonResponse({"error": "Invalid offset."}, status=400)
+
+    results, has_more = search(current_user, query, page_size, offset)
+    next_offset = offset + page_size if has_more else None
+    archived = (
+        Chat.objects.visible()
+        .filter(user=current_user, archived_at__isnull=False)
+        .count()
+    )
+    return json_response(
+        {"results": results, "next_offset": next_offset, "archived_chats": archived}
+    )
+
+
+def export_chats(current_user, fmt=None, compress=False, unique_hex_id=None):
+    """
+    Stream every chat of current_user (or the one unique_hex_id chat)
+    with its messages as an NDJSON or CSV download, optionally gzipped.
+    """
+    try:
+        fmt = parse_format(fmt)
+    except InvalidExport as e:
+        return JsonResponse({"error": str(e)}, status=400)
+
+    chat_ids = None
+    if unique_hex_id:
+        if not (len(unique_hex_id) == 20 and unique_hex_id.isalnum()):
+            return JsonResponse(
+                {"error": "Invalid conversation ID format."}, status=400
+            )
+        chat = get_object_or_404(
+            Chat.objects.visible().select_related("user"), unique_hex_id=unique_hex_id
+        )
+        permission = check_chat_permission(chat, current_user)
+        if permission:
+            return permission
+        chat_ids = [chat.id]
+
+    response = StreamingHttpResponse(
+        export_stream(current_user, fmt, compress, chat_ids),
+        content_type="application/gzip" if compress else FORMATS[fmt],
+    )
+    filename = export_filename(current_user, fmt, compress)
+    response["Content-Disposition"] = f'attachment; filename="{filename}"'
+    response["X-Accel-Buffering"] = "no"
+    return response
 
 
 def delete_user_chat(current_user, chat_id):
-    chat = get_object_or_404(Chat, id=chat_id)
+    """
+    Hide the chat right away, its rows are purged in the background.
+    """
+    chat = get_object_or_404(Chat.objects.visible(), id=chat_id)
 
     permission = check_chat_permission(chat, current_user)
     if permission:
         return permission
 
-    title = chat.title
-    # delete the chat
-    chat.delete()
-    return JsonResponse({"title": title}, status=204)
+    delete_chats(current_user, [chat.id])
+    return HttpResponse(status=204)
 
 
-def inbox(data, current_user):
+def delete_user_chats(current_user, data):
     """
-    Handle incoming user messages, process through pipeline,
-    and return both user and model responses in JSON.
+    Delete many chats of current_user at once, body {"chat_ids": [...]}.
+    Ids that are unknown, already deleted or not owned are reported
+    back in not_found.
+    """
+    try:
+        chat_ids = parse_chat_ids(
+            data.get("chat_ids") if isinstance(data, dict) else None
+        )
+    except InvalidDelete as e:
+        return JsonResponse({"error": str(e)}, status=400)
+
+    deleted = delete_chats(current_user, chat_ids)
+    not_found = sorted(set(chat_ids) - set(deleted))
+    return JsonResponse({"deleted": sorted(deleted), "not_found": not_found})
+
+
+@timed("chat_lookup")
+def load_inbox_chat(data, current_user):
+    """
+    Validate a chatting payload and load the target chat.
+
+    Returns:
+        (chat, user_input, None) or (None, None, JsonResponse) on failure.
     """
 
     # Validate request data
     serializer = MessageInputSerializer(data=data)
     if not serializer.is_valid():
         logging.error("Invalid chat request payload")
-        return JsonResponse(serializer.errors, status=400)
+        return None, None, JsonResponse(serializer.errors, status=400)
 
     validated = serializer.validated_data
     chat_id = validated["chat_id"]
     user_input = validated["content"]
 
     try:
-        chat = Chat.objects.select_related("user", "context").get(id=chat_id)
+        chat = Chat.objects.visible().select_related("user", "context").get(id=chat_id)
     except Chat.DoesNotExist:
         logging.warning(f"Chat not found for id: {chat_id}")
-        return JsonResponse({"error": "Conversation not found."}, status=404)
+        return (
+            None,
+            None,
+            JsonResponse({"error": "Conversation not found."}, status=404),
+        )
 
     # Verify permissions
     permission = check_chat_permission(chat, current_user)
     if permission:
-        return permission
+        return None, None, permission
 
-    # instantiate the agentic pipeline
-    pipeline = WeatherInformationPipeline()
+    if chat.archived_at is not None:
+        restore_chat(chat)
+
+    return chat, user_input, None
+
+
+@timed("chat_lookup")
+async def aload_inbox_chat(data, current_user):
+    """
+    Async version of load_inbox_chat.
+    """
+
+    # Validate request data
+    serializer = MessageInputSerializer(data=data)
+    if not serializer.is_valid():
+        logging.error("Invalid chat request payload")
+        return None, None, JsonResponse(serializer.errors, status=400)
+
+    validated = serializer.validated_data
+    chat_id = validated["chat_id"]
+    user_input = validated["content"]
 
     try:
-        context_data = chat.context.context_data
-        response = pipeline.chat(user_input, context_data)
-        model_reply, new_context = extract_data_from_model_response(response)
+        chat = (
+            await Chat.objects.visible()
+            .select_related("user", "context")
+            .aget(id=chat_id)
+        )
+    except Chat.DoesNotExist:
+        logging.warning(f"Chat not found for id: {chat_id}")
+        return (
+            None,
+            None,
+            JsonResponse({"error": "Conversation not found."}, status=404),
+        )
 
-        # check title
-        generated_title = None
-        if chat.title == Chat.DEFAULT_TITLE:
-            generated_title = pipeline.generate_title(user_input, model_reply)
+    # Verify permissions
+    permission = check_chat_permission(chat, current_user)
+    if permission:
+        return None, None, permission
 
-        # Atomic DB writes
-        with transaction.atomic():
-            user_msg = Message.objects.create(
-                chat=chat, sender="user", content=user_input
+    if chat.archived_at is not None:
+        await sync_to_async(restore_chat)(chat)
+
+    return chat, user_input, None
+
+
+EXCHANGE_QUERIES = registry.histogram(
+    "chat_exchange_queries",
+    "SQL statements run to store one exchange",
+    buckets=(2, 3, 4, 5, 6, 8, 12),
+)
+
+STALE_CONTEXT_ERROR = (
+    "Conversation changed while replying, please send the message again."
+)
+LLM_UNAVAILABLE_ERROR = (
+    "The assistant is unavailable right now, please try again later."
+)
+
+
+def reply_in_order(chat, user_input, reply, title=None, on_stored=None):
+    """
+    Generate a reply with reply(context_data) and store the exchange.
+
+    Messages of one chat are answered in order without holding a lock
+    during the LLM call: save_exchange only succeeds when no other
+    exchange was stored since the context was loaded, otherwise the
+    reply is generated again from the fresh context, at most
+    CHAT_ORDER_RETRIES more times.
+
+    title() is called once, after the first reply, on_stored is passed
+    to save_exchange.
+    Returns (user_msg, model_msg, generated_title, pending rows).
+    """
+    generated_title = None
+    for attempt in range(CHAT_ORDER_RETRIES + 1):
+        context_data, pending = load_prompt_context(chat)
+        model_reply = reply(context_data)
+        if attempt == 0 and title:
+            generated_title = title()
+
+        try:
+            user_msg, model_msg = save_exchange(
+                chat, user_input, model_reply, generated_title, on_stored
             )
+            return user_msg, model_msg, generated_title, pending
+        except StaleContext:
+            if attempt == CHAT_ORDER_RETRIES:
+                raise
+            logging.info(f"Chat {chat.id} changed during a reply, generating again")
+            chat.context.refresh_from_db()
+
 
-            model_msg = Message.objects.create(
-                chat=chat, sender="model", content=model_reply
+async def areply_in_order(chat, user_input, reply, title=None):
+    """
+    Async version of reply_in_order, reply and title are awaited.
+    """
+    generated_title = None
+    for attempt in range(CHAT_ORDER_RETRIES + 1):
+        context_data, pending = await aload_prompt_context(chat)
+        model_reply = await reply(context_data)
+        if attempt == 0 and title:
+            generated_title = await title()
+
+        try:
+            # transaction.atomic has no async api, run the write batch in a thread
+            user_msg, model_msg = await sync_to_async(save_exchange)(
+                chat, user_input, model_reply, generated_title
             )
+            return user_msg, model_msg, generated_title, pending
+        except StaleContext:
+            if attempt == CHAT_ORDER_RETRIES:
+                raise
+            logging.info(f"Chat {chat.id} changed during a reply, generating again")
+            await chat.context.arefresh_from_db()
 
-            _ = ChatContext.objects.filter(chat=chat).update(context_data=new_context)
 
-            # save title if generated
-            if generated_title:
-                chat.title = generated_title
-                chat.save(update_fields=["title"])
+def inbox(data, current_user):
+    """
+    Handle incoming user messages, process through pipeline,
+    and return both user and model responses in JSON.
+    """
+    chat, user_input, error = load_inbox_chat(data, current_user)
+    if error:
+        return error
 
-        user_data = MessageSerializer(user_msg).data
-        model_data = MessageSerializer(model_msg).data
+    # shared agentic pipeline for this worker
+    pipeline = get_pipeline()
 
-        response_data = {"user": user_data, "model": model_data}
-        if generated_title:
-            response_data["title"] = generated_title
+    # a new chat gets its title generated next to the reply
+    title_future = start_title(chat, pipeline, user_input)
 
-        return JsonResponse(response_data, status=200)
+    def reply(context_data):
+        response = pipeline.chat(user_input, context_data)
+        model_reply, _ = extract_data_from_model_response(response)
+        return model_reply
 
+    try:
+        user_msg, model_msg, generated_title, pending = reply_in_order(
+            chat, user_input, reply, lambda: ready_title(title_future, chat)
+        )
+        schedule_compaction(chat, pending, user_input, model_msg.content)
+        return JsonResponse(
+            exchange_response(user_msg, model_msg, generated_title), status=200
+        )
+
+    except StaleContext:
+        return JsonResponse({"error": STALE_CONTEXT_ERROR}, status=409)
+    except LlmUnavailable as e:
+        logging.error(f"Chat model unavailable. error: {str(e)}")
+        return JsonResponse({"error": LLM_UNAVAILABLE_ERROR}, status=503)
     except Exception as e:
         logging.error(f"Chat message processing failed. error: {str(e)}")
         return JsonResponse({"error": "Something went wrong!"}, status=500)
+
+
+async def ainbox(data, current_user):
+    """
+    Async version of inbox. The LLM calls are awaited, so a single
+    ASGI worker can keep many slow model calls in flight.
+    """
+    chat, user_input, error = await aload_inbox_chat(data, current_user)
+    if error:
+        return error
+
+    # shared agentic pipeline for this worker
+    pipeline = get_pipeline()
+
+    # a new chat gets its title generated next to the reply
+    title_task = start_atitle(chat, pipeline, user_input)
+
+    async def reply(context_data):
+        response = await pipeline.achat(user_input, context_data)
+        model_reply, _ = extract_data_from_model_response(response)
+        return model_reply
+
+    try:
+        user_msg, model_msg, generated_title, pending = await areply_in_order(
+            chat, user_input, reply, lambda: aready_title(title_task, chat)
+        )
+        await aschedule_compaction(chat, pending, user_input, model_msg.content)
+        return JsonResponse(
+            exchange_response(user_msg, model_msg, generated_title), status=200
+        )
+
+    except StaleContext:
+        return JsonResponse({"error": STALE_CONTEXT_ERROR}, status=409)
+    except LlmUnavailable as e:
+        logging.error(f"Chat model unavailable. error: {str(e)}")
+        return JsonResponse({"error": LLM_UNAVAILABLE_ERROR}, status=503)
+    except Exception as e:
+        logging.error(f"Chat message processing failed. error: {str(e)}")
+        return JsonResponse({"error": "Something went wrong!"}, status=500)
+
+
+def inbox_stream(data, current_user):
+    """
+    Streaming version of inbox. Reply tokens are sent as Server-Sent
+    Events while the model generates them, messages and context are
+    saved once the stream ends.
+
+    events: start -> token* -> (retry -> token*)* -> done | error
+
+    retry means another message of the chat was stored first, the
+    tokens sent so far are dropped and the reply starts over.
+    """
+    chat, user_input, error = load_inbox_chat(data, current_user)
+    if error:
+        return error
+
+    pipeline = get_pipeline()
+
+    def events():
+        yield sse_event("start", {"chat_id": chat.id})
+        title_future = start_title(chat, pipeline, user_input)
+        generated_title = None
+        try:
+            for attempt in range(CHAT_ORDER_RETRIES + 1):
+                if attempt:
+                    chat.context.refresh_from_db()
+                    yield sse_event("retry", {})
+
+                parser = ReplyStreamParser()
+                context_data, pending = load_prompt_context(chat)
+                for chunk in pipeline.stream_chat(user_input, context_data):
+                    delta = parser.feed(chunk)
+                    if delta:
+                        yield sse_event("token", {"text": delta})
+
+                model_reply, _ = extract_data_from_model_response(parser.text)
+                remainder = parser.remainder(model_reply)
+                if remainder:
+                    yield sse_event("token", {"text": remainder})
+
+                if attempt == 0:
+                    generated_title = ready_title(title_future, chat)
+
+                try:
+                    user_msg, model_msg = save_exchange(
+                        chat, user_input, model_reply, generated_title
+                    )
+                    break
+                except StaleContext:
+                    if attempt == CHAT_ORDER_RETRIES:
+                        raise
+
+            schedule_compaction(chat, pending, user_input, model_reply)
+            yield sse_event(
+                "done", exchange_response(user_msg, model_msg, generated_title)
+            )
+
+        except StaleContext:
+            yield sse_event("error", {"error": STALE_CONTEXT_ERROR})
+        except Exception as e:
+            logging.error(f"Chat message streaming failed. error: {str(e)}")
+            yield sse_event("error", {"error": "Something went wrong!"})
+
+    return event_stream_response(events())
+
+
+async def ainbox_stream(data, current_user):
+    """
+    Async version of inbox_stream.
+    """
+    chat, user_input, error = await aload_inbox_chat(data, current_user)
+    if error:
+        return error
+
+    pipeline = get_pipeline()
+
+    async def events():
+        yield sse_event("start", {"chat_id": chat.id})
+        title_task = start_atitle(chat, pipeline, user_input)
+        generated_title = None
+        try:
+            for attempt in range(CHAT_ORDER_RETRIES + 1):
+                if attempt:
+                    await chat.context.arefresh_from_db()
+                    yield sse_event("retry", {})
+
+                parser = ReplyStreamParser()
+                context_data, pending = await aload_prompt_context(chat)
+                async for chunk in pipeline.astream_chat(user_input, context_data):
+                    delta = parser.feed(chunk)
+                    if delta:
+                        yield sse_event("token", {"text": delta})
+
+                model_reply, _ = extract_data_from_model_response(parser.text)
+                remainder = parser.remainder(model_reply)
+                if remainder:
+                    yield sse_event("token", {"text": remainder})
+
+                if attempt == 0:
+                    generated_title = await aready_title(title_task, chat)
+
+                try:
+                    user_msg, model_msg = await sync_to_async(save_exchange)(
+                        chat, user_input, model_reply, generated_title
+                    )
+                    break
+                except StaleContext:
+                    if attempt == CHAT_ORDER_RETRIES:
+                        raise
+
+            await aschedule_compaction(chat, pending, user_input, model_reply)
+            yield sse_event(
+                "done", exchange_response(user_msg, model_msg, generated_title)
+            )
+
+        except StaleContext:
+            yield sse_event("error", {"error": STALE_CONTEXT_ERROR})
+        except Exception as e:
+            logging.error(f"Chat message streaming failed. error: {str(e)}")
+            yield sse_event("error", {"error": "Something went wrong!"})
+
+    return event_stream_response(events())
+
+
+def enqueue_inbox(data, current_user):
+    """
+    Queue version of inbox. The reply (and the title of a new chat) is
+    produced by manage.py run_llm_workers, the client polls
+    api-v2/jobs/<job_id>/ for the result.
+    """
+    chat, user_input, error = load_inbox_chat(data, current_user)
+    if error:
+        return error
+
+    error = queued_replies_limit(chat, current_user)
+    if error:
+        return error
+
+    payload = {"chat_id": chat.id, "content": user_input}
+    reply_job = enqueue("chat_reply", payload, user=current_user)
+
+    title_job = None
+    if chat.title == Chat.DEFAULT_TITLE:
+        title_job = enqueue("chat_title", payload, user=current_user)
+
+    return JsonResponse(
+        {
+            "job_id": reply_job.id,
+            "title_job_id": title_job.id if title_job else None,
+            "status": reply_job.status,
+        },
+        status=202,
+    )
+
+
+def queued_replies_limit(chat, user):
+    """
+    The in-flight cap of the chatting endpoints applied to queued replies:
+    429 while a reply of this chat, or CHAT_MAX_IN_FLIGHT replies of the
+    user, are pending or running.
+    """
+    if chat_limiter.max_in_flight <= 0:
+        return None
+    unfinished = Job.objects.filter(
+        kind="chat_reply", user=user, status__in=[Job.PENDING, Job.RUNNING]
+    )
+    if unfinished.filter(payload__chat_id=chat.id).exists():
+        return rate_limited_response("chat_busy", 1)
+    if unfinished.count() >= chat_limiter.max_in_flight:
+        return rate_limited_response("in_flight", 1)
+    return None
+
+
+def event_stream_response(events):
+    """
+    wrap an SSE generator, disable caching and proxy buffering
+    """
+    response = StreamingHttpResponse(events, content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"
+    return response
+
+
+@timed("db_write")
+def save_exchange(chat, user_input, model_reply, generated_title=None, on_stored=None):
+    """
+    Atomically store one exchange in as few statements as possible and
+    return both messages:
+
+    - the context version the reply was generated from is checked and
+      bumped, StaleContext is raised when another exchange came first
+    - both messages in one bulk insert (ids come back with RETURNING)
+    - updated_at, plus the generated title, in one update
+    - on_stored(user_msg, model_msg), if given, in the same transaction
+
+    The context summary is not rewritten per message, see chats.context.
+    """
+    user_msg = Message(chat=chat, sender="user", content=user_input)
+    model_msg = Message(chat=chat, sender="model", content=model_reply)
+
+    # update() skips auto_now, so updated_at is set explicitly
+    chat_fields = {"updated_at": timezone.now()}
+    if generated_title:
+        chat_fields["title"] = generated_title
+
+    context = chat.context
+    with QueryCounter() as queries, transaction.atomic():
+        # optimistic lock, the row is only locked until this commit
+        bumped = ChatContext.objects.filter(pk=chat.pk, version=context.version).update(
+            version=F("version") + 1
+        )
+        if not bumped:
+            raise StaleContext(f"chat {chat.pk} changed while the reply was generated")
+
+        Message.objects.bulk_create([user_msg, model_msg])
+        _ = Chat.objects.filter(pk=chat.pk).update(**chat_fields)
+        if on_stored:
+            on_stored(user_msg, model_msg)
+
+    context.version += 1
+    for field, value in chat_fields.items():
+        setattr(chat, field, value)
+
+    EXCHANGE_QUERIES.observe(queries.count)
+    return user_msg, model_msg
+
+
+@timed("serialize")
+def exchange_response(user_msg, model_msg, generated_title=None):
+    """
+    JSON body returned for a processed message
+    """
+    response_data = {
+        "user": MessageSerializer(user_msg).data,
+        "model": MessageSerializer(model_msg).data,
+    }
+    if generated_title:
+        response_data["title"] = generated_title
+    return response_data
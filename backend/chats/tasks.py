@@ -0,0 +1,87 @@
+from jobs.models import Job
+from jobs.registry import handler
+from utils.warmup import get_pipeline
+from utils.helper import extract_data_from_model_response
+from .models import Chat, ChatContext, Message
+from .context import compact_context, schedule_compaction
+from .titles import save_title
+from .purge import purge_chat
+
+
+@handler("chat_reply")
+def chat_reply(job):
+    """
+    payload: {"chat_id", "content"}, result: the same body inbox returns
+
+    The stored message ids are written to the job's result in the
+    transaction that stores the exchange, a retry after that point only
+    rebuilds the response instead of replying twice.
+    """
+    # the service module pulls in the API stack (DRF), only the worker
+    # running this job needs it, not every process that loads the handlers
+    from .service import reply_in_order, exchange_response
+
+    stored = (job.result or {}).get("stored")
+    if stored:
+        user_msg, model_msg = Message.objects.filter(id__in=stored).order_by("id")
+        return exchange_response(user_msg, model_msg)
+
+    def mark_stored(user_msg, model_msg):
+        result = {"stored": [user_msg.id, model_msg.id]}
+        _ = Job.objects.filter(pk=job.pk).update(result=result)
+
+    chat = Chat.objects.select_related("context").get(id=job.payload["chat_id"])
+    user_input = job.payload["content"]
+
+    def reply(context_data):
+        response = get_pipeline().chat(user_input, context_data)
+        model_reply, _ = extract_data_from_model_response(response)
+        return model_reply
+
+    # a StaleContext after the retries fails this attempt, the queue retries it
+    user_msg, model_msg, _, pending = reply_in_order(
+        chat, user_input, reply, on_stored=mark_stored
+    )
+
+    schedule_compaction(chat, pending, user_input, model_msg.content)
+    return exchange_response(user_msg, model_msg)
+
+
+@handler("chat_title")
+def chat_title(job):
+    """
+    payload: {"chat_id", "content"}, result: {"title"}
+    """
+    title = get_pipeline().generate_title(job.payload["content"])
+    save_title(job.payload["chat_id"], title)
+    return {"title": title}
+
+
+@handler("chat_summary")
+def chat_summary(job):
+    """
+    payload: {"chat_id", "force"}, result: {"compacted", "context"}
+
+    fold everything older than the message window into the summary,
+    only when the context is over budget unless force is set
+    """
+    force = job.payload.get("force", True)
+    compacted = compact_context(job.payload["chat_id"], force=force)
+    context = ChatContext.objects.get(chat_id=job.payload["chat_id"])
+    return {"compacted": compacted, "context": context.context_data}
+
+
+@handler("purge_chats")
+def purge_chats(job):
+    """
+    payload: {"chat_ids"}, result: {"chats", "messages"}
+
+    remove chats marked deleted by chats.purge.delete_chats
+    """
+    chats = messages = 0
+    for chat_id in job.payload["chat_ids"]:
+        purged = purge_chat(chat_id)
+        if purged is not None:
+            chats += 1
+            messages += purged
+    return {"chats": chats, "messages": messages}
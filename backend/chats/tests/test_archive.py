@@ -0,0 +1,202 @@
+import io
+import json
+from datetime import timedelta
+from unittest.mock import patch
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import timezone
+from users.models import User
+from chats.models import Chat, ChatArchive, ChatContext, Message
+from chats import service
+from chats.archive import archive_chat, idle_since, pack, unpack
+from chats.export import export_stream
+
+
+class ArchiveTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(telegram_id=9090, username="olga")
+        self.chat = self.idle_chat("Old trip")
+        self.before = idle_since(30)
+
+    def idle_chat(self, title, days=60, messages=5):
+        chat = Chat.objects.create(user=self.user, title=title)
+        ChatContext.objects.create(chat=chat, context_data=f"summary of {title}")
+        start = timezone.now() - timedelta(days=days)
+        Message.objects.bulk_create(
+            Message(
+                chat=chat,
+                sender="user" if i % 2 == 0 else "model",
+                content=f"{title} message {i} " + "rain in london " * 20,
+                timestamp=start + timedelta(seconds=i),
+            )
+            for i in range(messages)
+        )
+        Chat.objects.filter(pk=chat.pk).update(updated_at=start)
+        chat.refresh_from_db()
+        return chat
+
+    def rows(self, chat):
+        return list(
+            Message.objects.filter(chat=chat)
+            .order_by("timestamp", "id")
+            .values_list("id", "sender", "timestamp", "content")
+        )
+
+    def test_archive_moves_messages_into_one_compressed_row(self):
+        rows = self.rows(self.chat)
+
+        self.assertEqual(archive_chat(self.chat.pk, self.before), 5)
+
+        archive = ChatArchive.objects.get(chat=self.chat)
+        self.assertEqual(archive.message_count, 5)
+        self.assertLess(len(archive.data), sum(len(row[3]) for row in rows) / 5)
+        self.assertFalse(Message.objects.filter(chat=self.chat).exists())
+        self.assertEqual(ChatContext.objects.get(chat=self.chat).context_data, "")
+        chat = Chat.objects.get(pk=self.chat.pk)
+        self.assertIsNotNone(chat.archived_at)
+        self.assertEqual(chat.updated_at, self.chat.updated_at)
+
+        # archived once only
+        self.assertIsNone(archive_chat(self.chat.pk, self.before))
+
+    def test_active_chat_is_not_archived(self):
+        recent = self.idle_chat("Recent", days=1)
+
+        self.assertIsNone(archive_chat(recent.pk, self.before))
+        self.assertEqual(Message.objects.filter(chat=recent).count(), 5)
+
+    def test_opening_an_archived_chat_restores_it(self):
+        rows = self.rows(self.chat)
+        archive_chat(self.chat.pk, self.before)
+
+        response = service.get_single_chat(self.user, self.chat.unique_hex_id)
+
+        self.assertEqual(response.status_code, 200)
+        messages = json.loads(response.content)["single_chat"]["messages"]
+        self.assertEqual([m["id"] for m in messages], [row[0] for row in rows])
+        self.assertEqual(self.rows(self.chat), rows)
+        self.assertFalse(ChatArchive.objects.filter(chat=self.chat).exists())
+        self.assertIsNone(Chat.objects.get(pk=self.chat.pk).archived_at)
+        self.assertEqual(
+            ChatContext.objects.get(chat=self.chat).context_data,
+            "summary of Old trip",
+        )
+        # the search index follows the restored rows
+        found = json.loads(service.search_messages(self.user, "london").content)
+        self.assertEqual(len(found["results"]), 5)
+
+    def test_slow_path_and_history_page_restore(self):
+        archive_chat(self.chat.pk, self.before)
+        with patch("chats.fast_serializers.FAST_SERIALIZERS", False):
+            response = service.get_single_chat(self.user, self.chat.unique_hex_id)
+        messages = json.loads(response.content)["single_chat"]["messages"]
+        self.assertEqual(len(messages), 5)
+
+        other = self.idle_chat("Other")
+        archive_chat(other.pk, self.before)
+        response = service.get_chat_messages(self.user, other.unique_hex_id, limit="3")
+        self.assertEqual(len(json.loads(response.content)["messages"]), 3)
+        self.assertEqual(Message.objects.filter(chat=other).count(), 5)
+
+    def test_chatting_restores_the_context(self):
+        archive_chat(self.chat.pk, self.before)
+
+        chat, _, error = service.load_inbox_chat(
+            {"chat_id": self.chat.pk, "content": "and today?"}, self.user
+        )
+
+        self.assertIsNone(error)
+        self.assertIsNone(chat.archived_at)
+        self.assertEqual(chat.context.context_data, "summary of Old trip")
+        self.assertEqual(Message.objects.filter(chat=self.chat).count(), 5)
+
+    def test_messages_stored_while_archived_are_kept(self):
+        archive_chat(self.chat.pk, self.before)
+        Message.objects.create(chat=self.chat, sender="user", content="late")
+
+        service.get_single_chat(self.user, self.chat.unique_hex_id)
+
+        self.assertEqual(Message.objects.filter(chat=self.chat).count(), 6)
+
+    def test_other_users_cannot_restore(self):
+        archive_chat(self.chat.pk, self.before)
+        other = User.objects.create(telegram_id=9091, username="piet")
+
+        response = service.get_single_chat(other, self.chat.unique_hex_id)
+
+        self.assertEqual(response.status_code, 403)
+        self.assertTrue(ChatArchive.objects.filter(chat=self.chat).exists())
+
+    def test_export_reads_the_archive_without_restoring(self):
+        expected = self.export()
+        archive_chat(self.chat.pk, self.before)
+
+        self.assertEqual(self.export(), expected)
+        self.assertTrue(ChatArchive.objects.filter(chat=self.chat).exists())
+
+    def export(self):
+        return b"".join(export_stream(self.user, "ndjson", chunk_size=2))
+
+    def test_search_reports_archived_chats(self):
+        """Archived messages leave the index, the response says so"""
+        archive_chat(self.chat.pk, self.before)
+
+        found = json.loads(service.search_messages(self.user, "london").content)
+        self.assertEqual(found["results"], [])
+        self.assertEqual(found["archived_chats"], 1)
+        titles = json.loads(service.search_messages(self.user, "trip").content)
+        self.assertEqual(len(titles["results"]), 1)
+
+        service.get_single_chat(self.user, self.chat.unique_hex_id)
+
+        found = json.loads(service.search_messages(self.user, "london").content)
+        self.assertEqual(len(found["results"]), 5)
+        self.assertEqual(found["archived_chats"], 0)
+
+    def test_pack_round_trip(self):
+        now = timezone.now()
+        rows = [(i, "user", now, f"line {i}\nwith ünïcode") for i in range(3000)]
+
+        data, count = pack("summary", rows)
+        unpacked = list(unpack("zlib", data, read_size=97))
+
+        self.assertEqual(count, 3000)
+        self.assertEqual(unpacked[0], {"context": "summary"})
+        self.assertEqual(unpacked[1:], rows)
+
+
+class ArchiveCommandTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(telegram_id=9092, username="rhea")
+        old = timezone.now() - timedelta(days=200)
+        self.chats = []
+        for i in range(5):
+            chat = Chat.objects.create(user=self.user, title=f"Chat {i}")
+            Message.objects.create(chat=chat, sender="user", content=f"hello {i}")
+            self.chats.append(chat)
+        # the last chat is still in use
+        Chat.objects.filter(pk__in=[c.pk for c in self.chats[:4]]).update(
+            updated_at=old
+        )
+
+    def call(self, *args):
+        out = io.StringIO()
+        call_command("archive_chats", "--days", "90", *args, stdout=out)
+        return out.getvalue()
+
+    def test_dry_run_only_counts(self):
+        self.assertIn("4 chats", self.call("--dry-run"))
+        self.assertFalse(ChatArchive.objects.exists())
+
+    def test_batches_and_resumes(self):
+        self.call("--batch-size", "1", "--limit", "3")
+        self.assertEqual(ChatArchive.objects.count(), 3)
+
+        output = self.call("--batch-size", "2")
+
+        self.assertIn("done: archived 1 chats, 1 messages", output)
+        self.assertEqual(
+            set(ChatArchive.objects.values_list("chat_id", flat=True)),
+            {chat.pk for chat in self.chats[:4]},
+        )
+        self.assertEqual(Message.objects.filter(chat=self.chats[4]).count(), 1)
@@ -0,0 +1,226 @@
+import json
+import time
+from unittest.mock import patch
+from django.test import TestCase, TransactionTestCase
+from users.models import User
+from chats import context, service
+from chats.models import Chat, ChatContext, Message
+from chats.schema import backfill_summarized_until
+from jobs import queue
+from jobs.models import Job
+
+
+class ContextCompactionTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(telegram_id=6161, username="compact")
+        self.chat = Chat.objects.create(user=self.user, title="Long Chat")
+        self.context = ChatContext.objects.create(
+            chat=self.chat, context_data="summary"
+        )
+
+    def add_messages(self, count, size=10):
+        return [
+            Message.objects.create(
+                chat=self.chat,
+                sender="user" if i % 2 == 0 else "model",
+                content=f"{i}".ljust(size, "x"),
+            )
+            for i in range(count)
+        ]
+
+    def test_new_chat_sends_bare_summary(self):
+        """No messages yet, so openers keep a shareable context"""
+        prompt, rows = context.load_prompt_context(self.chat)
+
+        self.assertEqual(prompt, "summary")
+        self.assertEqual(rows, [])
+
+    def test_prompt_holds_summary_and_pending_messages(self):
+        messages = self.add_messages(4, size=2)
+        ChatContext.objects.filter(chat=self.chat).update(
+            summarized_until=messages[1].id
+        )
+        self.chat.context.refresh_from_db()
+
+        prompt, rows = context.load_prompt_context(self.chat)
+
+        self.assertEqual(prompt, "summary\nRecent messages:\nuser: 2x\nmodel: 3x")
+        self.assertEqual([row[0] for row in rows], [m.id for m in messages[2:]])
+
+    @patch.object(context, "CONTEXT_WINDOW_MESSAGES", 4)
+    @patch.object(context, "CONTEXT_BUDGET_CHARS", 100)
+    def test_under_budget_skips_summarization(self):
+        self.add_messages(8, size=10)
+
+        with patch(
+            "utils.ai.WeatherInformationPipeline.summarize_context"
+        ) as mock_summary:
+            self.assertFalse(context.compact_context(self.chat.id))
+        mock_summary.assert_not_called()
+
+    @patch.object(context, "CONTEXT_WINDOW_MESSAGES", 4)
+    @patch.object(context, "CONTEXT_BUDGET_CHARS", 100)
+    def test_over_budget_folds_messages_older_than_window(self):
+        messages = self.add_messages(10, size=20)
+
+        with patch(
+            "utils.ai.WeatherInformationPipeline.summarize_context",
+            return_value="short",
+        ) as mock_summary:
+            self.assertTrue(context.compact_context(self.chat.id))
+
+        transcript = mock_summary.call_args.args[1]
+        self.assertEqual(len(transcript.splitlines()), 6)
+        self.context.refresh_from_db()
+        self.assertEqual(self.context.context_data, "short")
+        self.assertEqual(self.context.summarized_until, messages[5].id)
+
+        _, rows = context.load_prompt_context(Chat.objects.get(pk=self.chat.pk))
+        self.assertEqual([row[0] for row in rows], [m.id for m in messages[6:]])
+
+    @patch.object(context, "CONTEXT_WINDOW_MESSAGES", 2)
+    @patch.object(context, "CONTEXT_COMPACT_CHUNK_CHARS", 60)
+    def test_long_backlog_is_folded_in_bounded_chunks(self):
+        messages = self.add_messages(12, size=20)
+        summaries = iter(["s1", "s2"])
+
+        def summarize(summary, transcript, max_chars):
+            self.assertLessEqual(len(transcript), 60)
+            return next(summaries)
+
+        with patch(
+            "utils.ai.WeatherInformationPipeline.summarize_context",
+            side_effect=summarize,
+        ) as mock_summary:
+            # the third chunk fails, the first two stay folded
+            with self.assertRaises(StopIteration):
+                context.compact_context(self.chat.id, force=True)
+
+        self.assertEqual(mock_summary.call_count, 3)
+        self.assertEqual(mock_summary.call_args_list[1].args[0], "s1")
+        self.context.refresh_from_db()
+        self.assertEqual(self.context.context_data, "s2")
+        # two messages of 20 characters per 60 character chunk
+        self.assertEqual(self.context.summarized_until, messages[3].id)
+
+        transcript = mock_summary.call_args.args[1]
+        self.assertEqual(len(transcript.splitlines()), 2)
+
+    @patch.object(context, "CONTEXT_WINDOW_MESSAGES", 2)
+    def test_concurrent_compaction_result_is_dropped(self):
+        """A summary built from a stale watermark is not stored"""
+        self.add_messages(6)
+
+        def moved_on(*args, **kwargs):
+            ChatContext.objects.filter(chat=self.chat).update(
+                context_data="newer", summarized_until=10**9
+            )
+            return "stale"
+
+        with patch(
+            "utils.ai.WeatherInformationPipeline.summarize_context",
+            side_effect=moved_on,
+        ):
+            self.assertFalse(context.compact_context(self.chat.id, force=True))
+
+        self.assertEqual(ChatContext.objects.get(chat=self.chat).context_data, "newer")
+
+    def test_backfill_marks_legacy_history_summarized(self):
+        """A summary written by the old per-turn rewrite already covers the history"""
+        messages = self.add_messages(4)
+        fresh = Chat.objects.create(user=self.user)
+        ChatContext.objects.create(chat=fresh, context_data=ChatContext.DEFAULT_CONTEXT)
+        Message.objects.create(chat=fresh, sender="user", content="hi")
+
+        backfill_summarized_until(sender=None)
+        backfill_summarized_until(sender=None)
+
+        self.context.refresh_from_db()
+        self.assertEqual(self.context.summarized_until, messages[-1].id)
+        self.assertEqual(context.load_prompt_context(self.chat), ("summary", []))
+        self.assertEqual(ChatContext.objects.get(chat=fresh).summarized_until, 0)
+
+    @patch.object(context, "CONTEXT_WINDOW_MESSAGES", 2)
+    @patch.object(context, "CONTEXT_BUDGET_CHARS", 50)
+    def test_inbox_schedules_compaction_only_over_budget(self):
+        reply = json.dumps({"reply": "Sunny."})
+        data = {"chat_id": self.chat.id, "content": "Hi"}
+
+        with patch(
+            "utils.ai.WeatherInformationPipeline.chat", return_value=reply
+        ) as mock_chat:
+            service.inbox(data, self.user)
+            self.assertFalse(Job.objects.exists())
+
+            self.add_messages(4, size=20)
+            service.inbox(data, self.user)
+            # still over budget, the pending job is not queued twice
+            service.inbox(data, self.user)
+
+        job = Job.objects.get()
+        self.assertEqual(job.kind, "chat_summary")
+        self.assertEqual(job.payload, {"chat_id": self.chat.id, "force": False})
+        # the second prompt carried the earlier exchange verbatim
+        prompt = mock_chat.call_args_list[1].args[1]
+        self.assertIn("user: Hi\nmodel: Sunny.", prompt)
+
+    @patch.object(context, "CONTEXT_WINDOW_MESSAGES", 2)
+    @patch.object(context, "CONTEXT_BUDGET_CHARS", 50)
+    async def test_ainbox_queues_compaction(self):
+        await Message.objects.abulk_create(
+            Message(chat=self.chat, sender="user", content="x" * 20) for _ in range(4)
+        )
+        data = {"chat_id": self.chat.id, "content": "Hi"}
+
+        with patch(
+            "utils.ai.WeatherInformationPipeline.achat",
+            return_value=json.dumps({"reply": "Sunny."}),
+        ):
+            response = await service.ainbox(data, self.user)
+
+        self.assertEqual(response.status_code, 200)
+        job = await Job.objects.aget()
+        self.assertEqual(job.kind, "chat_summary")
+
+
+class CompactionWithoutWorkerTests(TransactionTestCase):
+    """
+    The unclaimed summary job runs on a background thread, so rows must
+    be committed.
+    """
+
+    def setUp(self):
+        self.user = User.objects.create(telegram_id=6262, username="no_worker")
+        self.chat = Chat.objects.create(user=self.user, title="Long Chat")
+        ChatContext.objects.create(chat=self.chat, context_data="summary")
+
+    def wait_for_summaries(self, timeout=2):
+        deadline = time.monotonic() + timeout
+        unfinished = Job.objects.filter(
+            kind="chat_summary", status__in=[Job.PENDING, Job.RUNNING]
+        )
+        while unfinished.exists() and time.monotonic() < deadline:
+            time.sleep(0.02)
+
+    @patch.object(queue, "JOB_PICKUP_SECONDS", 0.01)
+    @patch.object(context, "CONTEXT_WINDOW_MESSAGES", 2)
+    @patch.object(context, "CONTEXT_BUDGET_CHARS", 200)
+    def test_context_stays_bounded(self):
+        """With no worker running, prompts stop growing once over budget"""
+        reply = json.dumps({"reply": "y" * 40})
+        data = {"chat_id": self.chat.id, "content": "x" * 40}
+
+        with patch(
+            "utils.ai.WeatherInformationPipeline.chat", return_value=reply
+        ) as mock_chat, patch(
+            "utils.ai.WeatherInformationPipeline.summarize_context",
+            return_value="short",
+        ):
+            for _ in range(12):
+                service.inbox(data, self.user)
+                self.wait_for_summaries()
+
+        prompts = [call.args[1] for call in mock_chat.call_args_list]
+        self.assertLess(max(len(prompt) for prompt in prompts), 400)
+        self.assertTrue(Job.objects.filter(status=Job.DONE).exists())
+        self.assertEqual(ChatContext.objects.get(chat=self.chat).context_data, "short")
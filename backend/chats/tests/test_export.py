@@ -0,0 +1,133 @@
+import io
+import csv
+import gzip
+import json
+import tempfile
+from datetime import timedelta
+from pathlib import Path
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import timezone
+from users.models import User
+from chats.models import Chat, Message
+from chats import service
+from chats.export import export_stream
+
+
+class ExportTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(telegram_id=8888, username="jane")
+        self.chats = [
+            Chat.objects.create(user=self.user, title=f"Chat {i}") for i in range(3)
+        ]
+        start = timezone.now() - timedelta(hours=1)
+        # the middle chat has no messages
+        Message.objects.bulk_create(
+            Message(
+                chat=self.chats[i % 2 * 2],
+                sender="user" if i % 2 == 0 else "model",
+                content=f"message {i}",
+                timestamp=start + timedelta(seconds=i),
+            )
+            for i in range(7)
+        )
+        other = User.objects.create(telegram_id=8889, username="kim")
+        other_chat = Chat.objects.create(user=other, title="Not mine")
+        Message.objects.create(chat=other_chat, sender="user", content="secret")
+
+    def export(self, fmt="ndjson", compress=False, chunk_size=2000, chat_ids=None):
+        return b"".join(
+            export_stream(self.user, fmt, compress, chat_ids, chunk_size=chunk_size)
+        )
+
+    def ndjson(self, **kwargs):
+        return [json.loads(line) for line in self.export(**kwargs).splitlines()]
+
+    def test_ndjson_chats_followed_by_their_messages(self):
+        records = self.ndjson()
+
+        self.assertEqual(
+            [(r["type"], r.get("title") or r["content"]) for r in records],
+            [
+                ("chat", "Chat 0"),
+                ("message", "message 0"),
+                ("message", "message 2"),
+                ("message", "message 4"),
+                ("message", "message 6"),
+                ("chat", "Chat 1"),
+                ("chat", "Chat 2"),
+                ("message", "message 1"),
+                ("message", "message 3"),
+                ("message", "message 5"),
+            ],
+        )
+        self.assertEqual(records[0]["unique_hex_id"], self.chats[0].unique_hex_id)
+        self.assertEqual(records[1]["chat_id"], self.chats[0].id)
+        self.assertTrue(records[1]["timestamp"].endswith("Z"))
+
+    def test_small_chunks_give_the_same_export(self):
+        self.assertEqual(self.export(chunk_size=2), self.export())
+        self.assertEqual(self.export("csv", chunk_size=1), self.export("csv"))
+
+    def test_csv_row_per_message(self):
+        Message.objects.create(
+            chat=self.chats[0], sender="model", content='line one\nline "two", three'
+        )
+
+        rows = list(csv.reader(io.StringIO(self.export("csv").decode("utf-8"))))
+
+        self.assertEqual(rows[0][:3], ["chat_id", "chat_unique_hex_id", "chat_title"])
+        self.assertEqual(len(rows), 1 + 8 + 1)
+        self.assertEqual(rows[5][-1], 'line one\nline "two", three')
+        # the chat without messages has a row with empty message columns
+        self.assertEqual(rows[6][2], "Chat 1")
+        self.assertEqual(rows[6][4:], ["", "", "", ""])
+
+    def test_gzip(self):
+        self.assertEqual(gzip.decompress(self.export(compress=True)), self.export())
+
+    def test_empty_history(self):
+        self.user.chats.all().delete()
+
+        self.assertEqual(self.export(), b"")
+        self.assertEqual(self.export("csv").count(b"\n"), 1)
+
+    def test_queries_do_not_grow_with_history(self):
+        with self.assertNumQueries(2):
+            self.export(chunk_size=2)
+
+    def test_response_for_one_chat(self):
+        response = service.export_chats(
+            self.user, "ndjson", True, self.chats[2].unique_hex_id
+        )
+
+        self.assertEqual(response["Content-Type"], "application/gzip")
+        self.assertIn(
+            'filename="chats-8888.ndjson.gz"', response["Content-Disposition"]
+        )
+        records = gzip.decompress(b"".join(response.streaming_content)).splitlines()
+        self.assertEqual(len(records), 4)
+
+    def test_invalid_requests(self):
+        self.assertEqual(service.export_chats(self.user, "xml").status_code, 400)
+        self.assertEqual(
+            service.export_chats(self.user, None, False, "bad").status_code, 400
+        )
+        other_chat = Chat.objects.get(title="Not mine")
+        response = service.export_chats(
+            self.user, None, False, other_chat.unique_hex_id
+        )
+        self.assertEqual(response.status_code, 403)
+
+    def test_management_command(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "export.csv.gz"
+            call_command(
+                "export_chats",
+                "8888",
+                "--format=csv",
+                "--gzip",
+                f"--output={path}",
+                stderr=io.StringIO(),
+            )
+            self.assertEqual(gzip.decompress(path.read_bytes()), self.export("csv"))
@@ -0,0 +1,65 @@
+import json
+from datetime import datetime, timezone as dt_timezone
+from unittest.mock import patch
+from django.http import JsonResponse
+from django.test import TestCase
+from django.utils import timezone
+from users.models import User
+from chats.models import Chat, Message
+from chats import fast_serializers, service
+from chats.serializers import ChatSerializer, MessageSerializer
+
+
+class FastSerializerTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(telegram_id=7777, username="ivy")
+        self.chat = Chat.objects.create(user=self.user, title="Fast Chat")
+        Message.objects.create(chat=self.chat, sender="user", content="Hi ☀️")
+        Message.objects.create(
+            chat=self.chat,
+            sender="model",
+            content='Quotes " and \\ backslash',
+            timestamp=datetime(2025, 1, 1, 12, 0, tzinfo=dt_timezone.utc),
+        )
+
+    def test_chat_rows_match_chat_serializer(self):
+        chats = Chat.objects.filter(user=self.user)
+        self.assertEqual(
+            fast_serializers.chat_rows(chats), ChatSerializer(chats, many=True).data
+        )
+
+    def test_message_rows_match_message_serializer(self):
+        messages = Message.objects.filter(chat=self.chat).order_by("timestamp")
+        self.assertEqual(
+            fast_serializers.message_rows(messages),
+            MessageSerializer(messages, many=True).data,
+        )
+
+    def test_non_utc_timezone_matches_drf(self):
+        messages = Message.objects.filter(chat=self.chat).order_by("timestamp")
+        with timezone.override("Asia/Dhaka"):
+            self.assertEqual(
+                fast_serializers.message_rows(messages),
+                MessageSerializer(messages, many=True).data,
+            )
+
+    def test_stdlib_encoder_is_byte_identical(self):
+        data = {"chat_list": fast_serializers.chat_rows(Chat.objects.all())}
+        with patch("chats.fast_serializers.orjson", None):
+            fast = fast_serializers.json_response(data)
+        self.assertEqual(fast.content, JsonResponse(data).content)
+
+    def test_single_chat_matches_drf_path(self):
+        """fast and DRF single-chat responses decode to the same JSON"""
+        fast = service.get_single_chat(self.user, self.chat.unique_hex_id)
+        with patch("chats.fast_serializers.FAST_SERIALIZERS", False):
+            slow = service.get_single_chat(self.user, self.chat.unique_hex_id)
+
+        self.assertEqual(json.loads(fast.content), json.loads(slow.content))
+
+    def test_chat_list_matches_drf_path(self):
+        fast = service.user_chats(self.user)
+        with patch("chats.fast_serializers.FAST_SERIALIZERS", False):
+            slow = service.user_chats(self.user)
+
+        self.assertEqual(json.loads(fast.content), json.loads(slow.content))
@@ -1,6 +1,7 @@
-from django.test import TestCase
+from unittest.mock import patch
+from django.test import TestCase, TransactionTestCase
 from users.models import User
-from chats.models import Chat, ChatContext, Message
+from chats.models import Chat, ChatContext, Message, generate_hex_id
 
 
 class ChatAppModelsTest(TestCase):
@@ -42,3 +43,48 @@ class ChatAppModelsTest(TestCase):
             f"chat-id: {chat.id} -> title: {chat.title}, User: {self.user.telegram_id}"
         )
         self.assertEqual(str(chat), expected_str)
+
+    def test_chat_create_needs_no_lookup_query(self):
+        """Creating a chat is a single INSERT, no collision pre-check"""
+        with self.assertNumQueries(1):
+            Chat.objects.create(user=self.user)
+
+    def test_hex_ids_are_time_ordered(self):
+        """Later ids sort after earlier ones"""
+        with patch("chats.models.time.time", return_value=1_700_000_000):
+            first = generate_hex_id()
+        with patch("chats.models.time.time", return_value=1_700_000_001):
+            second = generate_hex_id()
+
+        self.assertEqual(len(first), 20)
+        self.assertTrue(first.isalnum())
+        self.assertLess(first, second)
+
+    def test_bulk_create_with_context(self):
+        """Bulk path creates chats with unique ids and their contexts"""
+        chats = [Chat(user=self.user, title=f"Imported {i}") for i in range(20)]
+
+        with self.assertNumQueries(2):
+            created = Chat.objects.bulk_create_with_context(chats)
+
+        self.assertEqual(len({chat.unique_hex_id for chat in created}), 20)
+        self.assertEqual(
+            ChatContext.objects.filter(chat__in=created).count(), len(created)
+        )
+        self.assertEqual(created[0].context.context_data, ChatContext.DEFAULT_CONTEXT)
+
+
+class ChatHexIdCollisionTest(TransactionTestCase):
+    def setUp(self):
+        self.user = User.objects.create(telegram_id=123456789, username="test_user")
+
+    def test_collision_retries_with_new_id(self):
+        """A colliding unique_hex_id is replaced and the insert retried"""
+        existing = Chat.objects.create(user=self.user)
+        chat = Chat(user=self.user, unique_hex_id=existing.unique_hex_id)
+
+        with patch("chats.models.generate_hex_id", return_value="f" * 20):
+            chat.save()
+
+        self.assertEqual(chat.unique_hex_id, "f" * 20)
+        self.assertEqual(Chat.objects.count(), 2)
@@ -0,0 +1,167 @@
+import io
+import json
+import time
+from datetime import timedelta
+from unittest.mock import patch
+from django.core.management import call_command
+from django.http import Http404
+from django.test import TestCase, TransactionTestCase
+from django.utils import timezone
+from users.models import User
+from chats.models import Chat, ChatContext, Message
+from chats import service
+from chats.export import export_stream
+from chats.purge import MAX_BULK_DELETE, purge_chat
+from jobs.models import Job
+from jobs import queue
+from jobs.queue import claim_jobs, run_job
+
+
+class DeleteChatTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(telegram_id=6161, username="tess")
+        self.chat = self.chat_with_messages("Old chat", 10)
+
+    def chat_with_messages(self, title, count, user=None):
+        chat = Chat.objects.create(user=user or self.user, title=title)
+        ChatContext.objects.create(chat=chat, context_data="summary")
+        Message.objects.bulk_create(
+            Message(chat=chat, sender="user", content=f"snow day {i}")
+            for i in range(count)
+        )
+        return chat
+
+    def run_jobs(self):
+        return [run_job(job) for job in claim_jobs("test", limit=10)]
+
+    def test_delete_hides_the_chat_and_queues_the_purge(self):
+        response = service.delete_user_chat(self.user, self.chat.id)
+
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(response.content, b"")
+        chat_list = json.loads(service.user_chats(self.user).content)["chat_list"]
+        self.assertEqual(chat_list, [])
+        with self.assertRaises(Http404):
+            service.get_single_chat(self.user, self.chat.unique_hex_id)
+        # nothing removed yet, that is the job's work
+        self.assertEqual(Message.objects.filter(chat=self.chat).count(), 10)
+        job = Job.objects.get()
+        self.assertEqual(job.kind, "purge_chats")
+        self.assertEqual(job.payload, {"chat_ids": [self.chat.id]})
+
+    def test_deleting_twice_is_not_found(self):
+        service.delete_user_chat(self.user, self.chat.id)
+
+        with self.assertRaises(Http404):
+            service.delete_user_chat(self.user, self.chat.id)
+        self.assertEqual(Job.objects.count(), 1)
+
+    def test_purge_job_removes_the_rows(self):
+        other = self.chat_with_messages("Kept", 3)
+        service.delete_user_chat(self.user, self.chat.id)
+
+        self.run_jobs()
+
+        job = Job.objects.get()
+        self.assertEqual(job.status, Job.DONE)
+        self.assertEqual(job.result, {"chats": 1, "messages": 10})
+        self.assertFalse(Chat.objects.filter(pk=self.chat.pk).exists())
+        self.assertFalse(ChatContext.objects.filter(chat_id=self.chat.pk).exists())
+        self.assertFalse(Message.objects.filter(chat_id=self.chat.pk).exists())
+        self.assertEqual(Message.objects.filter(chat=other).count(), 3)
+
+    def test_purge_deletes_in_batches(self):
+        Chat.objects.filter(pk=self.chat.pk).update(deleted_at=timezone.now())
+
+        # exists, one delete per batch of 4 until one deletes nothing,
+        # then the chat row and a delete per table
+        with self.assertNumQueries(1 + 4 + 5):
+            self.assertEqual(purge_chat(self.chat.pk, batch_size=4), 10)
+
+    def test_purge_leaves_chats_that_are_not_deleted(self):
+        self.assertIsNone(purge_chat(self.chat.pk))
+        self.assertEqual(Message.objects.filter(chat=self.chat).count(), 10)
+
+    def test_bulk_delete(self):
+        second = self.chat_with_messages("Second", 2)
+        stranger = User.objects.create(telegram_id=6162, username="uma")
+        theirs = self.chat_with_messages("Theirs", 1, user=stranger)
+
+        response = service.delete_user_chats(
+            self.user, {"chat_ids": [self.chat.id, second.id, theirs.id, 999999]}
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            json.loads(response.content),
+            {
+                "deleted": sorted([self.chat.id, second.id]),
+                "not_found": sorted([theirs.id, 999999]),
+            },
+        )
+        self.assertIsNone(Chat.objects.get(pk=theirs.pk).deleted_at)
+        self.run_jobs()
+        self.assertEqual(list(Chat.objects.values_list("id", flat=True)), [theirs.id])
+
+    def test_bulk_delete_rejects_bad_requests(self):
+        for data in (
+            {},
+            {"chat_ids": []},
+            {"chat_ids": "1,2"},
+            {"chat_ids": ["1"]},
+            {"chat_ids": [True]},
+            {"chat_ids": list(range(MAX_BULK_DELETE + 1))},
+            [self.chat.id],
+        ):
+            response = service.delete_user_chats(self.user, data)
+            self.assertEqual(response.status_code, 400)
+        self.assertIsNone(Chat.objects.get(pk=self.chat.pk).deleted_at)
+
+    def test_deleted_chats_leave_search_and_export(self):
+        service.delete_user_chat(self.user, self.chat.id)
+
+        found = json.loads(service.search_messages(self.user, "snow").content)
+        self.assertEqual(found["results"], [])
+        self.assertEqual(b"".join(export_stream(self.user)), b"")
+
+    def test_purge_command_sweeps_old_deletions(self):
+        recent = self.chat_with_messages("Recent", 1)
+        Chat.objects.filter(pk=self.chat.pk).update(
+            deleted_at=timezone.now() - timedelta(hours=1)
+        )
+        Chat.objects.filter(pk=recent.pk).update(deleted_at=timezone.now())
+
+        out = io.StringIO()
+        call_command("purge_chats", stdout=out)
+
+        self.assertIn("purged 1 chats, 10 messages", out.getvalue())
+        self.assertFalse(Chat.objects.filter(pk=self.chat.pk).exists())
+        self.assertTrue(Chat.objects.filter(pk=recent.pk).exists())
+
+
+class PurgeWithoutWorkerTests(TransactionTestCase):
+    """
+    The unclaimed purge job runs on a background thread, so rows must be
+    committed.
+    """
+
+    def setUp(self):
+        self.user = User.objects.create(telegram_id=6262, username="no_worker")
+        self.chat = Chat.objects.create(user=self.user, title="Old chat")
+        Message.objects.bulk_create(
+            Message(chat=self.chat, sender="user", content=f"snow day {i}")
+            for i in range(5)
+        )
+
+    @patch.object(queue, "JOB_PICKUP_SECONDS", 0.01)
+    def test_unclaimed_purge_runs_in_process(self):
+        service.delete_user_chat(self.user, self.chat.id)
+
+        deadline = time.monotonic() + 2
+        purged = Chat.objects.filter(pk=self.chat.pk)
+        while purged.exists() and time.monotonic() < deadline:
+            time.sleep(0.02)
+
+        self.assertFalse(purged.exists())
+        self.assertFalse(Message.objects.filter(chat_id=self.chat.pk).exists())
+        self.assertEqual(Job.objects.get().status, Job.DONE)
@@ -0,0 +1,150 @@
+import json
+from django.db import connection
+from django.test import TestCase
+from django.utils import timezone
+from users.models import User
+from chats.models import Chat, Message
+from chats import service
+from chats.schema import install_search_index
+
+
+class SearchTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(telegram_id=7777, username="hana")
+        self.chat = Chat.objects.create(user=self.user, title="Trip to London")
+        Message.objects.bulk_create(
+            [
+                Message(
+                    chat=self.chat, sender="user", content="Is it raining in London?"
+                ),
+                Message(
+                    chat=self.chat,
+                    sender="model",
+                    content="Light rain in London, take an umbrella.",
+                ),
+                Message(chat=self.chat, sender="user", content="And in Paris?"),
+            ]
+        )
+
+    def search(self, query, limit=None, offset=None, user=None):
+        response = service.search_messages(user or self.user, query, limit, offset)
+        self.assertEqual(response.status_code, 200)
+        return json.loads(response.content)
+
+    def test_stemmed_words_match_and_are_highlighted(self):
+        """'rain' finds 'raining', snippets mark the matched words"""
+        page = self.search("rain")
+
+        snippets = [result["snippet"] for result in page["results"]]
+        self.assertEqual(len(snippets), 2)
+        self.assertIn("<mark>raining</mark>", " ".join(snippets))
+        self.assertIn("<mark>rain</mark>", " ".join(snippets))
+        self.assertEqual(
+            page["results"][0]["chat"]["unique_hex_id"], self.chat.unique_hex_id
+        )
+        self.assertIsNone(page["next_offset"])
+
+    def test_every_word_must_match(self):
+        page = self.search("rain umbrella")
+
+        self.assertEqual(len(page["results"]), 1)
+        self.assertEqual(page["results"][0]["message"]["sender"], "model")
+
+    def test_chat_titles_are_searched(self):
+        page = self.search("trip")
+
+        self.assertEqual(len(page["results"]), 1)
+        self.assertIsNone(page["results"][0]["message"])
+        self.assertEqual(page["results"][0]["snippet"], "<mark>Trip</mark> to London")
+
+    def test_title_match_ranks_first(self):
+        page = self.search("london")
+
+        self.assertEqual(len(page["results"]), 3)
+        self.assertIsNone(page["results"][0]["message"])
+
+    def test_other_users_messages_are_not_found(self):
+        other = User.objects.create(telegram_id=7778, username="ivan")
+        other_chat = Chat.objects.create(user=other)
+        Message.objects.create(chat=other_chat, sender="user", content="rain in Rome")
+
+        self.assertEqual(len(self.search("rain")["results"]), 2)
+        self.assertEqual(len(self.search("rain", user=other)["results"]), 1)
+
+    def test_snippet_is_html_escaped(self):
+        Message.objects.create(
+            chat=self.chat, sender="user", content="<script>storm</script>"
+        )
+
+        snippet = self.search("storm")["results"][0]["snippet"]
+        self.assertEqual(snippet, "&lt;script&gt;<mark>storm</mark>&lt;/script&gt;")
+
+    def test_pagination(self):
+        Message.objects.bulk_create(
+            Message(chat=self.chat, sender="user", content=f"sunny day {i}")
+            for i in range(5)
+        )
+
+        first = self.search("sunny", limit=3)
+        second = self.search("sunny", limit=3, offset=first["next_offset"])
+
+        ids = [r["message"]["id"] for r in first["results"] + second["results"]]
+        self.assertEqual(first["next_offset"], 3)
+        self.assertEqual(len(set(ids)), 5)
+        self.assertIsNone(second["next_offset"])
+
+    def test_deleted_chats_do_not_shorten_pages(self):
+        deleted = Chat.objects.create(user=self.user, title="Sunny deleted")
+        Message.objects.bulk_create(
+            Message(chat=chat, sender="user", content=f"sunny day {i}")
+            for chat in (self.chat, deleted)
+            for i in range(3)
+        )
+        Chat.objects.filter(pk=deleted.pk).update(deleted_at=timezone.now())
+
+        first = self.search("sunny", limit=2)
+        second = self.search("sunny", limit=2, offset=first["next_offset"])
+
+        self.assertEqual(len(first["results"]), 2)
+        self.assertEqual(len(second["results"]), 1)
+        self.assertIsNone(second["next_offset"])
+        titles = {r["chat"]["title"] for r in first["results"] + second["results"]}
+        self.assertEqual(titles, {"Trip to London"})
+
+    def test_index_follows_updates_and_deletes(self):
+        message = Message.objects.get(content="And in Paris?")
+        Message.objects.filter(pk=message.pk).update(content="And in Berlin?")
+        Chat.objects.filter(pk=self.chat.pk).update(title="Europe")
+
+        self.assertEqual(self.search("paris")["results"], [])
+        self.assertEqual(len(self.search("berlin")["results"]), 1)
+        self.assertEqual(len(self.search("europe")["results"]), 1)
+
+        self.chat.delete()
+        self.assertEqual(self.search("london")["results"], [])
+
+    def test_invalid_requests(self):
+        for query, offset in (
+            ("", None),
+            ("   ", None),
+            ("x" * 201, None),
+            ("rain", "-1"),
+        ):
+            response = service.search_messages(self.user, query, None, offset)
+            self.assertEqual(response.status_code, 400)
+
+    def test_punctuation_only_query(self):
+        self.assertEqual(self.search("?!")["results"], [])
+
+    def test_reinstall_rebuilds_missing_triggers(self):
+        """Rows written while a trigger was missing are indexed again"""
+        if connection.vendor != "sqlite":
+            self.skipTest("sqlite triggers")
+        with connection.cursor() as cursor:
+            cursor.execute("DROP TRIGGER chats_message_fts_insert")
+        Message.objects.create(chat=self.chat, sender="user", content="snow in Oslo")
+        self.assertEqual(self.search("snow")["results"], [])
+
+        install_search_index(sender=None)
+
+        self.assertEqual(len(self.search("snow")["results"]), 1)
@@ -1,10 +1,18 @@
 import json
-from django.test import TestCase
+import time
+import threading
+from datetime import timedelta
+from django.db import connection
+from django.db.models import F
+from django.test import TestCase, TransactionTestCase
+from django.utils import timezone
 from django.http import JsonResponse
-from unittest.mock import patch
+from unittest.mock import patch, AsyncMock
 from users.models import User
 from chats.models import Chat, Message, ChatContext
-from chats import service
+from chats import service, titles
+from chats.context import StaleContext
+from chats.serializers import ChatSerializer
 
 
 class ChatServiceTests(TestCase):
@@ -67,11 +75,11 @@ class InboxServiceTests(TestCase):
         return_value=("Model Reply", {"context": "new"}),
     )
     @patch(
-        "chats.service.WeatherInformationPipeline.generate_title",
+        "utils.ai.WeatherInformationPipeline.generate_title",
         return_value="Auto Title",
     )
     @patch(
-        "chats.service.WeatherInformationPipeline.chat",
+        "utils.ai.WeatherInformationPipeline.chat",
         return_value={"reply": "Weather is sunny."},
     )
     def test_inbox_success_flow(
@@ -88,6 +96,49 @@ class InboxServiceTests(TestCase):
         self.assertTrue(Message.objects.filter(chat=self.chat).count() >= 2)
         self.assertEqual(response_data.get("title"), "Auto Title")
 
+    @patch(
+        "utils.ai.WeatherInformationPipeline.generate_title",
+        return_value="Auto Title",
+    )
+    @patch(
+        "utils.ai.WeatherInformationPipeline.chat",
+        return_value=json.dumps({"reply": "Sunny.", "context_summary": "weather"}),
+    )
+    def test_inbox_query_budget(self, mock_chat, mock_title):
+        """A message costs one read and one batched write transaction"""
+        data = {"chat_id": self.chat.id, "content": "Hello AI"}
+
+        # select chat+user+context, pending messages, savepoint, context
+        # version check, bulk insert of both messages, chat title/updated_at
+        # update, release savepoint
+        recorded = service.EXCHANGE_QUERIES.count()
+        with self.assertNumQueries(7):
+            response = service.inbox(data, self.user)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(service.EXCHANGE_QUERIES.count(), recorded + 1)
+
+        response_data = json.loads(response.content)
+        self.assertIsNotNone(response_data["user"]["id"])
+        self.assertIsNotNone(response_data["model"]["id"])
+
+    @patch(
+        "utils.ai.WeatherInformationPipeline.chat",
+        return_value=json.dumps({"reply": "Sunny.", "context_summary": "weather"}),
+    )
+    def test_inbox_bumps_updated_at(self, mock_chat):
+        """Chat.updated_at moves forward so chat-list ordering stays fresh"""
+        self.chat.title = "Named Chat"
+        self.chat.save()
+        before = Chat.objects.get(pk=self.chat.pk).updated_at
+
+        service.inbox({"chat_id": self.chat.id, "content": "Hi"}, self.user)
+
+        chat = Chat.objects.get(pk=self.chat.pk)
+        self.assertGreater(chat.updated_at, before)
+        self.assertEqual(chat.title, "Named Chat")
+        # the summary is only rewritten by compaction, not per message
+        self.assertEqual(chat.context.context_data, "no context availabl")
+
     def test_inbox_invalid_data(self):
         """Test invalid request data returns 400"""
         data = {"chat_id": "invalid", "content": ""}
@@ -101,7 +152,7 @@ class InboxServiceTests(TestCase):
         self.assertEqual(response.status_code, 404)
 
     @patch(
-        "chats.service.WeatherInformationPipeline.chat",
+        "utils.ai.WeatherInformationPipeline.chat",
         side_effect=Exception("AI error"),
     )
     def test_inbox_ai_failure(self, mock_ai):
@@ -113,3 +164,523 @@ class InboxServiceTests(TestCase):
 
         self.assertEqual(response.status_code, 500)
         self.assertIn("error", response_data)
+
+
+class AsyncInboxServiceTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(telegram_id=3333, username="carol")
+        self.chat = Chat.objects.create(user=self.user)
+        self.context = ChatContext.objects.create(
+            chat=self.chat, context_data="no context availabl"
+        )
+
+    @patch(
+        "utils.ai.WeatherInformationPipeline.agenerate_title",
+        new_callable=AsyncMock,
+        return_value="Auto Title",
+    )
+    @patch(
+        "utils.ai.WeatherInformationPipeline.achat",
+        new_callable=AsyncMock,
+        return_value=json.dumps(
+            {"reply": "Weather is sunny.", "context_summary": "asked weather"}
+        ),
+    )
+    async def test_ainbox_success_flow(self, mock_chat, mock_title):
+        """Async inbox stores both messages and the title"""
+        data = {"chat_id": self.chat.id, "content": "Hello AI"}
+
+        response = await service.ainbox(data, self.user)
+        response_data = json.loads(response.content)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response_data["model"]["content"], "Weather is sunny.")
+        self.assertEqual(response_data.get("title"), "Auto Title")
+        self.assertEqual(await Message.objects.filter(chat=self.chat).acount(), 2)
+        context = await ChatContext.objects.aget(chat=self.chat)
+        self.assertEqual(context.context_data, "no context availabl")
+
+    @patch(
+        "utils.ai.WeatherInformationPipeline.agenerate_title",
+        new_callable=AsyncMock,
+        return_value="Auto Title",
+    )
+    @patch(
+        "utils.ai.WeatherInformationPipeline.achat",
+        new_callable=AsyncMock,
+        return_value=json.dumps({"reply": "Sunny.", "context_summary": "w"}),
+    )
+    async def test_ainbox_stream_success_flow(self, mock_chat, mock_title):
+        """Async stream sends the reply and saves the exchange at the end"""
+        data = {"chat_id": self.chat.id, "content": "Hello AI"}
+
+        response = await service.ainbox_stream(data, self.user)
+        body = "".join([chunk.decode() async for chunk in response.streaming_content])
+
+        self.assertIn('event: token\ndata: {"text": "Sunny."}', body)
+        self.assertIn("event: done", body)
+        self.assertEqual(await Message.objects.filter(chat=self.chat).acount(), 2)
+
+    async def test_ainbox_chat_not_found(self):
+        """Async inbox returns 404 for unknown chat"""
+        data = {"chat_id": 9999, "content": "Hello?"}
+        response = await service.ainbox(data, self.user)
+        self.assertEqual(response.status_code, 404)
+
+    @patch(
+        "utils.ai.WeatherInformationPipeline.achat",
+        new_callable=AsyncMock,
+        side_effect=Exception("AI error"),
+    )
+    async def test_ainbox_ai_failure(self, mock_ai):
+        """Async inbox returns 500 when the pipeline fails"""
+        data = {"chat_id": self.chat.id, "content": "Test error"}
+        response = await service.ainbox(data, self.user)
+        self.assertEqual(response.status_code, 500)
+        self.assertEqual(await Message.objects.filter(chat=self.chat).acount(), 0)
+
+
+def read_events(response):
+    """
+    parse a Server-Sent Events body into (event, data) pairs
+    """
+    body = b"".join(response.streaming_content).decode()
+    events = []
+    for block in body.strip().split("\n\n"):
+        name, data = block.split("\n")
+        events.append((name[len("event: ") :], json.loads(data[len("data: ") :])))
+    return events
+
+
+class InboxStreamServiceTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(telegram_id=4444, username="dave")
+        self.chat = Chat.objects.create(user=self.user)
+        self.context = ChatContext.objects.create(
+            chat=self.chat, context_data="no context availabl"
+        )
+
+    @patch(
+        "utils.ai.WeatherInformationPipeline.generate_title",
+        return_value="Auto Title",
+    )
+    @patch(
+        "utils.ai.WeatherInformationPipeline.stream_chat",
+        return_value=iter(
+            ['{"reply": "Weather ', 'is sunny.", "context_summary": "w"}']
+        ),
+    )
+    def test_inbox_stream_success_flow(self, mock_stream, mock_title):
+        """Tokens are streamed, then both messages and the context are saved"""
+        data = {"chat_id": self.chat.id, "content": "Hello AI"}
+
+        response = service.inbox_stream(data, self.user)
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+        # nothing is saved before the stream is consumed
+        self.assertEqual(Message.objects.filter(chat=self.chat).count(), 0)
+
+        events = read_events(response)
+        names = [name for name, _ in events]
+        self.assertEqual(names, ["start", "token", "token", "done"])
+        self.assertEqual(
+            "".join(data["text"] for name, data in events if name == "token"),
+            "Weather is sunny.",
+        )
+        done = events[-1][1]
+        self.assertEqual(done["model"]["content"], "Weather is sunny.")
+        self.assertEqual(done["title"], "Auto Title")
+
+        self.assertEqual(Message.objects.filter(chat=self.chat).count(), 2)
+        self.context.refresh_from_db()
+        self.assertEqual(self.context.context_data, "no context availabl")
+
+    @patch(
+        "utils.ai.WeatherInformationPipeline.stream_chat",
+        side_effect=Exception("AI error"),
+    )
+    def test_inbox_stream_failure(self, mock_stream):
+        """A failing pipeline ends the stream with an error event"""
+        data = {"chat_id": self.chat.id, "content": "Hello AI"}
+
+        events = read_events(service.inbox_stream(data, self.user))
+
+        self.assertEqual(events[-1], ("error", {"error": "Something went wrong!"}))
+        self.assertEqual(Message.objects.filter(chat=self.chat).count(), 0)
+
+    def test_inbox_stream_restarts_stale_reply(self):
+        """A reply overtaken by another exchange is streamed again"""
+        self.chat.title = "Named"
+        self.chat.save()
+        streams = [
+            ['{"reply": "Old"}'],
+            ['{"reply": "New"}'],
+        ]
+
+        def stub_stream(query, context_summary):
+            if len(streams) == 2:
+                ChatContext.objects.filter(pk=self.chat.pk).update(
+                    version=F("version") + 1
+                )
+            return iter(streams.pop(0))
+
+        data = {"chat_id": self.chat.id, "content": "Hello AI"}
+        with patch(
+            "utils.ai.WeatherInformationPipeline.stream_chat", side_effect=stub_stream
+        ):
+            events = read_events(service.inbox_stream(data, self.user))
+
+        names = [name for name, _ in events]
+        self.assertEqual(names, ["start", "token", "retry", "token", "done"])
+        self.assertEqual(events[-1][1]["model"]["content"], "New")
+        self.assertEqual(Message.objects.filter(chat=self.chat).count(), 2)
+
+    def test_inbox_stream_chat_not_found(self):
+        """Validation errors are plain JSON responses"""
+        data = {"chat_id": 9999, "content": "Hello?"}
+        response = service.inbox_stream(data, self.user)
+        self.assertEqual(response.status_code, 404)
+
+
+class ChatMessagesPaginationTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(telegram_id=5555, username="erin")
+        self.chat = Chat.objects.create(user=self.user, title="Long Chat")
+        start = timezone.now() - timedelta(hours=1)
+        Message.objects.bulk_create(
+            Message(
+                chat=self.chat,
+                sender="user" if i % 2 == 0 else "model",
+                content=f"message {i}",
+                timestamp=start + timedelta(seconds=i),
+            )
+            for i in range(25)
+        )
+
+    def get_page(self, cursor=None, limit=10):
+        response = service.get_chat_messages(
+            self.user, self.chat.unique_hex_id, cursor, limit
+        )
+        self.assertEqual(response.status_code, 200)
+        return json.loads(response.content)
+
+    def test_first_page_is_newest_messages(self):
+        """First page holds the newest N messages, oldest first"""
+        page = self.get_page()
+        contents = [m["content"] for m in page["messages"]]
+
+        self.assertEqual(contents, [f"message {i}" for i in range(15, 25)])
+        self.assertIsNotNone(page["next_cursor"])
+
+    def test_load_older_pages(self):
+        """Following next_cursor walks the whole history without gaps"""
+        seen = []
+        cursor = None
+        while True:
+            page = self.get_page(cursor)
+            seen = [m["content"] for m in page["messages"]] + seen
+            cursor = page["next_cursor"]
+            if not cursor:
+                break
+
+        self.assertEqual(seen, [f"message {i}" for i in range(25)])
+
+    def test_same_timestamp_tie_broken_by_id(self):
+        """Messages sharing a timestamp are neither skipped nor repeated"""
+        chat = Chat.objects.create(user=self.user)
+        moment = timezone.now()
+        Message.objects.bulk_create(
+            Message(chat=chat, sender="user", content=str(i), timestamp=moment)
+            for i in range(5)
+        )
+
+        first = service.get_chat_messages(self.user, chat.unique_hex_id, None, 3)
+        first = json.loads(first.content)
+        second = service.get_chat_messages(
+            self.user, chat.unique_hex_id, first["next_cursor"], 3
+        )
+        second = json.loads(second.content)
+
+        ids = [m["id"] for m in second["messages"] + first["messages"]]
+        self.assertEqual(len(set(ids)), 5)
+        self.assertIsNone(second["next_cursor"])
+
+    def test_invalid_cursor(self):
+        response = service.get_chat_messages(
+            self.user, self.chat.unique_hex_id, "not-a-cursor", 10
+        )
+        self.assertEqual(response.status_code, 400)
+
+    def test_permission_denied(self):
+        other_user = User.objects.create(telegram_id=5556, username="frank")
+        response = service.get_chat_messages(
+            other_user, self.chat.unique_hex_id, None, 10
+        )
+        self.assertEqual(response.status_code, 403)
+
+    def test_single_chat_with_limit(self):
+        """single-chat returns only the newest page when limit is given"""
+        response = service.get_single_chat(self.user, self.chat.unique_hex_id, "5")
+        single_chat = json.loads(response.content)["single_chat"]
+
+        self.assertEqual(len(single_chat["messages"]), 5)
+        self.assertEqual(single_chat["messages"][-1]["content"], "message 24")
+        self.assertIsNotNone(single_chat["next_cursor"])
+
+
+class ChatListPaginationTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(telegram_id=6666, username="gina")
+        for i in range(12):
+            Chat.objects.create(user=self.user, title=f"Chat {i}")
+        # other users' chats never show up
+        other_user = User.objects.create(telegram_id=6667, username="hank")
+        Chat.objects.create(user=other_user, title="Not mine")
+
+    def test_rows_match_chat_serializer(self):
+        """values() rows serialize exactly like ChatSerializer"""
+        response = service.user_chats(self.user)
+        chat_list = json.loads(response.content)["chat_list"]
+
+        expected = json.loads(
+            JsonResponse(
+                {
+                    "chat_list": ChatSerializer(
+                        Chat.objects.filter(user=self.user), many=True
+                    ).data
+                }
+            ).content
+        )["chat_list"]
+        self.assertEqual(chat_list, expected)
+        self.assertNotIn("next_cursor", json.loads(response.content))
+
+    def test_paginated_chat_list(self):
+        """Pages follow -updated_at and cover every chat once"""
+        titles = []
+        cursor = None
+        while True:
+            response = service.user_chats(self.user, cursor, "5")
+            data = json.loads(response.content)
+            titles += [row["title"] for row in data["chat_list"]]
+            cursor = data["next_cursor"]
+            if not cursor:
+                break
+
+        self.assertEqual(titles, [f"Chat {i}" for i in reversed(range(12))])
+
+    def test_chat_list_query_count(self):
+        """A page is a single query"""
+        with self.assertNumQueries(1):
+            service.user_chats(self.user, None, "5")
+
+    def test_invalid_limit(self):
+        response = service.user_chats(self.user, None, "zero")
+        self.assertEqual(response.status_code, 400)
+
+
+def slow(seconds, value):
+    def call(*args, **kwargs):
+        time.sleep(seconds)
+        return value
+
+    return call
+
+
+class TitleGenerationTests(TransactionTestCase):
+    """
+    The title runs next to the chat call on a worker thread, so the
+    rows it writes late have to be committed to be seen here.
+    """
+
+    def setUp(self):
+        self.user = User.objects.create(telegram_id=8888, username="tara")
+        self.chat = Chat.objects.create(user=self.user)
+        ChatContext.objects.create(chat=self.chat, context_data="no context")
+        self.data = {"chat_id": self.chat.id, "content": "Weather in Dhaka?"}
+        self.reply = json.dumps({"reply": "Sunny.", "context_summary": "weather"})
+
+    def wait_for_title(self, timeout=2):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            title = Chat.objects.get(pk=self.chat.pk).title
+            if title != Chat.DEFAULT_TITLE:
+                return title
+            time.sleep(0.02)
+        return Chat.objects.get(pk=self.chat.pk).title
+
+    def test_first_message_does_not_wait_for_slow_title(self):
+        """Response time excludes the title call, the title lands later"""
+        with patch(
+            "utils.ai.WeatherInformationPipeline.chat",
+            side_effect=slow(0.1, self.reply),
+        ), patch(
+            "utils.ai.WeatherInformationPipeline.generate_title",
+            side_effect=slow(0.6, "Dhaka Weather"),
+        ):
+            start = time.perf_counter()
+            response = service.inbox(self.data, self.user)
+            elapsed = time.perf_counter() - start
+
+            self.assertEqual(response.status_code, 200)
+            self.assertLess(elapsed, 0.5)
+            self.assertNotIn("title", json.loads(response.content))
+            self.assertEqual(self.wait_for_title(), "Dhaka Weather")
+
+    def test_title_runs_concurrently_with_reply(self):
+        """A title that is ready in time is returned, latency is not the sum"""
+        with patch(
+            "utils.ai.WeatherInformationPipeline.chat",
+            side_effect=slow(0.3, self.reply),
+        ), patch(
+            "utils.ai.WeatherInformationPipeline.generate_title",
+            side_effect=slow(0.2, "Dhaka Weather"),
+        ) as mock_title:
+            start = time.perf_counter()
+            response = service.inbox(self.data, self.user)
+            elapsed = time.perf_counter() - start
+
+        self.assertLess(elapsed, 0.45)
+        self.assertEqual(json.loads(response.content)["title"], "Dhaka Weather")
+        self.assertEqual(Chat.objects.get(pk=self.chat.pk).title, "Dhaka Weather")
+        mock_title.assert_called_once_with("Weather in Dhaka?")
+
+    def test_late_title_does_not_overwrite_rename(self):
+        """A chat renamed before its title arrives keeps the new name"""
+        Chat.objects.filter(pk=self.chat.pk).update(title="Renamed")
+
+        self.assertEqual(titles.save_title(self.chat.pk, "Dhaka Weather"), 0)
+        self.assertEqual(Chat.objects.get(pk=self.chat.pk).title, "Renamed")
+
+    def test_failed_title_keeps_default(self):
+        """A failing title call does not fail the message"""
+        with patch(
+            "utils.ai.WeatherInformationPipeline.chat", return_value=self.reply
+        ), patch(
+            "utils.ai.WeatherInformationPipeline.generate_title",
+            side_effect=Exception("LLM down"),
+        ):
+            response = service.inbox(self.data, self.user)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn("title", json.loads(response.content))
+        self.assertEqual(Chat.objects.get(pk=self.chat.pk).title, Chat.DEFAULT_TITLE)
+
+
+class ChatOrderingTests(TransactionTestCase):
+    """
+    Two messages sent together to one chat: both load the same context,
+    the slower reply notices the other exchange was stored first and is
+    generated again with it, no lock is held while the model runs.
+    """
+
+    def setUp(self):
+        self.user = User.objects.create(telegram_id=7777, username="ola")
+        self.chat = Chat.objects.create(user=self.user, title="Ordered")
+        ChatContext.objects.create(chat=self.chat, context_data="no context")
+
+    def test_concurrent_messages_are_answered_in_order(self):
+        both_loaded = threading.Barrier(2)
+        calls = []
+        lock = threading.Lock()
+
+        def stub_chat(query, context_summary):
+            with lock:
+                calls.append((query, context_summary))
+                first_round = len(calls) <= 2
+            if first_round:
+                both_loaded.wait(timeout=5)
+                # "second" finishes last and loses the race
+                time.sleep(0.05 if query == "first" else 0.3)
+            return json.dumps({"reply": f"re: {query}"})
+
+        statuses = {}
+
+        def send(content):
+            try:
+                response = service.inbox(
+                    {"chat_id": self.chat.id, "content": content}, self.user
+                )
+                statuses[content] = response.status_code
+            finally:
+                connection.close()
+
+        with patch(
+            "utils.ai.WeatherInformationPipeline.chat", side_effect=stub_chat
+        ), patch("chats.service.schedule_compaction"):
+            threads = [
+                threading.Thread(target=send, args=(content,))
+                for content in ("first", "second")
+            ]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        self.assertEqual(statuses, {"first": 200, "second": 200})
+        # the losing reply ran again and saw the first exchange
+        self.assertEqual(len(calls), 3)
+        self.assertEqual(calls[2][0], "second")
+        self.assertIn("user: first\nmodel: re: first", calls[2][1])
+
+        messages = list(
+            Message.objects.filter(chat=self.chat)
+            .order_by("id")
+            .values_list("sender", "content")
+        )
+        self.assertEqual(
+            messages,
+            [
+                ("user", "first"),
+                ("model", "re: first"),
+                ("user", "second"),
+                ("model", "re: second"),
+            ],
+        )
+        self.assertEqual(ChatContext.objects.get(pk=self.chat.pk).version, 2)
+
+
+class StaleContextTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(telegram_id=6666, username="ben")
+        self.chat = Chat.objects.create(user=self.user, title="Stale")
+        ChatContext.objects.create(chat=self.chat, context_data="no context")
+        self.data = {"chat_id": self.chat.id, "content": "Hi"}
+
+    def store_other_exchange(self, *args):
+        """another worker stores an exchange while this reply runs"""
+        ChatContext.objects.filter(pk=self.chat.pk).update(version=F("version") + 1)
+        return json.dumps({"reply": "Hello"})
+
+    def test_stale_reply_is_generated_again(self):
+        replies = [self.store_other_exchange, lambda *args: '{"reply": "Hello again"}']
+
+        with patch(
+            "utils.ai.WeatherInformationPipeline.chat",
+            side_effect=lambda *args: replies.pop(0)(*args),
+        ) as mock_chat:
+            response = service.inbox(self.data, self.user)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(mock_chat.call_count, 2)
+        self.assertEqual(
+            json.loads(response.content)["model"]["content"], "Hello again"
+        )
+        self.assertEqual(Message.objects.filter(chat=self.chat).count(), 2)
+
+    def test_retries_exhausted_returns_409(self):
+        with patch(
+            "utils.ai.WeatherInformationPipeline.chat",
+            side_effect=self.store_other_exchange,
+        ) as mock_chat, patch("chats.service.CHAT_ORDER_RETRIES", 1):
+            response = service.inbox(self.data, self.user)
+
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(mock_chat.call_count, 2)
+        self.assertFalse(Message.objects.filter(chat=self.chat).exists())
+
+    def test_save_exchange_checks_version(self):
+        chat = Chat.objects.select_related("context").get(pk=self.chat.pk)
+        self.store_other_exchange()
+
+        with self.assertRaises(StaleContext):
+            service.save_exchange(chat, "Hi", "Hello")
+        self.assertFalse(Message.objects.filter(chat=self.chat).exists())
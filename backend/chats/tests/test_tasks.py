@@ -0,0 +1,169 @@
+import json
+from unittest.mock import patch
+from django.test import TestCase
+from users.models import User
+from chats.models import Chat, Message, ChatContext
+from chats import context, service
+from chats.context import CONTEXT_SUMMARY_MAX_CHARS, enqueue_context_summary
+from jobs.models import Job
+from jobs.queue import claim_jobs, run_job
+from utils.ratelimit import chat_limiter
+
+
+class ChatJobTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(telegram_id=5151, username="jobber")
+        self.chat = Chat.objects.create(user=self.user)
+        ChatContext.objects.create(chat=self.chat, context_data="no context")
+        self.data = {"chat_id": self.chat.id, "content": "Weather in Dhaka?"}
+
+    def run_all(self):
+        return [run_job(job) for job in claim_jobs("test", limit=10)]
+
+    def test_enqueue_inbox_returns_job_ids(self):
+        """The web request only validates and queues, no LLM call"""
+        with patch("utils.ai.WeatherInformationPipeline.chat") as mock_chat:
+            response = service.enqueue_inbox(self.data, self.user)
+        data = json.loads(response.content)
+
+        self.assertEqual(response.status_code, 202)
+        mock_chat.assert_not_called()
+        kinds = dict(Job.objects.values_list("id", "kind"))
+        self.assertEqual(kinds[data["job_id"]], "chat_reply")
+        self.assertEqual(kinds[data["title_job_id"]], "chat_title")
+
+    def test_enqueue_inbox_skips_title_for_named_chat(self):
+        self.chat.title = "Named"
+        self.chat.save()
+
+        data = json.loads(service.enqueue_inbox(self.data, self.user).content)
+
+        self.assertIsNone(data["title_job_id"])
+        self.assertEqual(Job.objects.count(), 1)
+
+    @patch.object(chat_limiter, "max_in_flight", 2)
+    def test_enqueue_inbox_caps_unfinished_replies(self):
+        """Queued replies count against the in-flight cap, one per chat"""
+        self.chat.title = "Named"
+        self.chat.save()
+        other = Chat.objects.create(user=self.user, title="Named")
+        third = Chat.objects.create(user=self.user, title="Named")
+
+        self.assertEqual(service.enqueue_inbox(self.data, self.user).status_code, 202)
+        busy = service.enqueue_inbox(self.data, self.user)
+        self.assertEqual(busy.status_code, 429)
+        self.assertIn("this chat", json.loads(busy.content)["error"])
+
+        data = {"chat_id": other.id, "content": "Hi"}
+        self.assertEqual(service.enqueue_inbox(data, self.user).status_code, 202)
+        data = {"chat_id": third.id, "content": "Hi"}
+        self.assertEqual(service.enqueue_inbox(data, self.user).status_code, 429)
+
+        # a finished reply frees its slot
+        Job.objects.filter(payload__chat_id=self.chat.id).update(status=Job.DONE)
+        self.assertEqual(service.enqueue_inbox(data, self.user).status_code, 202)
+
+    def test_enqueue_inbox_rejects_other_users_chat(self):
+        other = User.objects.create(telegram_id=5152, username="intruder")
+
+        response = service.enqueue_inbox(self.data, other)
+
+        self.assertEqual(response.status_code, 403)
+        self.assertFalse(Job.objects.exists())
+
+    @patch(
+        "utils.ai.WeatherInformationPipeline.generate_title",
+        return_value="Dhaka Weather",
+    )
+    @patch(
+        "utils.ai.WeatherInformationPipeline.chat",
+        return_value=json.dumps({"reply": "Sunny.", "context_summary": "weather"}),
+    )
+    def test_reply_and_title_jobs(self, mock_chat, mock_title):
+        """Workers store the exchange and the title, results match inbox"""
+        data = json.loads(service.enqueue_inbox(self.data, self.user).content)
+        self.run_all()
+
+        reply = Job.objects.get(id=data["job_id"])
+        self.assertEqual(reply.status, Job.DONE)
+        self.assertEqual(reply.result["model"]["content"], "Sunny.")
+        self.assertEqual(Message.objects.filter(chat=self.chat).count(), 2)
+        self.assertEqual(
+            Job.objects.get(id=data["title_job_id"]).result, {"title": "Dhaka Weather"}
+        )
+        self.chat.refresh_from_db()
+        self.assertEqual(self.chat.title, "Dhaka Weather")
+        self.assertEqual(self.chat.context.context_data, "no context")
+
+    @patch("jobs.queue.JOB_RETRY_BACKOFF_SECONDS", 0)
+    @patch.object(context, "CONTEXT_WINDOW_MESSAGES", 2)
+    @patch.object(context, "CONTEXT_BUDGET_CHARS", 50)
+    @patch(
+        "utils.ai.WeatherInformationPipeline.summarize_context",
+        side_effect=Exception("summarizer down"),
+    )
+    @patch(
+        "utils.ai.WeatherInformationPipeline.chat",
+        return_value=json.dumps({"reply": "Sunny."}),
+    )
+    def test_failing_summary_does_not_repeat_the_reply(self, mock_chat, mock_summary):
+        """Compaction is a job of its own, its retries never store the exchange again"""
+        self.chat.title = "Named"
+        self.chat.save()
+        Message.objects.bulk_create(
+            Message(chat=self.chat, sender="user", content="x" * 20) for _ in range(4)
+        )
+        data = json.loads(service.enqueue_inbox(self.data, self.user).content)
+        for _ in range(Job.objects.get(id=data["job_id"]).max_attempts + 1):
+            self.run_all()
+
+        self.assertEqual(Job.objects.get(id=data["job_id"]).status, Job.DONE)
+        self.assertEqual(Job.objects.get(kind="chat_summary").status, Job.FAILED)
+        self.assertEqual(mock_chat.call_count, 1)
+        self.assertEqual(Message.objects.filter(chat=self.chat).count(), 4 + 2)
+
+    @patch("jobs.queue.JOB_RETRY_BACKOFF_SECONDS", 0)
+    @patch(
+        "utils.ai.WeatherInformationPipeline.chat",
+        return_value=json.dumps({"reply": "Sunny."}),
+    )
+    def test_reply_retried_after_the_write_is_not_stored_twice(self, mock_chat):
+        self.chat.title = "Named"
+        self.chat.save()
+        data = json.loads(service.enqueue_inbox(self.data, self.user).content)
+
+        with patch(
+            "chats.tasks.schedule_compaction",
+            side_effect=[Exception("queue down"), None],
+        ):
+            self.run_all()
+            self.run_all()
+
+        job = Job.objects.get(id=data["job_id"])
+        self.assertEqual(job.status, Job.DONE)
+        self.assertEqual(job.attempts, 2)
+        self.assertEqual(job.result["model"]["content"], "Sunny.")
+        self.assertEqual(mock_chat.call_count, 1)
+        self.assertEqual(Message.objects.filter(chat=self.chat).count(), 2)
+
+    @patch(
+        "utils.ai.WeatherInformationPipeline.summarize_context",
+        return_value="asked about Dhaka weather",
+    )
+    def test_summary_job_folds_messages_older_than_window(self, mock_summary):
+        """The summary job compacts even under budget, the window stays verbatim"""
+        messages = [
+            Message.objects.create(chat=self.chat, sender="user", content=f"m{i}")
+            for i in range(8)
+        ]
+
+        enqueue_context_summary(self.chat)
+        job = self.run_all()[0]
+
+        mock_summary.assert_called_once_with(
+            "no context", "user: m0\nuser: m1", max_chars=CONTEXT_SUMMARY_MAX_CHARS
+        )
+        self.assertTrue(job.result["compacted"])
+        context = ChatContext.objects.get(chat=self.chat)
+        self.assertEqual(context.context_data, "asked about Dhaka weather")
+        self.assertEqual(context.summarized_until, messages[1].id)
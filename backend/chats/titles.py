@@ -0,0 +1,105 @@
+import os
+import asyncio
+import logging
+from concurrent.futures import wait
+from asgiref.sync import sync_to_async
+from dotenv import load_dotenv
+from utils import background
+from .models import Chat
+
+load_dotenv()
+
+# how long a finished reply waits for a still running title before
+# returning without it, a late title is saved in the background
+TITLE_GRACE_SECONDS = float(os.getenv("TITLE_GRACE_SECONDS", "0.05"))
+
+# keep pending async title tasks referenced until they finish
+_background_tasks = set()
+
+
+def start_title(chat, pipeline, user_input):
+    """
+    Start generating a title next to the chat call.
+
+    Returns a future, or None when the chat already has a title.
+    """
+    if chat.title != Chat.DEFAULT_TITLE:
+        return None
+    return background.submit(pipeline.generate_title, user_input)
+
+
+def ready_title(future, chat):
+    """
+    Title if it finished within the grace period, otherwise None and
+    the title is saved to the chat once it arrives.
+    """
+    if future is None:
+        return None
+
+    wait([future], timeout=TITLE_GRACE_SECONDS)
+    if future.done():
+        return _title_result(future)
+
+    # the callback may fire on this thread, so the save is handed to a
+    # background thread that owns its own db connection
+    chat_pk = chat.pk
+    future.add_done_callback(lambda f: background.submit(_save_late_title, chat_pk, f))
+    return None
+
+
+def start_atitle(chat, pipeline, user_input):
+    """
+    Async version of start_title, returns a task or None.
+    """
+    if chat.title != Chat.DEFAULT_TITLE:
+        return None
+    return asyncio.ensure_future(pipeline.agenerate_title(user_input))
+
+
+async def aready_title(task, chat):
+    """
+    Async version of ready_title.
+    """
+    if task is None:
+        return None
+
+    await asyncio.wait([task], timeout=TITLE_GRACE_SECONDS)
+    if task.done():
+        return _title_result(task)
+
+    background = asyncio.ensure_future(_asave_late_title(task, chat.pk))
+    _background_tasks.add(background)
+    background.add_done_callback(_background_tasks.discard)
+    return None
+
+
+def save_title(chat_pk, title):
+    """
+    Store a generated title unless the chat was renamed meanwhile.
+    """
+    if not title:
+        return 0
+    return Chat.objects.filter(pk=chat_pk, title=Chat.DEFAULT_TITLE).update(title=title)
+
+
+def _title_result(future):
+    try:
+        return future.result()
+    except Exception as e:
+        logging.error(f"Chat title generation failed. error: {str(e)}")
+        return None
+
+
+def _save_late_title(chat_pk, future):
+    try:
+        save_title(chat_pk, _title_result(future))
+    except Exception as e:
+        logging.error(f"Failed to save chat title. error: {str(e)}")
+
+
+async def _asave_late_title(task, chat_pk):
+    await asyncio.wait([task])
+    try:
+        await sync_to_async(save_title)(chat_pk, _title_result(task))
+    except Exception as e:
+        logging.error(f"Failed to save chat title. error: {str(e)}")
@@ -5,6 +5,12 @@ urlpatterns = [
     path('chat-list/', views.list_user_chat),
     path('new-chat/', views.new_chat),
     path('delete-chat/<int:chat_id>/', views.delete_chat),
+    path('delete-chats/', views.delete_chats),
     path('single-chat/<str:unique_hex_id>/', views.single_chat),
+    path('messages/<str:unique_hex_id>/', views.chat_messages),
+    path('search/', views.search_chats),
+    path('export/', views.export_chats),
     path('chatting/', views.chatting),
+    path('chatting-async/', views.chatting_async),
+    path('chatting-job/', views.chatting_job),
 ]
\ No newline at end of file
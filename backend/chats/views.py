@@ -1,5 +1,10 @@
+import json
+from django.http import JsonResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
 from rest_framework.decorators import api_view
-from utils.helper import check_tg_data_string
+from utils.helper import check_tg_data_string, acheck_tg_data_string
+from utils.ratelimit import chat_rate_limit, achat_rate_limit
 
 from . import service
 
@@ -8,7 +13,38 @@ from . import service
 @api_view(["GET"])
 @check_tg_data_string
 def list_user_chat(request, current_user):
-    return service.user_chats(current_user)
+    # optional keyset pagination, ?cursor=<next_cursor>&limit=N
+    return service.user_chats(
+        current_user,
+        request.query_params.get("cursor"),
+        request.query_params.get("limit"),
+    )
+
+
+# ranked full-text search over current_user messages and chat titles,
+# ?q=<words>&limit=N&offset=<next_offset>
+@api_view(["GET"])
+@check_tg_data_string
+def search_chats(request, current_user):
+    return service.search_messages(
+        current_user,
+        request.query_params.get("q"),
+        request.query_params.get("limit"),
+        request.query_params.get("offset"),
+    )
+
+
+# download every chat with its messages, streamed,
+# ?output=ndjson|csv&gzip=true&chat=<unique_hex_id> (?format is taken by DRF)
+@api_view(["GET"])
+@check_tg_data_string
+def export_chats(request, current_user):
+    return service.export_chats(
+        current_user,
+        request.query_params.get("output"),
+        request.query_params.get("gzip") == "true",
+        request.query_params.get("chat"),
+    )
 
 
 # create a new chat
@@ -22,18 +58,67 @@ def new_chat(request, current_user):
 @api_view(["GET"])
 @check_tg_data_string
 def single_chat(request, current_user, unique_hex_id):
-    return service.get_single_chat(current_user, unique_hex_id)
+    # optional ?limit=N returns only the newest N messages
+    limit = request.query_params.get("limit")
+    return service.get_single_chat(current_user, unique_hex_id, limit)
+
+
+# page through a conversation, ?cursor=<next_cursor>&limit=N
+@api_view(["GET"])
+@check_tg_data_string
+def chat_messages(request, current_user, unique_hex_id):
+    return service.get_chat_messages(
+        current_user,
+        unique_hex_id,
+        request.query_params.get("cursor"),
+        request.query_params.get("limit"),
+    )
 
 
 # message with model
 @api_view(["POST"])
 @check_tg_data_string
+@chat_rate_limit
 def chatting(request, current_user):
+    # ?stream=true sends the reply as Server-Sent Events
+    if request.query_params.get("stream") == "true":
+        return service.inbox_stream(request.data, current_user)
     return service.inbox(request.data, current_user)
 
 
+# message with model, async view for the ASGI deployment
+@csrf_exempt
+@require_POST
+@acheck_tg_data_string
+@achat_rate_limit
+async def chatting_async(request, current_user):
+    try:
+        data = json.loads(request.body)
+    except ValueError:
+        return JsonResponse({"error": "Invalid JSON body."}, status=400)
+
+    if request.GET.get("stream") == "true":
+        return await service.ainbox_stream(data, current_user)
+    return await service.ainbox(data, current_user)
+
+
+# message with model through the job queue, poll api-v2/jobs/<job_id>/
+@api_view(["POST"])
+@check_tg_data_string
+@chat_rate_limit
+def chatting_job(request, current_user):
+    return service.enqueue_inbox(request.data, current_user)
+
+
 # delete a chat
 @api_view(["DELETE"])
 @check_tg_data_string
 def delete_chat(request, current_user, chat_id):
     return service.delete_user_chat(current_user, chat_id)
+
+
+# delete many chats at once, body {"chat_ids": [...]}
+@api_view(["POST"])
+@check_tg_data_string
+def delete_chats(request, current_user):
+    return service.delete_user_chats(current_user, request.data)
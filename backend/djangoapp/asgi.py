@@ -14,3 +14,8 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "djangoapp.settings")
 
 application = get_asgi_application()
+
+# only server processes get here, manage.py commands never warm up
+from utils.warmup import warmup_on_startup  # noqa: E402
+
+warmup_on_startup()
@@ -1,4 +1,5 @@
 import os
+from importlib.util import find_spec
 from pathlib import Path
 from corsheaders.defaults import default_headers
 from dotenv import load_dotenv
@@ -25,6 +26,7 @@ INSTALLED_APPS = [
     "rest_framework",
     "users.apps.UsersConfig",
     "chats.apps.ChatsConfig",
+    "jobs.apps.JobsConfig",
     "corsheaders",  # cros
     "django.contrib.admin",
     "django.contrib.auth",
@@ -35,6 +37,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "utils.middleware.server_timing_middleware",
     "corsheaders.middleware.CorsMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
@@ -63,12 +66,33 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = "djangoapp.wsgi.application"
-# ASGI_APPLICATION = "djangoapp.asgi.application"
+ASGI_APPLICATION = "djangoapp.asgi.application"
 
 
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
+# seconds a postgres connection stays open for the next request, 0 closes it
+# after every request; health checks drop dead connections before reuse
+CONN_MAX_AGE = int(os.getenv("CONN_MAX_AGE", "60"))
+CONN_HEALTH_CHECKS = os.getenv("CONN_HEALTH_CHECKS", "True").lower() == "true"
+# django's psycopg 3 pool per worker instead of persistent connections,
+# ignored unless psycopg[pool] is installed
+DB_POOL = (
+    os.getenv("DB_POOL", "False").lower() == "true"
+    and find_spec("psycopg_pool") is not None
+)
+# postgres connections this app may hold in total, split between the
+# WEB_CONCURRENCY workers (gunicorn reads the same variable)
+DB_MAX_CONNECTIONS = int(os.getenv("DB_MAX_CONNECTIONS", "80"))
+WEB_CONCURRENCY = max(1, int(os.getenv("WEB_CONCURRENCY", "1")))
+DB_POOL_MAX_SIZE = int(
+    os.getenv("DB_POOL_MAX_SIZE") or max(1, DB_MAX_CONNECTIONS // WEB_CONCURRENCY)
+)
+DB_POOL_MIN_SIZE = min(int(os.getenv("DB_POOL_MIN_SIZE", "2")), DB_POOL_MAX_SIZE)
+# seconds a request waits for a free pooled connection
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "10"))
+
 if DEBUG:
     # sqlite3 for dev and testing
     DATABASES = {
@@ -87,8 +111,20 @@ else:
             "PASSWORD": os.getenv("POSTGRES_PASSWORD"),
             "HOST": os.getenv("DB_HOST", "postgresdb"),
             "PORT": os.getenv("DB_PORT", "5432"),
+            "CONN_MAX_AGE": CONN_MAX_AGE,
+            "CONN_HEALTH_CHECKS": CONN_HEALTH_CHECKS,
         }
     }
+    if DB_POOL:
+        # the pool replaces persistent connections
+        DATABASES["default"]["CONN_MAX_AGE"] = 0
+        DATABASES["default"]["OPTIONS"] = {
+            "pool": {
+                "min_size": DB_POOL_MIN_SIZE,
+                "max_size": DB_POOL_MAX_SIZE,
+                "timeout": DB_POOL_TIMEOUT,
+            }
+        }
 
 
 # Password validation
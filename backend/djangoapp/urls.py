@@ -7,10 +7,15 @@ Including another URLconf
 """
 from django.contrib import admin
 from django.urls import path, include
+from utils.metrics import metrics_view
+from utils.warmup import ready_view
 
 # register all blueprint/app route
 urlpatterns = [
     path('api-v2/admin/', admin.site.urls),
     path('api-v2/users/', include('users.urls')),
     path('api-v2/chat/', include('chats.urls')),
+    path('api-v2/jobs/', include('jobs.urls')),
+    path('api-v2/metrics/', metrics_view),
+    path('api-v2/ready/', ready_view),
 ]
@@ -14,3 +14,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'djangoapp.settings')
 
 application = get_wsgi_application()
+
+# only server processes get here, manage.py commands never warm up
+from utils.warmup import warmup_on_startup  # noqa: E402
+
+warmup_on_startup()
@@ -0,0 +1,50 @@
+import signal
+from django.core.management.base import BaseCommand
+from jobs.worker import Worker, LLM_WORKER_POOL_SIZE, LLM_WORKER_POLL_SECONDS
+
+
+class Command(BaseCommand):
+    help = "Run queued LLM jobs (chat replies, titles, summaries) on a thread pool."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--pool-size",
+            type=int,
+            default=LLM_WORKER_POOL_SIZE,
+            help="jobs processed at the same time",
+        )
+        parser.add_argument(
+            "--poll-interval",
+            type=float,
+            default=LLM_WORKER_POLL_SECONDS,
+            help="seconds to sleep when the queue is empty",
+        )
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="exit once the queue is empty",
+        )
+
+    def handle(self, *args, **options):
+        worker = Worker(
+            pool_size=options["pool_size"], poll_interval=options["poll_interval"]
+        )
+
+        # finish running jobs on ctrl-c / docker stop
+        previous = {}
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                previous[sig] = signal.signal(sig, lambda *_: worker.stop())
+            except ValueError:
+                # not the main thread, e.g. call_command from another thread
+                pass
+
+        self.stdout.write(
+            f"worker {worker.worker_id} started, pool size {worker.pool_size}"
+        )
+        try:
+            processed = worker.run(once=options["once"])
+        finally:
+            for sig, handler in previous.items():
+                signal.signal(sig, handler)
+        self.stdout.write(f"worker {worker.worker_id} stopped, {processed} jobs run")
@@ -0,0 +1,55 @@
+import os
+from django.db import models
+from django.utils import timezone
+from users.models import User
+
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+
+
+class Job(models.Model):
+    """
+    represent a unit of background work, run by manage.py run_llm_workers
+    """
+
+    PENDING = "pending"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+
+    STATUS_CHOICES = [
+        (PENDING, "Pending"),
+        (RUNNING, "Running"),
+        (DONE, "Done"),
+        (FAILED, "Failed"),
+    ]
+
+    kind = models.CharField(max_length=50)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    payload = models.JSONField(default=dict)
+    result = models.JSONField(null=True, blank=True)
+    error = models.TextField(blank=True, default="")
+
+    # owner, only they can read the result
+    user = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name="jobs", null=True, blank=True
+    )
+
+    attempts = models.PositiveSmallIntegerField(default=0)
+    max_attempts = models.PositiveSmallIntegerField(default=JOB_MAX_ATTEMPTS)
+    run_after = models.DateTimeField(default=timezone.now)
+    locked_by = models.CharField(max_length=100, blank=True, default="")
+    locked_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(default=timezone.now)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = "Job"
+        verbose_name_plural = "Jobs"
+        ordering = ["-created_at"]
+        indexes = [
+            # serves the claim query, pending jobs that are due, oldest first
+            models.Index(fields=["status", "run_after", "id"], name="job_claim_idx"),
+        ]
+
+    def __str__(self):
+        return f"job-id: {self.id} -> {self.kind} ({self.status})"
@@ -0,0 +1,216 @@
+import os
+import socket
+import logging
+import threading
+from datetime import timedelta
+from django.db import connections, transaction
+from django.db.models import F
+from django.utils import timezone
+from .models import Job
+from utils import background
+from .registry import get_handler
+
+# first retry waits this long, doubled on every further attempt
+JOB_RETRY_BACKOFF_SECONDS = float(os.getenv("JOB_RETRY_BACKOFF_SECONDS", "2"))
+# finished (done/failed) jobs are deleted this long after they finished
+JOB_RETENTION_DAYS = float(os.getenv("JOB_RETENTION_DAYS", "7"))
+# a job no worker claimed this long after it was due is run by the web
+# process that queued it, on its background threads; 0 turns this off
+JOB_PICKUP_SECONDS = float(os.getenv("JOB_PICKUP_SECONDS", "60"))
+
+
+def enqueue(kind, payload=None, user=None, run_after=None):
+    """
+    Store a pending job and return it.
+    """
+    return Job.objects.create(
+        kind=kind,
+        payload=payload or {},
+        user=user,
+        run_after=run_after or timezone.now(),
+    )
+
+
+def claim_jobs(worker_id, limit=1, using="default"):
+    """
+    Mark up to `limit` due jobs as running for this worker and return them.
+
+    Postgres (and other backends with SKIP LOCKED) lock the candidate rows
+    so concurrent workers skip each other's jobs instead of waiting.
+    Without row locks (sqlite) each candidate is claimed by a conditional
+    update, writes are serialized so only one worker's update matches.
+    """
+    if limit <= 0:
+        return []
+
+    now = timezone.now()
+    due = (
+        Job.objects.using(using)
+        .filter(status=Job.PENDING, run_after__lte=now)
+        .order_by("run_after", "id")
+    )
+    claim = {
+        "status": Job.RUNNING,
+        "locked_by": worker_id,
+        "locked_at": now,
+        "attempts": F("attempts") + 1,
+    }
+
+    if connections[using].features.has_select_for_update_skip_locked:
+        with transaction.atomic(using=using):
+            ids = list(
+                due.select_for_update(skip_locked=True).values_list("id", flat=True)[
+                    :limit
+                ]
+            )
+            if ids:
+                Job.objects.using(using).filter(id__in=ids).update(**claim)
+    else:
+        ids = []
+        # over-fetch a little, other workers may take some candidates first
+        for pk in due.values_list("id", flat=True)[: limit * 2]:
+            claimed = (
+                Job.objects.using(using)
+                .filter(pk=pk, status=Job.PENDING)
+                .update(**claim)
+            )
+            if claimed:
+                ids.append(pk)
+            if len(ids) == limit:
+                break
+
+    if not ids:
+        return []
+    return list(Job.objects.using(using).filter(id__in=ids).order_by("id"))
+
+
+def run_job(job):
+    """
+    Run a claimed job through its handler and store the outcome.
+
+    A failing job goes back to pending with an exponential backoff
+    until it runs out of attempts, then it is marked failed. The outcome
+    is only stored while the job is still claimed by this worker, a job
+    requeued by requeue_stale belongs to whoever claimed it next.
+    """
+    handler = get_handler(job.kind)
+    try:
+        if handler is None:
+            raise LookupError(f"no handler registered for job kind {job.kind}")
+        result = handler(job)
+    except Exception as e:
+        logging.error(f"Job {job.id} ({job.kind}) failed. error: {str(e)}")
+        now = timezone.now()
+        fields = {"error": str(e)[:1000], "locked_by": "", "locked_at": None}
+        if handler is not None and job.attempts < job.max_attempts:
+            backoff = JOB_RETRY_BACKOFF_SECONDS * 2 ** max(job.attempts - 1, 0)
+            fields["status"] = Job.PENDING
+            fields["run_after"] = now + timedelta(seconds=backoff)
+        else:
+            fields["status"] = Job.FAILED
+            fields["finished_at"] = now
+    else:
+        fields = {
+            "status": Job.DONE,
+            "result": result,
+            "error": "",
+            "locked_by": "",
+            "locked_at": None,
+            "finished_at": timezone.now(),
+        }
+
+    stored = Job.objects.filter(
+        pk=job.pk,
+        status=Job.RUNNING,
+        locked_by=job.locked_by,
+        locked_at=job.locked_at,
+    ).update(**fields)
+    if not stored:
+        logging.warning(
+            f"Job {job.id} ({job.kind}) was requeued while running, outcome dropped"
+        )
+        return job
+    for field, value in fields.items():
+        setattr(job, field, value)
+    return job
+
+
+def run_if_unclaimed(job, after=None):
+    """
+    Run the job in this process when no worker has claimed it `after`
+    seconds (JOB_PICKUP_SECONDS by default) from now, so housekeeping
+    jobs still happen on deployments without run_llm_workers.
+
+    Returns the timer, or None when the fallback is off.
+    """
+    after = JOB_PICKUP_SECONDS if after is None else after
+    if JOB_PICKUP_SECONDS <= 0:
+        return None
+    timer = threading.Timer(after, background.submit, args=(run_unclaimed, job.pk))
+    timer.daemon = True
+    timer.start()
+    return timer
+
+
+def run_unclaimed(job_id):
+    """
+    Claim a due pending job for this process and run it.
+
+    Returns the job, or None when a worker claimed it first.
+    """
+    now = timezone.now()
+    claimed = Job.objects.filter(
+        pk=job_id, status=Job.PENDING, run_after__lte=now
+    ).update(
+        status=Job.RUNNING,
+        locked_by=f"{socket.gethostname()}:{os.getpid()}:background",
+        locked_at=now,
+        attempts=F("attempts") + 1,
+    )
+    if not claimed:
+        return None
+
+    job = run_job(Job.objects.get(pk=job_id))
+    if job.status == Job.PENDING:
+        # failed, give the workers the backoff plus the pickup time again
+        wait = (job.run_after - timezone.now()).total_seconds()
+        run_if_unclaimed(job, after=max(wait, 0) + JOB_PICKUP_SECONDS)
+    return job
+
+
+def requeue_stale(timeout_seconds, using="default"):
+    """
+    Hand running jobs whose worker died back to the queue.
+
+    Returns the number of jobs released.
+    """
+    cutoff = timezone.now() - timedelta(seconds=timeout_seconds)
+    stale = Job.objects.using(using).filter(status=Job.RUNNING, locked_at__lt=cutoff)
+
+    failed = stale.filter(attempts__gte=F("max_attempts")).update(
+        status=Job.FAILED,
+        error="worker stopped before the job finished",
+        locked_by="",
+        locked_at=None,
+        finished_at=timezone.now(),
+    )
+    released = stale.update(status=Job.PENDING, locked_by="", locked_at=None)
+    return failed + released
+
+
+def prune_jobs(retention_days=JOB_RETENTION_DAYS, using="default"):
+    """
+    Delete done and failed jobs that finished more than `retention_days`
+    ago, 0 keeps them forever.
+
+    Returns the number of jobs deleted.
+    """
+    if retention_days <= 0:
+        return 0
+    cutoff = timezone.now() - timedelta(days=retention_days)
+    deleted, _ = (
+        Job.objects.using(using)
+        .filter(status__in=[Job.DONE, Job.FAILED], finished_at__lt=cutoff)
+        .delete()
+    )
+    return deleted
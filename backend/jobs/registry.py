@@ -0,0 +1,22 @@
+# job kind -> callable(job) returning a JSON serializable result
+handlers = {}
+
+
+def handler(kind):
+    """
+    register a job handler
+
+        @handler("chat_reply")
+        def chat_reply(job):
+            ...
+    """
+
+    def register(fn):
+        handlers[kind] = fn
+        return fn
+
+    return register
+
+
+def get_handler(kind):
+    return handlers.get(kind)
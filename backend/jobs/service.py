@@ -0,0 +1,42 @@
+import logging
+from django.http import JsonResponse
+from .models import Job
+
+
+def job_response(job):
+    """
+    JSON body describing a job, the result is only set once it is done
+    """
+    response_data = {
+        "id": job.id,
+        "kind": job.kind,
+        "status": job.status,
+        "result": job.result if job.status == Job.DONE else None,
+        "created_at": job.created_at,
+        "finished_at": job.finished_at,
+    }
+    if job.status == Job.FAILED:
+        # the stored error is for operators, not for the client
+        response_data["error"] = "Something went wrong!"
+    return response_data
+
+
+def get_job(current_user, job_id):
+    """
+    Poll a job owned by the current user.
+    """
+    try:
+        job = Job.objects.get(id=job_id)
+    except Job.DoesNotExist:
+        logging.warning(f"Job not found for id: {job_id}")
+        return JsonResponse({"error": "Job not found."}, status=404)
+
+    if job.user_id != current_user.id:
+        logging.error(
+            f"Requested job is not belong to current_user. username: {current_user}, job: {job_id}"
+        )
+        return JsonResponse(
+            {"error": "Request job is not belong to current_user"}, status=403
+        )
+
+    return JsonResponse(job_response(job), status=200)
@@ -0,0 +1,204 @@
+import json
+from datetime import timedelta
+from unittest.mock import patch
+from django.db import connection
+from django.test import TestCase
+from django.utils import timezone
+from users.models import User
+from jobs import registry, service
+from jobs.models import Job
+from jobs.queue import (
+    enqueue,
+    claim_jobs,
+    run_job,
+    requeue_stale,
+    prune_jobs,
+    run_unclaimed,
+)
+
+
+class QueueTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(telegram_id=4040, username="queue_user")
+        self.handlers = dict(registry.handlers)
+        self.addCleanup(self.restore_handlers)
+
+    def restore_handlers(self):
+        registry.handlers.clear()
+        registry.handlers.update(self.handlers)
+
+
+class ClaimJobsTests(QueueTestCase):
+    def test_claim_marks_job_running(self):
+        """A claimed job is running, owned by the worker and counted as an attempt"""
+        job = enqueue("echo", {"value": 1}, user=self.user)
+
+        claimed = claim_jobs("worker-1")
+
+        self.assertEqual([j.id for j in claimed], [job.id])
+        self.assertEqual(claimed[0].status, Job.RUNNING)
+        self.assertEqual(claimed[0].locked_by, "worker-1")
+        self.assertEqual(claimed[0].attempts, 1)
+        self.assertEqual(claim_jobs("worker-2"), [])
+
+    def test_claim_respects_limit_order_and_run_after(self):
+        """Due jobs are claimed oldest first, future jobs wait"""
+        first = enqueue("echo")
+        second = enqueue("echo")
+        enqueue("echo", run_after=timezone.now() + timedelta(minutes=5))
+
+        self.assertEqual([j.id for j in claim_jobs("w", limit=1)], [first.id])
+        self.assertEqual([j.id for j in claim_jobs("w", limit=5)], [second.id])
+
+    def test_skip_locked_path(self):
+        """Backends with SKIP LOCKED claim inside a locking transaction"""
+        jobs = [enqueue("echo") for _ in range(3)]
+
+        with patch.object(
+            connection.features, "has_select_for_update_skip_locked", True
+        ):
+            claimed = claim_jobs("w", limit=2)
+
+        self.assertEqual([j.id for j in claimed], [jobs[0].id, jobs[1].id])
+        self.assertEqual(Job.objects.filter(status=Job.PENDING).count(), 1)
+
+
+class RunJobTests(QueueTestCase):
+    def test_success_stores_result(self):
+        registry.handler("echo")(lambda job: {"echo": job.payload["value"]})
+        enqueue("echo", {"value": 7})
+        job = run_job(claim_jobs("w")[0])
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.DONE)
+        self.assertEqual(job.result, {"echo": 7})
+        self.assertIsNotNone(job.finished_at)
+        self.assertEqual(job.locked_by, "")
+
+    def test_failure_is_retried_with_backoff_then_failed(self):
+        """A failing job goes back to pending until attempts run out"""
+
+        def boom(job):
+            raise RuntimeError("LLM down")
+
+        registry.handler("boom")(boom)
+        job = Job.objects.create(kind="boom", max_attempts=2)
+
+        run_job(claim_jobs("w")[0])
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.PENDING)
+        self.assertGreater(job.run_after, timezone.now())
+        self.assertIn("LLM down", job.error)
+
+        Job.objects.filter(pk=job.pk).update(run_after=timezone.now())
+        run_job(claim_jobs("w")[0])
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.FAILED)
+        self.assertEqual(job.attempts, 2)
+
+    def test_unknown_kind_fails_without_retry(self):
+        enqueue("missing")
+        job = run_job(claim_jobs("w")[0])
+
+        self.assertEqual(job.status, Job.FAILED)
+        self.assertIn("no handler", job.error)
+
+    def test_requeue_stale(self):
+        """Running jobs of a dead worker are released or failed"""
+        old = timezone.now() - timedelta(hours=1)
+        retry = Job.objects.create(
+            kind="echo", status=Job.RUNNING, attempts=1, locked_at=old
+        )
+        spent = Job.objects.create(
+            kind="echo", status=Job.RUNNING, attempts=3, max_attempts=3, locked_at=old
+        )
+        fresh = Job.objects.create(
+            kind="echo", status=Job.RUNNING, attempts=1, locked_at=timezone.now()
+        )
+
+        self.assertEqual(requeue_stale(600), 2)
+
+        statuses = dict(Job.objects.values_list("id", "status"))
+        self.assertEqual(statuses[retry.id], Job.PENDING)
+        self.assertEqual(statuses[spent.id], Job.FAILED)
+        self.assertEqual(statuses[fresh.id], Job.RUNNING)
+
+    def test_requeued_job_keeps_the_new_claim(self):
+        """A worker that lost its claim does not overwrite the new owner's job"""
+        registry.handler("echo")(lambda job: {"echo": job.payload["value"]})
+        enqueue("echo", {"value": 1})
+        slow = claim_jobs("slow")[0]
+
+        Job.objects.filter(pk=slow.pk).update(
+            locked_at=timezone.now() - timedelta(hours=1)
+        )
+        requeue_stale(600)
+        fast = run_job(claim_jobs("fast")[0])
+        run_job(slow)
+
+        job = Job.objects.get(pk=slow.pk)
+        self.assertEqual(job.status, Job.DONE)
+        self.assertEqual(job.attempts, 2)
+        self.assertEqual(job.finished_at, fast.finished_at)
+
+    def test_unclaimed_job_runs_in_process(self):
+        """A job no worker claimed runs here, one a worker claimed is left alone"""
+        registry.handler("echo")(lambda job: {"echo": job.payload["value"]})
+        claimed = enqueue("echo", {"value": 1})
+        unclaimed = enqueue("echo", {"value": 2})
+        claim_jobs("w", limit=1)
+
+        self.assertIsNone(run_unclaimed(claimed.pk))
+        job = run_unclaimed(unclaimed.pk)
+
+        self.assertEqual(job.status, Job.DONE)
+        self.assertEqual(job.result, {"echo": 2})
+        self.assertEqual(job.attempts, 1)
+
+    def test_prune_deletes_old_finished_jobs(self):
+        old = timezone.now() - timedelta(days=30)
+        done = Job.objects.create(kind="echo", status=Job.DONE, finished_at=old)
+        failed = Job.objects.create(kind="echo", status=Job.FAILED, finished_at=old)
+        recent = Job.objects.create(
+            kind="echo", status=Job.DONE, finished_at=timezone.now()
+        )
+        pending = Job.objects.create(kind="echo")
+
+        self.assertEqual(prune_jobs(0), 0)
+        self.assertEqual(prune_jobs(7), 2)
+
+        left = set(Job.objects.values_list("id", flat=True))
+        self.assertEqual(left, {recent.id, pending.id})
+        self.assertNotIn(done.id, left)
+        self.assertNotIn(failed.id, left)
+
+
+class JobServiceTests(QueueTestCase):
+    def test_owner_polls_result(self):
+        job = Job.objects.create(
+            kind="echo", user=self.user, status=Job.DONE, result={"ok": True}
+        )
+
+        response = service.get_job(self.user, job.id)
+        data = json.loads(response.content)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(data["status"], Job.DONE)
+        self.assertEqual(data["result"], {"ok": True})
+
+    def test_failed_job_hides_error_details(self):
+        job = Job.objects.create(
+            kind="echo", user=self.user, status=Job.FAILED, error="secret trace"
+        )
+
+        data = json.loads(service.get_job(self.user, job.id).content)
+
+        self.assertEqual(data["error"], "Something went wrong!")
+        self.assertIsNone(data["result"])
+
+    def test_other_user_and_missing_job(self):
+        other = User.objects.create(telegram_id=4041, username="other")
+        job = Job.objects.create(kind="echo", user=other)
+
+        self.assertEqual(service.get_job(self.user, job.id).status_code, 403)
+        self.assertEqual(service.get_job(self.user, 999999).status_code, 404)
@@ -0,0 +1,51 @@
+import time
+from io import StringIO
+from django.core.management import call_command
+from django.test import TransactionTestCase
+from jobs import registry
+from jobs.models import Job
+from jobs.queue import enqueue
+from jobs.worker import Worker
+
+
+class WorkerTests(TransactionTestCase):
+    """
+    Pool threads use their own connections, so rows must be committed.
+    """
+
+    def setUp(self):
+        handlers = dict(registry.handlers)
+        self.addCleanup(self.restore_handlers, handlers)
+
+        def nap(job):
+            time.sleep(job.payload["seconds"])
+            return {"slept": job.payload["seconds"]}
+
+        registry.handler("nap")(nap)
+
+    def restore_handlers(self, handlers):
+        registry.handlers.clear()
+        registry.handlers.update(handlers)
+
+    def test_pool_runs_jobs_concurrently(self):
+        """Four 0.2s jobs on a pool of two take about two rounds"""
+        for _ in range(4):
+            enqueue("nap", {"seconds": 0.2})
+
+        start = time.perf_counter()
+        processed = Worker(pool_size=2, poll_interval=0.05).run(once=True)
+        elapsed = time.perf_counter() - start
+
+        self.assertEqual(processed, 4)
+        self.assertLess(elapsed, 0.75)
+        self.assertEqual(Job.objects.filter(status=Job.DONE).count(), 4)
+
+    def test_command_drains_queue(self):
+        enqueue("nap", {"seconds": 0})
+        enqueue("nap", {"seconds": 0})
+        out = StringIO()
+
+        call_command("run_llm_workers", "--once", "--pool-size", "2", stdout=out)
+
+        self.assertIn("2 jobs run", out.getvalue())
+        self.assertFalse(Job.objects.exclude(status=Job.DONE).exists())
@@ -0,0 +1,11 @@
+from rest_framework.decorators import api_view
+from utils.helper import check_tg_data_string
+
+from . import service
+
+
+# poll a background job
+@api_view(["GET"])
+@check_tg_data_string
+def job_detail(request, current_user, job_id):
+    return service.get_job(current_user, job_id)
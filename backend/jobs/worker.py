@@ -0,0 +1,95 @@
+import os
+import time
+import socket
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from django.db import close_old_connections, connection
+from dotenv import load_dotenv
+from .queue import claim_jobs, run_job, requeue_stale, prune_jobs
+
+load_dotenv()
+
+# jobs run at the same time, LLM calls are I/O bound so threads are enough
+LLM_WORKER_POOL_SIZE = int(os.getenv("LLM_WORKER_POOL_SIZE", "4"))
+LLM_WORKER_POLL_SECONDS = float(os.getenv("LLM_WORKER_POLL_SECONDS", "1"))
+# a running job older than this is assumed orphaned by a dead worker
+LLM_JOB_STALE_SECONDS = int(os.getenv("LLM_JOB_STALE_SECONDS", "600"))
+
+
+class Worker:
+    """
+    Claims jobs from the database and runs them on a thread pool.
+
+    The web tier only enqueues, so its capacity no longer depends on
+    how slow the model is.
+    """
+
+    def __init__(
+        self,
+        pool_size=LLM_WORKER_POOL_SIZE,
+        poll_interval=LLM_WORKER_POLL_SECONDS,
+        stale_seconds=LLM_JOB_STALE_SECONDS,
+        worker_id=None,
+    ):
+        self.pool_size = pool_size
+        self.poll_interval = poll_interval
+        self.stale_seconds = stale_seconds
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}"
+        self.processed = 0
+        self._processed_lock = threading.Lock()
+        self._stop = threading.Event()
+
+    def stop(self):
+        """
+        stop claiming, jobs already running are allowed to finish
+        """
+        self._stop.set()
+
+    def run(self, once=False):
+        """
+        Process jobs until stop() is called, or until the queue is
+        empty when once=True.
+        """
+        running = set()
+        last_requeue = 0
+        with ThreadPoolExecutor(
+            max_workers=self.pool_size, thread_name_prefix="llm-worker"
+        ) as pool:
+            while not self._stop.is_set():
+                close_old_connections()
+
+                if time.monotonic() - last_requeue > self.stale_seconds / 2:
+                    requeue_stale(self.stale_seconds)
+                    prune_jobs()
+                    last_requeue = time.monotonic()
+
+                running = {future for future in running if not future.done()}
+                jobs = claim_jobs(self.worker_id, self.pool_size - len(running))
+                for job in jobs:
+                    running.add(pool.submit(self._run, job))
+
+                if once and not jobs and not running:
+                    break
+
+                if len(running) == self.pool_size or (once and not jobs):
+                    # pool is full, wake up as soon as a slot frees
+                    wait(
+                        running, timeout=self.poll_interval, return_when=FIRST_COMPLETED
+                    )
+                elif not jobs:
+                    self._stop.wait(self.poll_interval)
+
+        close_old_connections()
+        return self.processed
+
+    def _run(self, job):
+        try:
+            run_job(job)
+        except Exception as e:
+            logging.error(f"Worker failed to store job {job.id}. error: {str(e)}")
+        finally:
+            with self._processed_lock:
+                self.processed += 1
+            # each pool thread has its own connection
+            connection.close()
@@ -1,22 +1,29 @@
 import os
+import json
+import threading
 from dotenv import load_dotenv
-from graphbit import LlmClient
-from utils.helper import get_current_weather
+from graphbit import LlmClient, tool
+from utils.llm import LLM_FALLBACK_MODELS, LLM_TIMEOUT_SECONDS, ResilientCaller
+from utils.metrics import timed
+from utils.response_cache import response_cache
+from utils.weather import weather_client
 from graphbit import init, LlmConfig, Executor, Workflow, Node
 
 load_dotenv()
 
 OPENROUTER_API_KEY = os.getenv("OPENROUTER_API_KEY")
+# OpenAI compatible endpoint used instead of OpenRouter, e.g. the fake
+# server of benchmarks.loadtest
+LLM_BASE_URL = os.getenv("LLM_BASE_URL")
 DEBUG = os.getenv("DEBUG", "True").lower() == "true"
+DEFAULT_MODEL = "gpt-4o-mini"
 
 SYSTEM_INSTRUCTION = (
     "You are a helpful and friendly assistant and your name is 'Vulval bot'."
     "You have access to pull weather data from an API."
-    "Based on the previous conversation summary, create a new concise summary."
-    "The summary should capture key details, questions, and themes."
-    "The summary is for your internal context, so compress it as much as you can."
+    "The conversation context holds a summary of older messages followed by the most recent messages."
     "The final response must be a **plain JSON string**, without backticks, code blocks, or any other formatting."
-    "'reply' for the user message and 'context_summary' for the updated conversation context."
+    "Put the answer for the user message under a single 'reply' key."
 )
 
 TITLE_GENERATION_INSTRUCTION = (
@@ -27,20 +34,88 @@ TITLE_GENERATION_INSTRUCTION = (
     "phrases, or explanations. The title must be in 3 to 5 word."
 )
 
+CONTEXT_SUMMARY_INSTRUCTION = (
+    "You compress conversations into an internal context summary. Merge the "
+    "previous summary and the new messages into one concise summary that keeps "
+    "names, places, preferences and open questions needed to continue the "
+    "conversation. Respond ONLY with the summary text."
+)
 
-class WeatherInformationPipeline:
-    def __init__(self, api_key: str = OPENROUTER_API_KEY, model: str = "gpt-4o-mini"):
+
+@tool(_description="Pull current weather information for given city")
+def get_current_weather(location: str) -> dict:
+    """Get weather information for a specific location."""
+    return weather_client.current(location)
+
+
+# process wide pipeline registry, keyed by (api_key, model)
+_pipelines = {}
+_pipelines_lock = threading.Lock()
+_graphbit_ready = False
+
+
+def _init_graphbit():
+    """
+    graphbit init() only needs to run once per process
+    """
+    global _graphbit_ready
+    if not _graphbit_ready:
         init(log_level="info", enable_tracing=False)
-        self.llm_config = LlmConfig.openrouter(api_key=api_key, model=model)
-        self.executor = Executor(self.llm_config, timeout_seconds=60, debug=DEBUG)
+        _graphbit_ready = True
+
+
+class WeatherInformationPipeline:
+    def __init__(
+        self,
+        api_key: str = OPENROUTER_API_KEY,
+        model: str = DEFAULT_MODEL,
+        fallback_models=None,
+    ):
+        _init_graphbit()
+        self.api_key = api_key
+        self.model = model
+        self.llm_config = llm_config(api_key, model)
+        self.executor = Executor(
+            self.llm_config, timeout_seconds=LLM_TIMEOUT_SECONDS, debug=DEBUG
+        )
         self.client = LlmClient(self.llm_config, debug=DEBUG)
 
+        # every call goes through retries, breakers and the fallback models,
+        # which get their own executor/client on first use
+        if fallback_models is None:
+            fallback_models = LLM_FALLBACK_MODELS
+        self.caller = ResilientCaller([model, *fallback_models])
+        self._backends = {model: (self.executor, self.client)}
+        self._backends_lock = threading.Lock()
+
+    def backend(self, model: str):
+        """(executor, client) for model"""
+        backend = self._backends.get(model)
+        if backend is None:
+            with self._backends_lock:
+                backend = self._backends.get(model)
+                if backend is None:
+                    config = llm_config(self.api_key, model)
+                    backend = (
+                        Executor(
+                            config, timeout_seconds=LLM_TIMEOUT_SECONDS, debug=DEBUG
+                        ),
+                        LlmClient(config, debug=DEBUG),
+                    )
+                    self._backends[model] = backend
+        return backend
+
+    def cache_key(self, query: str, context_summary: str) -> str:
+        return response_cache.make_key(
+            self.model, SYSTEM_INSTRUCTION, context_summary, query
+        )
+
     def create_workflow(self, query: str, context_summary: str) -> Workflow:
         workflow = Workflow("Instant Weather Pull")
 
         fetch_node = Node.agent(
             name="Weather Agent",
-            prompt=f"""{SYSTEM_INSTRUCTION} Previous conversation summary: {context_summary} User message: {query}""",
+            prompt=f"""{SYSTEM_INSTRUCTION} Conversation context: {context_summary} User message: {query}""",
             agent_id="weather_agent",
             tools=[get_current_weather],
         )
@@ -49,22 +124,176 @@ class WeatherInformationPipeline:
         workflow.validate()
         return workflow
 
+    @timed("llm_chat")
     def chat(self, query: str, context_summary: str):
         """Run the simplified workflow."""
-        workflow = self.create_workflow(query, context_summary)
-        result = self.executor.execute(workflow)
-
-        if result.is_success():
-            return result.get_node_output("Weather Agent")
-        else:
-            error_msg = result.get_error()
-            raise Exception(f"WeatherInformationPipeline failed! Error: {error_msg}")
-
-    def generate_title(self, first_message_content, model_reply):
-        response = self.client.complete(
-            prompt=f"{TITLE_GENERATION_INSTRUCTION} user_input: {first_message_content}, model_response: {model_reply}",
-            max_tokens=5,
-            temperature=0.7,
+        cache_key = self.cache_key(query, context_summary)
+        cached = response_cache.get(cache_key)
+        if cached is not None:
+            return cached
+
+        # a weather lookup while the workflow runs marks the answer as tool
+        # based, a concurrent request's lookup can only shorten its TTL
+        lookups = weather_client.lookups
+        output = self.caller.call(
+            lambda model: self.run_workflow(model, query, context_summary)
+        )
+        if usable_reply(output):
+            response_cache.set(cache_key, output, weather_client.lookups != lookups)
+        return output
+
+    @timed("llm_chat")
+    async def achat(self, query: str, context_summary: str):
+        """Run the simplified workflow without blocking the event loop."""
+        cache_key = self.cache_key(query, context_summary)
+        cached = response_cache.get(cache_key)
+        if cached is not None:
+            return cached
+
+        lookups = weather_client.lookups
+        output = await self.caller.acall(
+            lambda model: self.arun_workflow(model, query, context_summary)
+        )
+        if usable_reply(output):
+            response_cache.set(cache_key, output, weather_client.lookups != lookups)
+        return output
+
+    def run_workflow(self, model: str, query: str, context_summary: str):
+        """One attempt of the workflow on model."""
+        executor, _ = self.backend(model)
+        result = executor.execute(self.create_workflow(query, context_summary))
+        return workflow_output(result)
+
+    async def arun_workflow(self, model: str, query: str, context_summary: str):
+        executor, _ = self.backend(model)
+        result = await executor.run_async(self.create_workflow(query, context_summary))
+        return workflow_output(result)
+
+    def stream_chat(self, query: str, context_summary: str):
+        """
+        Yield the model output in chunks.
+
+        graphbit agent workflows return the whole output at once, so this
+        yields a single chunk; callers parse it incrementally and need no
+        change once a token streaming backend is plugged in.
+        """
+        yield self.chat(query, context_summary)
+
+    async def astream_chat(self, query: str, context_summary: str):
+        """Async version of stream_chat."""
+        yield await self.achat(query, context_summary)
+
+    @timed("llm_title")
+    def generate_title(self, first_message_content, model_reply=None):
+        response = self.caller.call(
+            lambda model: self.backend(model)[1].complete(
+                prompt=title_prompt(first_message_content, model_reply),
+                max_tokens=5,
+                temperature=0.7,
+            ),
+            hedge=False,
+        )
+
+        return response
+
+    @timed("llm_title")
+    async def agenerate_title(self, first_message_content, model_reply=None):
+        response = await self.caller.acall(
+            lambda model: self.backend(model)[1].complete_async(
+                prompt=title_prompt(first_message_content, model_reply),
+                max_tokens=5,
+                temperature=0.7,
+            ),
+            hedge=False,
         )
 
         return response
+
+    @timed("llm_summary")
+    def summarize_context(self, context_summary, transcript, max_chars=1500):
+        """
+        fold older messages into the stored context summary
+        """
+        prompt = f"{CONTEXT_SUMMARY_INSTRUCTION} Use at most {max_chars} characters. previous_summary: {context_summary}, messages: {transcript}"
+        return self.caller.call(
+            lambda model: self.backend(model)[1].complete(
+                prompt=prompt, max_tokens=300, temperature=0.2
+            ),
+            hedge=False,
+        )
+
+
+def llm_config(api_key: str, model: str) -> LlmConfig:
+    if LLM_BASE_URL:
+        # graphbit's openrouter config takes no base url, the bytedance one is
+        # a plain chat completions client for any base url
+        return LlmConfig.bytedance(api_key=api_key, model=model, base_url=LLM_BASE_URL)
+    return LlmConfig.openrouter(api_key=api_key, model=model)
+
+
+def workflow_output(result):
+    if result.is_success():
+        return result.get_node_output("Weather Agent")
+    error_msg = result.get_error()
+    raise Exception(f"WeatherInformationPipeline failed! Error: {error_msg}")
+
+
+def usable_reply(output):
+    """
+    the output is JSON with a non-empty reply, anything else is rejected
+    by the chat endpoints and must not be replayed from the cache
+    """
+    try:
+        reply = json.loads(output)["reply"]
+    except Exception:
+        return False
+    return isinstance(reply, str) and bool(reply.strip())
+
+
+def title_prompt(first_message_content, model_reply=None):
+    """
+    the title only needs the first message, so it can be generated
+    before the model reply exists
+    """
+    prompt = f"{TITLE_GENERATION_INSTRUCTION} user_input: {first_message_content}"
+    if model_reply is not None:
+        prompt += f", model_response: {model_reply}"
+    return prompt
+
+
+def get_pipeline(
+    api_key: str = OPENROUTER_API_KEY, model: str = DEFAULT_MODEL
+) -> WeatherInformationPipeline:
+    """
+    Return the pipeline for (api_key, model), building it on first use.
+
+    The pipeline (llm config, executor and client) is shared by every
+    request handled by this process so connections are reused.
+    """
+    key = (api_key, model)
+    pipeline = _pipelines.get(key)
+    if pipeline is not None:
+        return pipeline
+
+    with _pipelines_lock:
+        # another thread may have built it while we waited for the lock
+        pipeline = _pipelines.get(key)
+        if pipeline is None:
+            pipeline = WeatherInformationPipeline(api_key=api_key, model=model)
+            _pipelines[key] = pipeline
+    return pipeline
+
+
+def _reset_pipelines():
+    """
+    Drop every cached pipeline, used after fork so a gunicorn worker
+    never shares executor/client state with its parent.
+    """
+    global _pipelines_lock, _graphbit_ready
+    _pipelines.clear()
+    _pipelines_lock = threading.Lock()
+    _graphbit_ready = False
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_pipelines)
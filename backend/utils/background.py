@@ -0,0 +1,49 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from django.db import connection
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# threads for work that should not hold up the response (titles, compaction)
+BACKGROUND_WORKERS = int(os.getenv("BACKGROUND_WORKERS", "4"))
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=BACKGROUND_WORKERS, thread_name_prefix="background"
+                )
+    return _executor
+
+
+def _reset_executor():
+    global _executor, _executor_lock
+    _executor = None
+    _executor_lock = threading.Lock()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_executor)
+
+
+def _run(fn, args, kwargs):
+    try:
+        return fn(*args, **kwargs)
+    finally:
+        # runs outside any request cycle, don't leak the thread's connection
+        connection.close()
+
+
+def submit(fn, *args, **kwargs):
+    """
+    Run fn on the shared background pool and return its future.
+    """
+    return _get_executor().submit(_run, fn, args, kwargs)
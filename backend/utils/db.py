@@ -0,0 +1,100 @@
+from django.db import connections
+from utils.metrics import registry
+
+CONNECTIONS_OPENED = registry.counter(
+    "db_connections_opened_total",
+    "New database connections, fewer than requests when connections are reused",
+    ["alias"],
+)
+
+# psycopg_pool get_stats() keys exported for pooled databases
+POOL_GAUGES = {
+    "pool_size": "open",
+    "pool_available": "idle",
+    "requests_waiting": "waiting",
+}
+POOL_COUNTERS = {
+    "requests_num": "db_pool_requests_total",
+    "requests_wait_ms": "db_pool_wait_milliseconds_total",
+    "connections_num": "db_pool_connects_total",
+    "connections_lost": "db_pool_connections_lost_total",
+}
+
+
+class QueryCounter:
+    """
+    Count the SQL statements executed on a connection inside the block.
+
+        with QueryCounter() as queries:
+            ...
+        queries.count
+    """
+
+    def __init__(self, using="default"):
+        self.using = using
+        self.count = 0
+        self._wrapper = None
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+    def __enter__(self):
+        self._wrapper = connections[self.using].execute_wrapper(self)
+        self._wrapper.__enter__()
+        return self
+
+    def __exit__(self, *exc_info):
+        return self._wrapper.__exit__(*exc_info)
+
+
+def count_new_connection(sender, connection, **kwargs):
+    """
+    connection_created receiver, connected in ChatsConfig.ready
+    """
+    CONNECTIONS_OPENED.inc(alias=connection.alias)
+
+
+def _pool_stats():
+    """
+    (alias, stats) of every database using django's connection pool
+    """
+    found = []
+    for alias in connections:
+        if not connections.settings[alias].get("OPTIONS", {}).get("pool"):
+            continue
+        pool = getattr(connections[alias], "pool", None)
+        if pool is not None:
+            found.append((alias, pool.get_stats()))
+    return found
+
+
+def _collect_pools():
+    stats = _pool_stats()
+    if not stats:
+        return []
+    metrics = [
+        (
+            "db_pool_connections",
+            "gauge",
+            "Pooled database connections by state",
+            [
+                ({"alias": alias, "state": state}, values.get(key, 0))
+                for alias, values in stats
+                for key, state in POOL_GAUGES.items()
+            ],
+        )
+    ]
+    for key, name in POOL_COUNTERS.items():
+        metrics.append(
+            (
+                name,
+                "counter",
+                f"psycopg_pool {key}",
+                [({"alias": alias}, values.get(key, 0)) for alias, values in stats],
+            )
+        )
+    return metrics
+
+
+registry.register_collector(_collect_pools)
@@ -1,37 +1,37 @@
 import os
+import re
+import copy
 import hmac
 import json
 import time
 import logging
 import hashlib
-import requests
-from functools import wraps
+from functools import wraps, lru_cache
 from dotenv import load_dotenv
 from urllib.parse import parse_qsl
 from users.models import User
 from django.http import JsonResponse
-from graphbit import tool
+from utils.cache import TTLCache
+from utils.metrics import timer
 
 load_dotenv()
 
 BOT_TOKEN = os.getenv("BOT_TOKEN")
 VALID_AUTH_DATE_WINDOW_SECONDS = int(os.getenv("VALID_AUTH_DATE_WINDOW_SECONDS"))
-WEATHER_API = os.getenv("WEATHER_API")
+# verified init data cache, 0 disables it
+TG_AUTH_CACHE_SIZE = int(os.getenv("TG_AUTH_CACHE_SIZE", "1024"))
+TG_AUTH_CACHE_TTL_SECONDS = int(os.getenv("TG_AUTH_CACHE_TTL_SECONDS", "300"))
+INIT_DATA_HASH = re.compile(r"(?:^|&)hash=([0-9a-fA-F]+)(?:&|$)")
 
 
-@tool(_description="Pull current weather information for given city")
-def get_current_weather(location: str) -> dict:
-    """Get weather information for a specific location."""
-    url = f"http://api.weatherapi.com/v1/current.json?key={WEATHER_API}&q={location}"
-    try:
-        response = requests.get(url)
-        if "error" in response.json():
-            logging.error("Weather api error response")
-            return "Failed to fetching weather data!"
-        return response.text
-    except Exception as e:
-        logging.error(f"Failed to call weather api. error: {str(e)}")
-        return "Failed to fetching weather data!"
+def __getattr__(name):
+    # the weather tool lives with the llm stack in utils.ai, which imports
+    # graphbit, so it is only loaded when asked for
+    if name == "get_current_weather":
+        from utils.ai import get_current_weather
+
+        return get_current_weather
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 def extract_data_from_model_response(data):
@@ -40,105 +40,249 @@ def extract_data_from_model_response(data):
 
     return
         model_reply
-        new_context
+        new_context (None unless the model still sends a context_summary)
     """
     try:
         response_content = json.loads(data)
         model_reply = response_content["reply"]
-        new_context = response_content["context_summary"]
+        new_context = response_content.get("context_summary")
         return (model_reply, new_context)
     except Exception as e:
         logging.error(f"Failed to extract data from model response. error {str(e)}")
         raise
 
 
+@lru_cache(maxsize=1)
+def webapp_secret_key(bot_token):
+    """
+    HMAC secret derived from the bot token, computed once per process
+    """
+    return hmac.new(
+        key=b"WebAppData", msg=bot_token.encode("utf-8"), digestmod=hashlib.sha256
+    ).digest()
+
+
+class VerifiedSessionCache:
+    """
+    Bounded LRU of already verified X-Telegram-Init-Data strings,
+    keyed by their hash. An entry is served until auth_date leaves
+    VALID_AUTH_DATE_WINDOW_SECONDS or its TTL runs out.
+    """
+
+    def __init__(self, maxsize, ttl):
+        self.ttl = ttl
+        self._entries = TTLCache(maxsize, ttl)
+
+    def get(self, tg_init_data):
+        received_hash = self._hash_of(tg_init_data)
+        if not received_hash:
+            return None
+
+        entry = self._entries.get(received_hash)
+        if entry is None:
+            return None
+
+        raw, user, auth_date = entry
+        if time.time() - auth_date > VALID_AUTH_DATE_WINDOW_SECONDS:
+            self._entries.delete(received_hash)
+            return None
+
+        # the hash alone is not enough, the whole string must match;
+        # compared as bytes, compare_digest rejects non-ascii str
+        if not hmac.compare_digest(raw, tg_init_data.encode("utf-8")):
+            return None
+        return copy.copy(user)
+
+    def set(self, tg_init_data, user, auth_date):
+        received_hash = self._hash_of(tg_init_data)
+        if not received_hash:
+            return
+
+        ttl = min(auth_date + VALID_AUTH_DATE_WINDOW_SECONDS - time.time(), self.ttl)
+        if ttl <= 0:
+            return
+        entry = (tg_init_data.encode("utf-8"), copy.copy(user), auth_date)
+        self._entries.set(received_hash, entry, ttl)
+
+    def clear(self):
+        self._entries.clear()
+
+    @staticmethod
+    def _hash_of(tg_init_data):
+        if not tg_init_data:
+            return None
+        match = INIT_DATA_HASH.search(tg_init_data)
+        return match.group(1) if match else None
+
+
+verified_sessions = VerifiedSessionCache(TG_AUTH_CACHE_SIZE, TG_AUTH_CACHE_TTL_SECONDS)
+
+
+def verify_tg_init_data(tg_init_data):
+    """
+    validate X-Telegram-Init-Data string
+
+    return
+        init_data (without hash), None on success
+        None, JsonResponse on failure
+    """
+
+    # if no datastring found
+    if not tg_init_data:
+        logging.error("X-Telegram-Init-Data is not present in headers")
+        return None, JsonResponse({"error": "Data String mising!"}, status=401)
+
+    # parse tg_init_data
+    try:
+        init_data = dict(parse_qsl(tg_init_data, strict_parsing=True))
+    except Exception as e:
+        logging.error(f"Failed to patse X-Telegram-Init-Data. error: {str(e)}")
+        return None, JsonResponse({"error": "Invalid data_string!"}, status=401)
+
+    # extract hash
+    received_hash = init_data.pop("hash", None)
+    if not received_hash:
+        logging.error("X-Telegram-Init-Data don't have a hash")
+        return None, JsonResponse({"error": "Invalid data_string!"}, status=401)
+
+    # Check auth_date (timestamp)
+    auth_date_str = init_data.get("auth_date")
+    if not auth_date_str:
+        logging.error("X-Telegram-Init-Data don't have a auth_date")
+        return None, JsonResponse({"error": "Invalid data_string!"}, status=401)
+
+    try:
+        auth_date = int(auth_date_str)
+        current_unix_time = int(time.time())
+
+        # Check if the data is too old
+        if current_unix_time - auth_date > VALID_AUTH_DATE_WINDOW_SECONDS:
+            logging.warning("Date expired X-Telegram-Init-Data")
+            return None, JsonResponse({"error": "Invalid data_string!"}, status=401)
+    except Exception as e:
+        logging.error(f"Failed to validate X-Telegram-Init-Data date. error: {str(e)}")
+        return None, JsonResponse({"error": "Invalid data_string!"}, status=401)
+
+    # Construct data-check-string
+    # Sort fields alphabetically and format as 'key=<value>'
+    # https://core.telegram.org/bots/webapps#validating-data-received-via-the-mini-app
+    data_check_string = "\n".join(
+        f"{k}={v}" for k, v in sorted(init_data.items(), key=lambda item: item[0])
+    )
+
+    # Calculate signature hash
+    computed_hash = hmac.new(
+        key=webapp_secret_key(BOT_TOKEN),
+        msg=data_check_string.encode("utf-8"),
+        digestmod=hashlib.sha256,
+    ).hexdigest()
+
+    # Compare received hash with calculated hash
+    if computed_hash != received_hash:
+        logging.error(
+            "Data string validation failed. hash mismatch computed_hash != received_hash"
+        )
+        return None, JsonResponse({"error": "Validation failed!"}, status=401)
+
+    return init_data, None
+
+
+def load_current_user(tg_init_data):
+    """
+    verify X-Telegram-Init-Data and load (or create) its user
+
+    return
+        current_user, None on success
+        None, JsonResponse on failure
+    """
+
+    # already verified recently, skip hmac and db lookup
+    current_user = verified_sessions.get(tg_init_data)
+    if current_user is not None:
+        return current_user, None
+
+    init_data, error = verify_tg_init_data(tg_init_data)
+    if error:
+        return None, error
+
+    # get user info from parsed data string
+    telegram_user_data = json.loads(init_data.get("user"))
+    telegram_user_id = telegram_user_data.get("id")
+    telegram_user_name = telegram_user_data.get("username")
+
+    # get_or_create to retrieve or create the user
+    try:
+        current_user, created = User.objects.get_or_create(
+            telegram_id=telegram_user_id, defaults={"username": telegram_user_name}
+        )
+        # username might change, update it here
+        if not created and current_user.username != telegram_user_name:
+            current_user.username = telegram_user_name
+            current_user.save()
+    except Exception as e:
+        logging.warning(f"Failed to create or load user. error: {str(e)}")
+        return None, JsonResponse({"error": "Something went wrong!"}, status=500)
+
+    verified_sessions.set(tg_init_data, current_user, int(init_data["auth_date"]))
+    return current_user, None
+
+
+async def aload_current_user(tg_init_data):
+    """
+    async version of load_current_user
+    """
+    current_user = verified_sessions.get(tg_init_data)
+    if current_user is not None:
+        return current_user, None
+
+    init_data, error = verify_tg_init_data(tg_init_data)
+    if error:
+        return None, error
+
+    telegram_user_data = json.loads(init_data.get("user"))
+    telegram_user_id = telegram_user_data.get("id")
+    telegram_user_name = telegram_user_data.get("username")
+
+    try:
+        current_user, created = await User.objects.aget_or_create(
+            telegram_id=telegram_user_id, defaults={"username": telegram_user_name}
+        )
+        if not created and current_user.username != telegram_user_name:
+            current_user.username = telegram_user_name
+            await current_user.asave()
+    except Exception as e:
+        logging.warning(f"Failed to create or load user. error: {str(e)}")
+        return None, JsonResponse({"error": "Something went wrong!"}, status=500)
+
+    verified_sessions.set(tg_init_data, current_user, int(init_data["auth_date"]))
+    return current_user, None
+
+
 def check_tg_data_string(f):
     @wraps(f)
     def inner(request, *args, **kwargs):
         tg_init_data = request.headers.get("X-Telegram-Init-Data")
+        with timer("auth"):
+            current_user, error = load_current_user(tg_init_data)
+        if error:
+            return error
+        return f(request, current_user, *args, **kwargs)
 
-        # if no datastring found
-        if not tg_init_data:
-            logging.error("X-Telegram-Init-Data is not present in headers")
-            return JsonResponse({"error": "Data String mising!"}, status=401)
-
-        # parse tg_init_data
-        try:
-            init_data = dict(parse_qsl(tg_init_data, strict_parsing=True))
-        except Exception as e:
-            logging.error(f"Failed to patse X-Telegram-Init-Data. error: {str(e)}")
-            return JsonResponse({"error": "Invalid data_string!"}, status=401)
-
-        # extract hash
-        received_hash = init_data.pop("hash", None)
-        if not received_hash:
-            logging.error("X-Telegram-Init-Data don't have a hash")
-            return JsonResponse({"error": "Invalid data_string!"}, status=401)
-
-        # Check auth_date (timestamp)
-        auth_date_str = init_data.get("auth_date")
-        if not auth_date_str:
-            logging.error("X-Telegram-Init-Data don't have a auth_date")
-            return JsonResponse({"error": "Invalid data_string!"}, status=401)
-
-        try:
-            auth_date = int(auth_date_str)
-            current_unix_time = int(time.time())
-
-            # Check if the data is too old
-            if current_unix_time - auth_date > VALID_AUTH_DATE_WINDOW_SECONDS:
-                logging.warning("Date expired X-Telegram-Init-Data")
-                return JsonResponse({"error": "Invalid data_string!"}, status=401)
-        except Exception as e:
-            logging.error(
-                f"Failed to validate X-Telegram-Init-Data date. error: {str(e)}"
-            )
-            return JsonResponse({"error": "Invalid data_string!"}, status=401)
-
-        # Construct data-check-string
-        # Sort fields alphabetically and format as 'key=<value>'
-        # https://core.telegram.org/bots/webapps#validating-data-received-via-the-mini-app
-        data_check_string = "\n".join(
-            f"{k}={v}" for k, v in sorted(init_data.items(), key=lambda item: item[0])
-        )
+    return inner
 
-        # Calculate secret key
-        secret_key = hmac.new(
-            key=b"WebAppData", msg=BOT_TOKEN.encode("utf-8"), digestmod=hashlib.sha256
-        ).digest()
-
-        # Calculate signature hash
-        computed_hash = hmac.new(
-            key=secret_key,
-            msg=data_check_string.encode("utf-8"),
-            digestmod=hashlib.sha256,
-        ).hexdigest()
-
-        # Compare received hash with calculated hash
-        if computed_hash != received_hash:
-            logging.error(
-                "Data string validation failed. hash mismatch computed_hash != received_hash"
-            )
-            return JsonResponse({"error": "Validation failed!"}, status=401)
-
-        # get user info from parsed data string
-        telegram_user_data = json.loads(init_data.get("user"))
-        telegram_user_id = telegram_user_data.get("id")
-        telegram_user_name = telegram_user_data.get("username")
-
-        # get_or_create to retrieve or create the user
-        try:
-            current_user, created = User.objects.get_or_create(
-                telegram_id=telegram_user_id, defaults={"username": telegram_user_name}
-            )
-            # username might change, update it here
-            if not created and current_user.username != telegram_user_name:
-                current_user.username = telegram_user_name
-                current_user.save()
-        except Exception as e:
-            logging.warning(f"Failed to create or load user. error: {str(e)}")
-            return JsonResponse({"error": "Something went wrong!"}, status=500)
 
-        return f(request, current_user, *args, **kwargs)
+def acheck_tg_data_string(f):
+    """
+    async version of check_tg_data_string for async views
+    """
+
+    @wraps(f)
+    async def inner(request, *args, **kwargs):
+        tg_init_data = request.headers.get("X-Telegram-Init-Data")
+        with timer("auth"):
+            current_user, error = await aload_current_user(tg_init_data)
+        if error:
+            return error
+        return await f(request, current_user, *args, **kwargs)
 
     return inner
@@ -0,0 +1,331 @@
+import os
+import time
+import random
+import asyncio
+import logging
+import threading
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dotenv import load_dotenv
+from utils.metrics import registry
+
+load_dotenv()
+
+# per attempt timeout handed to graphbit
+LLM_TIMEOUT_SECONDS = int(os.getenv("LLM_TIMEOUT_SECONDS", "30"))
+# budget for one call across retries and fallback models, a further attempt
+# only starts if it can time out within it; keep it under
+# CHAT_IN_FLIGHT_TTL_SECONDS, 0 disables it
+LLM_DEADLINE_SECONDS = float(os.getenv("LLM_DEADLINE_SECONDS", "100"))
+# retries per model after the first attempt, exponential backoff with jitter
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "2"))
+LLM_RETRY_BACKOFF_SECONDS = float(os.getenv("LLM_RETRY_BACKOFF_SECONDS", "0.25"))
+LLM_RETRY_BACKOFF_MAX_SECONDS = float(os.getenv("LLM_RETRY_BACKOFF_MAX_SECONDS", "4"))
+# send a second identical chat request once the first is slower than the
+# LLM_HEDGE_PERCENTILE of recent calls (never earlier than the minimum)
+LLM_HEDGE = os.getenv("LLM_HEDGE", "False").lower() == "true"
+LLM_HEDGE_PERCENTILE = float(os.getenv("LLM_HEDGE_PERCENTILE", "95"))
+LLM_HEDGE_MIN_SECONDS = float(os.getenv("LLM_HEDGE_MIN_SECONDS", "2"))
+# consecutive failures that open a model's breaker, and for how long
+LLM_BREAKER_FAILURES = int(os.getenv("LLM_BREAKER_FAILURES", "5"))
+LLM_BREAKER_RESET_SECONDS = float(os.getenv("LLM_BREAKER_RESET_SECONDS", "30"))
+# comma separated, tried in order once the primary model gives up
+LLM_FALLBACK_MODELS = [
+    model.strip()
+    for model in os.getenv("LLM_FALLBACK_MODELS", "").split(",")
+    if model.strip()
+]
+
+# latencies seen before the hedge delay follows the percentile
+HEDGE_MIN_SAMPLES = 20
+
+LLM_CALLS = registry.counter(
+    "llm_calls_total", "LLM call attempts by model and outcome", ["model", "outcome"]
+)
+
+_hedge_pool = None
+_hedge_pool_lock = threading.Lock()
+
+
+def _get_hedge_pool():
+    global _hedge_pool
+    if _hedge_pool is None:
+        with _hedge_pool_lock:
+            if _hedge_pool is None:
+                _hedge_pool = ThreadPoolExecutor(
+                    max_workers=16, thread_name_prefix="llm-hedge"
+                )
+    return _hedge_pool
+
+
+def _reset_hedge_pool():
+    global _hedge_pool, _hedge_pool_lock
+    _hedge_pool = None
+    _hedge_pool_lock = threading.Lock()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_hedge_pool)
+
+
+class LlmUnavailable(Exception):
+    """
+    every model failed or has its breaker open
+    """
+
+
+class CircuitBreaker:
+    """
+    Stops calling a model after `failures` consecutive errors. Once
+    `reset_seconds` passed a single probe call is let through, its
+    outcome closes or re-opens the breaker.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(
+        self,
+        failures=LLM_BREAKER_FAILURES,
+        reset_seconds=LLM_BREAKER_RESET_SECONDS,
+        clock=time.monotonic,
+    ):
+        self.failures = failures
+        self.reset_seconds = reset_seconds
+        self.clock = clock
+        self.state = self.CLOSED
+        self._errors = 0
+        self._opened_at = 0.0
+        self._lock = threading.Lock()
+
+    def allow(self):
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN:
+                if self.clock() - self._opened_at < self.reset_seconds:
+                    return False
+                self.state = self.HALF_OPEN
+                return True
+            # half open, the probe is still running
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self._errors = 0
+
+    def record_failure(self):
+        with self._lock:
+            self._errors += 1
+            if self.state == self.HALF_OPEN or self._errors >= self.failures:
+                self.state = self.OPEN
+                self._opened_at = self.clock()
+
+
+class LatencyWindow:
+    """
+    latencies of the last `size` successful calls
+    """
+
+    def __init__(self, size=200):
+        self._samples = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def add(self, seconds):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, pct):
+        with self._lock:
+            ordered = sorted(self._samples)
+        if len(ordered) < HEDGE_MIN_SAMPLES:
+            return None
+        return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+class ResilientCaller:
+    """
+    Runs one LLM call, fn(model), against an ordered list of models.
+
+    - each model is tried up to max_retries + 1 times with exponential
+      backoff and full jitter between attempts
+    - a model whose breaker is open is skipped
+    - after the first attempt, an attempt (retry or fallback) only starts
+      when its backoff plus attempt_timeout still fits in the deadline
+    - with hedging, a second identical request starts when the first is
+      slower than the recent percentile; the first success wins and the
+      other result is dropped
+    - LlmUnavailable is raised once every model gave up
+
+    fn must be safe to run twice at the same time when hedging.
+    """
+
+    def __init__(
+        self,
+        models,
+        max_retries=LLM_MAX_RETRIES,
+        backoff=LLM_RETRY_BACKOFF_SECONDS,
+        backoff_max=LLM_RETRY_BACKOFF_MAX_SECONDS,
+        hedge=LLM_HEDGE,
+        hedge_percentile=LLM_HEDGE_PERCENTILE,
+        hedge_min_seconds=LLM_HEDGE_MIN_SECONDS,
+        breaker_failures=LLM_BREAKER_FAILURES,
+        breaker_reset_seconds=LLM_BREAKER_RESET_SECONDS,
+        attempt_timeout=LLM_TIMEOUT_SECONDS,
+        deadline=LLM_DEADLINE_SECONDS,
+    ):
+        self.models = list(dict.fromkeys(models))
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.backoff_max = backoff_max
+        self.hedge = hedge
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_seconds = hedge_min_seconds
+        self.attempt_timeout = attempt_timeout
+        self.deadline = deadline
+        self.breakers = {
+            model: CircuitBreaker(breaker_failures, breaker_reset_seconds)
+            for model in self.models
+        }
+        self.latencies = {model: LatencyWindow() for model in self.models}
+
+    def retry_delay(self, attempt):
+        return random.uniform(0, min(self.backoff_max, self.backoff * 2**attempt))
+
+    def hedge_delay(self, model):
+        observed = self.latencies[model].percentile(self.hedge_percentile)
+        return max(self.hedge_min_seconds, observed or 0)
+
+    def call(self, fn, hedge=None):
+        last_error = None
+        started = time.monotonic()
+        for model in self.models:
+            for attempt in range(self.max_retries + 1):
+                if not self._allowed(model):
+                    break
+                delay = self.retry_delay(attempt - 1) if attempt else 0
+                if last_error and not self._in_time(started, delay):
+                    raise self._unavailable(last_error)
+                if delay:
+                    time.sleep(delay)
+
+                start = time.perf_counter()
+                try:
+                    if self._hedging(hedge):
+                        result = self._hedged(fn, model)
+                    else:
+                        result = fn(model)
+                except Exception as e:
+                    last_error = e
+                    self._failed(model, attempt, e)
+                    continue
+                self._succeeded(model, time.perf_counter() - start)
+                return result
+        raise self._unavailable(last_error)
+
+    async def acall(self, fn, hedge=None):
+        """
+        async version of call, fn(model) returns an awaitable
+        """
+        last_error = None
+        started = time.monotonic()
+        for model in self.models:
+            for attempt in range(self.max_retries + 1):
+                if not self._allowed(model):
+                    break
+                delay = self.retry_delay(attempt - 1) if attempt else 0
+                if last_error and not self._in_time(started, delay):
+                    raise self._unavailable(last_error)
+                if delay:
+                    await asyncio.sleep(delay)
+
+                start = time.perf_counter()
+                try:
+                    if self._hedging(hedge):
+                        result = await self._ahedged(fn, model)
+                    else:
+                        result = await fn(model)
+                except Exception as e:
+                    last_error = e
+                    self._failed(model, attempt, e)
+                    continue
+                self._succeeded(model, time.perf_counter() - start)
+                return result
+        raise self._unavailable(last_error)
+
+    def _in_time(self, started, delay):
+        if self.deadline <= 0:
+            return True
+        elapsed = time.monotonic() - started
+        return elapsed + delay + self.attempt_timeout <= self.deadline
+
+    def _hedging(self, hedge):
+        return self.hedge if hedge is None else hedge
+
+    def _allowed(self, model):
+        if self.breakers[model].allow():
+            return True
+        LLM_CALLS.inc(model=model, outcome="breaker_open")
+        return False
+
+    def _succeeded(self, model, elapsed):
+        self.breakers[model].record_success()
+        self.latencies[model].add(elapsed)
+        LLM_CALLS.inc(model=model, outcome="ok")
+
+    def _failed(self, model, attempt, error):
+        self.breakers[model].record_failure()
+        LLM_CALLS.inc(model=model, outcome="error")
+        logging.warning(
+            f"LLM call to {model} failed (attempt {attempt + 1}). error: {str(error)}"
+        )
+
+    def _unavailable(self, last_error):
+        if last_error is None:
+            return LlmUnavailable("every model has its circuit breaker open")
+        error = LlmUnavailable(str(last_error))
+        error.__cause__ = last_error
+        return error
+
+    def _hedged(self, fn, model):
+        pool = _get_hedge_pool()
+        first = pool.submit(fn, model)
+        done, _ = wait([first], timeout=self.hedge_delay(model))
+        if done:
+            return first.result()
+
+        LLM_CALLS.inc(model=model, outcome="hedged")
+        pending = {first, pool.submit(fn, model)}
+        error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    return future.result()
+                error = future.exception()
+        raise error
+
+    async def _ahedged(self, fn, model):
+        first = asyncio.ensure_future(fn(model))
+        done, _ = await asyncio.wait([first], timeout=self.hedge_delay(model))
+        if done:
+            return first.result()
+
+        LLM_CALLS.inc(model=model, outcome="hedged")
+        pending = {first, asyncio.ensure_future(fn(model))}
+        error = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+                    error = task.exception()
+        finally:
+            for task in pending:
+                task.cancel()
+        raise error
@@ -0,0 +1,295 @@
+import os
+import hmac
+import time
+import threading
+import functools
+import contextlib
+from contextvars import ContextVar
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.http import HttpResponse, JsonResponse
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# bearer token required by the metrics endpoint, unset hides it unless DEBUG
+METRICS_TOKEN = os.getenv("METRICS_TOKEN")
+
+# seconds, from a cached auth check up to a slow LLM call
+DEFAULT_BUCKETS = (
+    0.001,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1,
+    2.5,
+    5,
+    10,
+    30,
+    60,
+)
+
+
+def _label_key(labelnames, labels):
+    return tuple(str(labels.get(name, "")) for name in labelnames)
+
+
+def _format_labels(labelnames, key, extra=None):
+    pairs = list(zip(labelnames, key))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    escaped = (
+        (name, value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for name, value in pairs
+    )
+    return "{" + ",".join(f'{name}="{value}"' for name, value in escaped) + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """
+    monotonically increasing value per label set
+    """
+
+    kind = "counter"
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = _label_key(self.labelnames, labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(_label_key(self.labelnames, labels), 0)
+
+    def samples(self):
+        with self._lock:
+            values = dict(self._values)
+        for key, value in sorted(values.items()):
+            yield self.name + _format_labels(self.labelnames, key), value
+
+
+class Histogram:
+    """
+    cumulative bucket counts, sum and count per label set
+    """
+
+    kind = "histogram"
+
+    def __init__(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = _label_key(self.labelnames, labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][i] += 1
+                    break
+            series[1] += value
+            series[2] += 1
+
+    def count(self, **labels):
+        series = self._series.get(_label_key(self.labelnames, labels))
+        return series[2] if series else 0
+
+    def samples(self):
+        with self._lock:
+            snapshot = {
+                key: (list(counts), total, count)
+                for key, (counts, total, count) in self._series.items()
+            }
+        for key, (counts, total, count) in sorted(snapshot.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                labels = _format_labels(
+                    self.labelnames, key, ("le", _format_value(float(bound)))
+                )
+                yield f"{self.name}_bucket{labels}", cumulative
+            labels = _format_labels(self.labelnames, key)
+            yield f"{self.name}_sum{labels}", total
+            yield f"{self.name}_count{labels}", count
+
+
+class Registry:
+    """
+    Every metric of this process. Collectors are callables returning
+    (name, kind, help, [(labels dict, value)]) tuples for values that
+    live elsewhere, e.g. cache stats.
+    """
+
+    def __init__(self):
+        self._metrics = {}
+        self._collectors = []
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            return self._metrics.setdefault(metric.name, metric)
+
+    def counter(self, name, help, labelnames=()):
+        return self.register(Counter(name, help, labelnames))
+
+    def histogram(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self.register(Histogram(name, help, labelnames, buckets))
+
+    def register_collector(self, collector):
+        with self._lock:
+            self._collectors.append(collector)
+
+    def render(self):
+        """
+        Prometheus text exposition format
+        """
+        lines = []
+        for metric in list(self._metrics.values()):
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(
+                f"{name} {_format_value(value)}" for name, value in metric.samples()
+            )
+
+        for collector in list(self._collectors):
+            for name, kind, help, samples in collector():
+                lines.append(f"# HELP {name} {help}")
+                lines.append(f"# TYPE {name} {kind}")
+                for labels, value in samples:
+                    key = tuple(str(label) for label in labels.values())
+                    labels = _format_labels(tuple(labels), key)
+                    lines.append(f"{name}{labels} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+STAGE_SECONDS = registry.histogram(
+    "chat_stage_duration_seconds",
+    "Time spent in each stage of a request",
+    ["stage"],
+)
+REQUEST_SECONDS = registry.histogram(
+    "http_request_duration_seconds",
+    "Time to produce a response, streaming bodies excluded",
+    ["method", "route", "status"],
+)
+
+# stage timings of the request being handled, for the Server-Timing header
+_request_timings = ContextVar("request_timings", default=None)
+
+
+@contextlib.contextmanager
+def timer(stage):
+    """
+    time a block as `stage`:
+
+        with timer("db_write"):
+            ...
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        STAGE_SECONDS.observe(elapsed, stage=stage)
+        timings = _request_timings.get()
+        if timings is not None:
+            timings.append((stage, elapsed))
+
+
+def timed(stage):
+    """
+    decorator version of timer, works for sync and async functions
+    """
+
+    def decorator(fn):
+        if iscoroutinefunction(fn):
+
+            @functools.wraps(fn)
+            async def async_inner(*args, **kwargs):
+                with timer(stage):
+                    return await fn(*args, **kwargs)
+
+            return async_inner
+
+        @functools.wraps(fn)
+        def inner(*args, **kwargs):
+            with timer(stage):
+                return fn(*args, **kwargs)
+
+        return inner
+
+    return decorator
+
+
+def start_request():
+    """
+    collect stage timings for the current request, returns a reset token
+    """
+    return _request_timings.set([])
+
+
+def finish_request(token):
+    """
+    stop collecting and return the (stage, seconds) pairs recorded
+    """
+    timings = _request_timings.get() or []
+    _request_timings.reset(token)
+    return timings
+
+
+def server_timing(timings, total=None):
+    """
+    Server-Timing header value, repeated stages are summed
+    """
+    merged = {}
+    for stage, seconds in timings:
+        merged[stage] = merged.get(stage, 0.0) + seconds
+    if total is not None:
+        merged["total"] = total
+    return ", ".join(
+        f"{stage};dur={seconds * 1000:.2f}" for stage, seconds in merged.items()
+    )
+
+
+def metrics_view(request):
+    """
+    GET api-v2/metrics/, per process metrics in Prometheus text format.
+    Needs the METRICS_TOKEN bearer token, without one configured it is
+    only served with DEBUG on.
+    """
+    if not METRICS_TOKEN and not settings.DEBUG:
+        return JsonResponse({"error": "Not found"}, status=404)
+    if METRICS_TOKEN:
+        supplied = request.headers.get("Authorization", "")
+        if not hmac.compare_digest(supplied, f"Bearer {METRICS_TOKEN}"):
+            return JsonResponse({"error": "Unauthorized"}, status=401)
+
+    return HttpResponse(
+        registry.render(), content_type="text/plain; version=0.0.4; charset=utf-8"
+    )
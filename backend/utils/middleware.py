@@ -0,0 +1,51 @@
+import os
+import time
+from asgiref.sync import iscoroutinefunction
+from django.utils.decorators import sync_and_async_middleware
+from dotenv import load_dotenv
+from utils.metrics import REQUEST_SECONDS, start_request, finish_request, server_timing
+
+load_dotenv()
+
+# add a Server-Timing header with the per stage timings of every response
+SERVER_TIMING = os.getenv("SERVER_TIMING", "True").lower() == "true"
+
+
+def _finish(request, response, token, start):
+    timings = finish_request(token)
+    elapsed = time.perf_counter() - start
+
+    match = getattr(request, "resolver_match", None)
+    route = match.route if match else "unmatched"
+    REQUEST_SECONDS.observe(
+        elapsed, method=request.method, route=route, status=response.status_code
+    )
+
+    if SERVER_TIMING:
+        response["Server-Timing"] = server_timing(timings, elapsed)
+    return response
+
+
+@sync_and_async_middleware
+def server_timing_middleware(get_response):
+    """
+    Collect stage timings (utils.metrics.timer) for each request, record
+    the request latency and expose the breakdown as Server-Timing.
+    """
+    if iscoroutinefunction(get_response):
+
+        async def middleware(request):
+            token = start_request()
+            start = time.perf_counter()
+            response = await get_response(request)
+            return _finish(request, response, token, start)
+
+    else:
+
+        def middleware(request):
+            token = start_request()
+            start = time.perf_counter()
+            response = get_response(request)
+            return _finish(request, response, token, start)
+
+    return middleware
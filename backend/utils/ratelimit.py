@@ -0,0 +1,302 @@
+import os
+import json
+import math
+import time
+import threading
+import contextlib
+from functools import wraps
+from asgiref.sync import sync_to_async
+from django.core.cache.backends.locmem import LocMemCache
+from django.http import JsonResponse
+from dotenv import load_dotenv
+from utils.metrics import registry
+
+load_dotenv()
+
+# token bucket per telegram user for the chatting endpoints, 0 disables it
+CHAT_RATE_PER_MINUTE = float(os.getenv("CHAT_RATE_PER_MINUTE", "20"))
+# messages a user may send back to back before the rate applies
+CHAT_RATE_BURST = int(os.getenv("CHAT_RATE_BURST", "5"))
+# replies one user may wait on at once, 0 disables the cap
+CHAT_MAX_IN_FLIGHT = int(os.getenv("CHAT_MAX_IN_FLIGHT", "2"))
+# slots of a request that died without releasing them expire after this
+CHAT_IN_FLIGHT_TTL_SECONDS = int(os.getenv("CHAT_IN_FLIGHT_TTL_SECONDS", "120"))
+# django cache alias shared by all workers, unset keeps the limits per process
+CHAT_RATE_LIMIT_ALIAS = os.getenv("CHAT_RATE_LIMIT_ALIAS")
+
+RATE_LIMITED = registry.counter(
+    "chat_rate_limited_total", "Chatting requests rejected with 429", ["reason"]
+)
+
+
+class Slot:
+    """
+    in-flight slots held by one request, release() is idempotent
+    """
+
+    def __init__(self, limiter, keys):
+        self.limiter = limiter
+        self.keys = keys
+        self._released = False
+
+    def release(self):
+        if self._released:
+            return
+        self._released = True
+        self.limiter._release(self.keys)
+
+
+class RateLimiter:
+    """
+    Per-user limits for the chatting endpoints.
+
+    - a token bucket of `burst` tokens refilled at `rate_per_minute`,
+      stored as a single timestamp (GCRA) so one read and one write
+      decide a request
+    - at most `max_in_flight` replies per user and one per chat; a second
+      message to a chat whose reply is still running is rejected
+
+    State lives in a django cache when `cache_alias` is set, so every
+    worker shares the same limits, otherwise in a process local locmem.
+    """
+
+    def __init__(
+        self,
+        rate_per_minute=CHAT_RATE_PER_MINUTE,
+        burst=CHAT_RATE_BURST,
+        max_in_flight=CHAT_MAX_IN_FLIGHT,
+        in_flight_ttl=CHAT_IN_FLIGHT_TTL_SECONDS,
+        cache_alias=CHAT_RATE_LIMIT_ALIAS,
+    ):
+        self.rate_per_minute = rate_per_minute
+        self.burst = max(burst, 1)
+        self.max_in_flight = max_in_flight
+        self.in_flight_ttl = in_flight_ttl
+        self.cache_alias = cache_alias
+        self._local = LocMemCache(
+            f"chat-rate-limit-{id(self)}", {"OPTIONS": {"MAX_ENTRIES": 100000}}
+        )
+        self._lock = threading.Lock()
+
+    def acquire(self, user_id, chat_id=None):
+        """
+        take an in-flight slot and a token for one message
+
+        return
+            Slot, None when the message may go through
+            None, JsonResponse 429 with Retry-After otherwise
+        """
+        slot, retry_after, reason = self._enter(user_id, chat_id)
+        if slot is None:
+            return None, rate_limited_response(reason, retry_after)
+
+        retry_after = self.take_token(user_id)
+        if retry_after:
+            slot.release()
+            return None, rate_limited_response("rate", retry_after)
+        return slot, None
+
+    def take_token(self, user_id):
+        """
+        consume one token, returns 0 or the seconds until one is available
+        """
+        if self.rate_per_minute <= 0:
+            return 0
+
+        interval = 60 / self.rate_per_minute
+        window = interval * self.burst
+        key = f"ratelimit:tat:{user_id}"
+        store = self._store()
+
+        with self._locked(store, key):
+            now = time.time()
+            # theoretical arrival time, the bucket is full once it is in the past
+            tat = max(store.get(key, now), now)
+            new_tat = tat + interval
+            if new_tat - now > window:
+                return new_tat - now - window
+            store.set(key, new_tat, timeout=math.ceil(window) + 1)
+        return 0
+
+    def clear(self):
+        self._local.clear()
+
+    def _enter(self, user_id, chat_id):
+        if self.max_in_flight <= 0:
+            return Slot(self, []), 0, None
+
+        store = self._store()
+        keys = []
+        if chat_id is not None:
+            chat_key = f"ratelimit:chat:{user_id}:{chat_id}"
+            if not store.add(chat_key, 1, timeout=self.in_flight_ttl):
+                return None, 1, "chat_busy"
+            keys.append(chat_key)
+
+        user_key = f"ratelimit:inflight:{user_id}"
+        _ = store.add(user_key, 0, timeout=self.in_flight_ttl)
+        try:
+            in_flight = store.incr(user_key)
+        except ValueError:
+            # expired between add and incr
+            store.set(user_key, 1, timeout=self.in_flight_ttl)
+            in_flight = 1
+        keys.append(user_key)
+
+        if in_flight > self.max_in_flight:
+            self._release(keys)
+            return None, 1, "in_flight"
+        return Slot(self, keys), 0, None
+
+    def _release(self, keys):
+        store = self._store()
+        for key in keys:
+            if key.startswith("ratelimit:chat:"):
+                store.delete(key)
+                continue
+            try:
+                if store.decr(key) < 0:
+                    store.set(key, 0, timeout=self.in_flight_ttl)
+            except ValueError:
+                # slot already expired
+                pass
+
+    def _store(self):
+        if not self.cache_alias:
+            return self._local
+        from django.core.cache import caches
+
+        return caches[self.cache_alias]
+
+    @contextlib.contextmanager
+    def _locked(self, store, key):
+        """
+        serialize the bucket update, across workers through cache.add
+        """
+        if store is self._local:
+            with self._lock:
+                yield
+            return
+
+        lock_key = f"{key}:lock"
+        deadline = time.monotonic() + 0.05
+        acquired = store.add(lock_key, 1, timeout=1)
+        # best effort, a request is never stalled on a lost lock
+        while not acquired and time.monotonic() < deadline:
+            time.sleep(0.002)
+            acquired = store.add(lock_key, 1, timeout=1)
+        try:
+            yield
+        finally:
+            if acquired:
+                store.delete(lock_key)
+
+
+def rate_limited_response(reason, retry_after):
+    """
+    429 for a rejected chatting request
+    """
+    RATE_LIMITED.inc(reason=reason)
+    errors = {
+        "rate": "Too many messages, please slow down.",
+        "in_flight": "Too many replies in progress, please wait.",
+        "chat_busy": "A reply for this chat is still in progress.",
+    }
+    response = JsonResponse({"error": errors[reason]}, status=429)
+    response["Retry-After"] = str(max(math.ceil(retry_after), 1))
+    return response
+
+
+chat_limiter = RateLimiter()
+
+
+def _chat_id(request):
+    data = getattr(request, "data", None)
+    if data is None:
+        try:
+            data = json.loads(request.body)
+        except ValueError:
+            return None
+    if not isinstance(data, dict):
+        return None
+    try:
+        return int(data.get("chat_id"))
+    except (TypeError, ValueError):
+        return None
+
+
+def _release_when_sent(response, slot):
+    """
+    release after the view, or once a streaming body is fully sent
+    """
+    if not getattr(response, "streaming", False):
+        slot.release()
+        return response
+
+    content = response.streaming_content
+    if response.is_async:
+
+        async def released():
+            try:
+                async for chunk in content:
+                    yield chunk
+            finally:
+                await sync_to_async(slot.release, thread_sensitive=False)()
+
+    else:
+
+        def released():
+            try:
+                yield from content
+            finally:
+                slot.release()
+
+    response.streaming_content = released()
+    return response
+
+
+def chat_rate_limit(f):
+    """
+    apply chat_limiter to a view wrapped by check_tg_data_string
+    """
+
+    @wraps(f)
+    def inner(request, current_user, *args, **kwargs):
+        slot, error = chat_limiter.acquire(current_user.telegram_id, _chat_id(request))
+        if error:
+            return error
+        try:
+            response = f(request, current_user, *args, **kwargs)
+        except BaseException:
+            slot.release()
+            raise
+        return _release_when_sent(response, slot)
+
+    return inner
+
+
+def achat_rate_limit(f):
+    """
+    async version of chat_rate_limit, the limiter runs in a thread since a
+    shared cache is blocking I/O
+    """
+
+    @wraps(f)
+    async def inner(request, current_user, *args, **kwargs):
+        slot, error = await sync_to_async(chat_limiter.acquire, thread_sensitive=False)(
+            current_user.telegram_id, _chat_id(request)
+        )
+        if error:
+            return error
+        release = sync_to_async(slot.release, thread_sensitive=False)
+        try:
+            response = await f(request, current_user, *args, **kwargs)
+        except BaseException:
+            await release()
+            raise
+        if getattr(response, "streaming", False):
+            return _release_when_sent(response, slot)
+        await release()
+        return response
+
+    return inner
@@ -0,0 +1,133 @@
+import os
+import json
+import hashlib
+import threading
+from dotenv import load_dotenv
+from utils.cache import TTLCache
+from utils.metrics import registry
+
+load_dotenv()
+
+# exact-match cache of model outputs, off by default
+LLM_RESPONSE_CACHE = os.getenv("LLM_RESPONSE_CACHE", "False").lower() == "true"
+LLM_CACHE_SIZE = int(os.getenv("LLM_CACHE_SIZE", "1024"))
+LLM_CACHE_TTL_SECONDS = int(os.getenv("LLM_CACHE_TTL_SECONDS", "3600"))
+# answers built from a tool call (live weather) go stale quickly
+LLM_CACHE_TOOL_TTL_SECONDS = int(os.getenv("LLM_CACHE_TOOL_TTL_SECONDS", "300"))
+# larger outputs are not worth the memory
+LLM_CACHE_MAX_ENTRY_BYTES = int(os.getenv("LLM_CACHE_MAX_ENTRY_BYTES", "16384"))
+# django cache alias (locmem, file based, ...), unset keeps it in-process
+LLM_CACHE_ALIAS = os.getenv("LLM_CACHE_ALIAS")
+
+
+class ResponseCache:
+    """
+    Exact-match cache for pipeline outputs.
+
+    Keyed on a hash of (model, system prompt, context summary, normalized
+    user input), so "Hi" and " hi " with the default context share one
+    entry. Entries expire after a TTL; the in-process store evicts least
+    recently used entries, a django cache alias uses the backend's own
+    culling.
+    """
+
+    def __init__(
+        self,
+        enabled=LLM_RESPONSE_CACHE,
+        maxsize=LLM_CACHE_SIZE,
+        ttl=LLM_CACHE_TTL_SECONDS,
+        tool_ttl=LLM_CACHE_TOOL_TTL_SECONDS,
+        max_entry_bytes=LLM_CACHE_MAX_ENTRY_BYTES,
+        cache_alias=LLM_CACHE_ALIAS,
+    ):
+        self.enabled = enabled
+        self.ttl = ttl
+        self.tool_ttl = tool_ttl
+        self.max_entry_bytes = max_entry_bytes
+        self.cache_alias = cache_alias
+        self.local = TTLCache(maxsize, ttl)
+        self._lock = threading.Lock()
+        self._counters = {"hits": 0, "misses": 0, "stores": 0, "too_large": 0}
+
+    @staticmethod
+    def normalize(text):
+        return " ".join(str(text).casefold().split())
+
+    @classmethod
+    def make_key(cls, model, system_prompt, context_summary, query):
+        raw = json.dumps(
+            [model, system_prompt, context_summary, cls.normalize(query)],
+            ensure_ascii=False,
+        )
+        return "llm:" + hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        if not self.enabled:
+            return None
+
+        backend = self._backend()
+        value = backend.get(key) if backend is not None else self.local.get(key)
+        self._count("hits" if value is not None else "misses")
+        return value
+
+    def set(self, key, value, used_tools=False):
+        """
+        Store a successful output, tool based answers get the short TTL.
+        """
+        if not self.enabled or value is None:
+            return False
+
+        size = len(str(value).encode("utf-8"))
+        if size > self.max_entry_bytes:
+            self._count("too_large")
+            return False
+
+        ttl = self.tool_ttl if used_tools else self.ttl
+        backend = self._backend()
+        if backend is not None:
+            backend.set(key, value, ttl)
+        else:
+            self.local.set(key, value, ttl)
+        self._count("stores")
+        return True
+
+    def clear(self):
+        # a shared django cache may hold other data, only the local store is dropped
+        self.local.clear()
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counters)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+        return stats
+
+    def _backend(self):
+        if not self.cache_alias:
+            return None
+        from django.core.cache import caches
+
+        return caches[self.cache_alias]
+
+    def _count(self, name):
+        with self._lock:
+            self._counters[name] += 1
+
+
+response_cache = ResponseCache()
+
+
+def _collect_response_cache():
+    stats = response_cache.stats()
+    outcomes = ("hits", "misses", "stores", "too_large")
+    return [
+        (
+            "llm_response_cache_total",
+            "counter",
+            "LLM response cache lookups and stores by outcome",
+            [({"result": name}, stats[name]) for name in outcomes],
+        )
+    ]
+
+
+registry.register_collector(_collect_response_cache)
@@ -0,0 +1,103 @@
+import re
+import json
+
+# start of the reply string value in the model's JSON output
+REPLY_KEY = re.compile(r'"reply"\s*:\s*"')
+
+# JSON single character escapes
+ESCAPES = {
+    '"': '"',
+    "\\": "\\",
+    "/": "/",
+    "b": "\b",
+    "f": "\f",
+    "n": "\n",
+    "r": "\r",
+    "t": "\t",
+}
+
+
+def sse_event(event, data):
+    """
+    format one Server-Sent Event with a JSON payload
+    """
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+class ReplyStreamParser:
+    """
+    Incrementally decode the 'reply' value of the model's
+    {"reply": ..., "context_summary": ...} JSON while it is generated.
+
+    feed() returns the newly decoded reply text. Escape sequences split
+    across chunks are held back until complete. The full raw output is
+    kept in .text so the final JSON can still be parsed as a whole.
+    """
+
+    def __init__(self):
+        self.text = ""
+        self.reply = ""
+        self._pos = None
+        self._done = False
+
+    def feed(self, chunk):
+        self.text += chunk
+        if self._done:
+            return ""
+
+        # wait until the reply key shows up
+        if self._pos is None:
+            match = REPLY_KEY.search(self.text)
+            if not match:
+                return ""
+            self._pos = match.end()
+
+        text = self.text
+        pos = self._pos
+        delta = []
+        while pos < len(text):
+            char = text[pos]
+            if char == '"':
+                self._done = True
+                pos += 1
+                break
+            if char != "\\":
+                delta.append(char)
+                pos += 1
+                continue
+
+            # escape sequence, wait for the rest of it
+            if pos + 1 >= len(text):
+                break
+            code = text[pos + 1]
+            if code != "u":
+                delta.append(ESCAPES.get(code, code))
+                pos += 2
+                continue
+
+            if pos + 6 > len(text):
+                break
+            value = int(text[pos + 2 : pos + 6], 16)
+            if 0xD800 <= value < 0xDC00:
+                # surrogate pair, needs the low half as well
+                if pos + 12 > len(text):
+                    break
+                low = int(text[pos + 8 : pos + 12], 16)
+                value = 0x10000 + ((value - 0xD800) << 10) + (low - 0xDC00)
+                pos += 12
+            else:
+                pos += 6
+            delta.append(chr(value))
+
+        self._pos = pos
+        delta = "".join(delta)
+        self.reply += delta
+        return delta
+
+    def remainder(self, model_reply):
+        """
+        part of the final reply that was not streamed yet
+        """
+        if model_reply.startswith(self.reply):
+            return model_reply[len(self.reply) :]
+        return ""
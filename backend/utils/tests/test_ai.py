@@ -1,5 +1,7 @@
+import threading
 from unittest.mock import patch, MagicMock
 from django.test import TestCase
+from utils import ai
 from utils.ai import WeatherInformationPipeline  # adjust import as needed
 
 
@@ -68,3 +70,69 @@ class WeatherInformationPipelineTests(TestCase):
         )
         title = pipeline.generate_title("What's the weather in Dhaka?", "It's cloudy.")
         self.assertEqual(title, "Dhaka Weather Update")
+
+
+class PipelineRegistryTests(TestCase):
+    def setUp(self):
+        ai._reset_pipelines()
+        self.addCleanup(ai._reset_pipelines)
+
+    @patch("utils.ai.WeatherInformationPipeline")
+    def test_get_pipeline_reuses_instance(self, mock_pipeline_cls):
+        """Same (api_key, model) returns the cached pipeline"""
+        first = ai.get_pipeline(api_key="key", model="gpt-4o-mini")
+        second = ai.get_pipeline(api_key="key", model="gpt-4o-mini")
+
+        self.assertIs(first, second)
+        mock_pipeline_cls.assert_called_once_with(api_key="key", model="gpt-4o-mini")
+
+    @patch("utils.ai.WeatherInformationPipeline", side_effect=lambda **kw: MagicMock())
+    def test_get_pipeline_keyed_by_model(self, mock_pipeline_cls):
+        """Different models get their own pipeline"""
+        first = ai.get_pipeline(api_key="key", model="gpt-4o-mini")
+        second = ai.get_pipeline(api_key="key", model="gpt-4o")
+
+        self.assertIsNot(first, second)
+        self.assertEqual(mock_pipeline_cls.call_count, 2)
+
+    @patch("utils.ai.WeatherInformationPipeline")
+    def test_get_pipeline_thread_safe(self, mock_pipeline_cls):
+        """Concurrent first use builds the pipeline only once"""
+        barrier = threading.Barrier(8)
+
+        def worker():
+            barrier.wait()
+            ai.get_pipeline(api_key="key", model="gpt-4o-mini")
+
+        threads = [threading.Thread(target=worker) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(mock_pipeline_cls.call_count, 1)
+
+    @patch("utils.ai.WeatherInformationPipeline", side_effect=lambda **kw: MagicMock())
+    def test_reset_after_fork_rebuilds(self, mock_pipeline_cls):
+        """After a fork reset the next call builds a fresh pipeline"""
+        before = ai.get_pipeline(api_key="key", model="gpt-4o-mini")
+        ai._reset_pipelines()
+        after = ai.get_pipeline(api_key="key", model="gpt-4o-mini")
+
+        self.assertIsNot(before, after)
+        self.assertEqual(mock_pipeline_cls.call_count, 2)
+
+    @patch("utils.ai.LlmConfig")
+    def test_llm_base_url_overrides_openrouter(self, mock_config):
+        """LLM_BASE_URL sends requests to an OpenAI compatible endpoint"""
+        with patch.object(ai, "LLM_BASE_URL", None):
+            ai.llm_config("key", "gpt-4o-mini")
+        with patch.object(ai, "LLM_BASE_URL", "http://127.0.0.1:8765/v1"):
+            ai.llm_config("key", "gpt-4o-mini")
+
+        mock_config.openrouter.assert_called_once_with(
+            api_key="key", model="gpt-4o-mini"
+        )
+        mock_config.bytedance.assert_called_once_with(
+            api_key="key", model="gpt-4o-mini", base_url="http://127.0.0.1:8765/v1"
+        )
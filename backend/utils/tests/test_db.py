@@ -0,0 +1,55 @@
+from unittest.mock import MagicMock, patch
+from django.db import connections
+from django.test import SimpleTestCase, TestCase
+from users.models import User
+from utils import db
+from utils.db import CONNECTIONS_OPENED, QueryCounter
+
+
+class QueryCounterTest(TestCase):
+    def test_counts_queries_inside_block(self):
+        with QueryCounter() as queries:
+            User.objects.create(telegram_id=1, username="a")
+            User.objects.count()
+
+        User.objects.count()
+        self.assertEqual(queries.count, 2)
+
+
+class ConnectionStatsTest(SimpleTestCase):
+    databases = {"default"}
+
+    def test_new_connections_are_counted(self):
+        before = CONNECTIONS_OPENED.value(alias="default")
+        wrapper = connections.create_connection("default")
+        wrapper.ensure_connection()
+        # an open connection is reused, not counted again
+        wrapper.cursor().execute("SELECT 1")
+        wrapper.close()
+
+        self.assertEqual(CONNECTIONS_OPENED.value(alias="default"), before + 1)
+
+    def test_pool_stats_are_exported(self):
+        stats = {"pool_size": 4, "pool_available": 3, "requests_num": 120}
+
+        with patch.object(db, "_pool_stats", return_value=[("default", stats)]):
+            text = db.registry.render()
+
+        self.assertIn('db_pool_connections{alias="default",state="open"} 4', text)
+        self.assertIn('db_pool_connections{alias="default",state="waiting"} 0', text)
+        self.assertIn('db_pool_requests_total{alias="default"} 120', text)
+
+    def test_pool_stats_skip_unpooled_databases(self):
+        self.assertEqual(db._pool_stats(), [])
+
+    def test_pooled_database(self):
+        pool = MagicMock()
+        pool.get_stats.return_value = {"pool_size": 2}
+        wrapper = MagicMock(pool=pool)
+        settings = {"default": {"OPTIONS": {"pool": {"max_size": 4}}}}
+
+        with patch.object(db, "connections") as mock_connections:
+            mock_connections.__iter__.return_value = iter(["default"])
+            mock_connections.settings = settings
+            mock_connections.__getitem__.return_value = wrapper
+            self.assertEqual(db._pool_stats(), [("default", {"pool_size": 2})])
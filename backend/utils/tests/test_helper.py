@@ -1,10 +1,16 @@
 import os
+import hmac
 import json
+import time
+import hashlib
+from urllib.parse import urlencode
+from unittest.mock import patch
 from django.test import TestCase
 from utils.helper import get_current_weather
 from django.http import HttpRequest
 from chats.models import User
-from utils.helper import check_tg_data_string
+from utils import helper
+from utils.helper import check_tg_data_string, acheck_tg_data_string
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -30,8 +36,32 @@ def dummy_view(request, current_user):
     return {"user_id": current_user.telegram_id, "username": current_user.username}
 
 
+async def async_dummy_view(request, current_user):
+    return dummy_view(request, current_user)
+
+
+def sign_init_data(user, auth_date=None):
+    """
+    build a X-Telegram-Init-Data string signed with BOT_TOKEN
+    """
+    fields = {
+        "auth_date": str(auth_date or int(time.time())),
+        "query_id": "AAEPsHoIAwAAAA-test",
+        "user": json.dumps(user),
+    }
+    data_check_string = "\n".join(f"{k}={v}" for k, v in sorted(fields.items()))
+    secret_key = hmac.new(
+        key=b"WebAppData", msg=BOT_TOKEN.encode("utf-8"), digestmod=hashlib.sha256
+    ).digest()
+    fields["hash"] = hmac.new(
+        key=secret_key, msg=data_check_string.encode("utf-8"), digestmod=hashlib.sha256
+    ).hexdigest()
+    return urlencode(fields)
+
+
 class CheckTgDataStringTest(TestCase):
     def setUp(self):
+        helper.verified_sessions.clear()
         self.BOT_TOKEN = BOT_TOKEN
         # provide a valid sample data string
         self.sample_datastring = "query_id=AAEPsHoIAwAAAA-weghhrZhz&user=%7B%22id%22%3A6584709135%2C%22first_name%22%3A%22Mahfuz%22%2C%22last_name%22%3A%22Rahman%22%2C%22username%22%3A%22mahfuz5676%22%2C%22language_code%22%3A%22en%22%2C%22allows_write_to_pm%22%3Atrue%2C%22photo_url%22%3A%22https%3A%5C%2F%5C%2Ft.me%5C%2Fi%5C%2Fuserpic%5C%2F320%5C%2FzF4ipl95HZ3J3ZK5TNHrl6dj87Ai1RWUwEI8ZUCKaqnw_G7kp67smDoKmx8xLvjn.svg%22%7D&auth_date=1755325669&signature=d-tB-7rgB-2hQWiihLDkYkK52uRXQbjzL5CIqel6WZBZMd_ISJoUY04ItkODYzd-MvxbQjW-6yvgGqjD-0_GBg&hash=e2b90c067a2db136301d428fbf088ec99334c8b679f2ec866a004b179abd07f7"
@@ -67,3 +97,104 @@ class CheckTgDataStringTest(TestCase):
         user = User.objects.get(username=response_data["username"])
         self.assertEqual(response_data["user_id"], user.telegram_id)
         self.assertEqual(response_data["username"], user.username)
+
+
+class AsyncCheckTgDataStringTest(TestCase):
+    def setUp(self):
+        helper.verified_sessions.clear()
+
+    async def test_async_missing_header(self):
+        request = HttpRequest()
+        request.headers = {}
+        wrapped_view = acheck_tg_data_string(async_dummy_view)
+        response = await wrapped_view(request)
+        self.assertEqual(response.status_code, 401)
+
+    async def test_async_valid_datastring_creates_user(self):
+        request = HttpRequest()
+        request.headers = {
+            "X-Telegram-Init-Data": sign_init_data({"id": 42, "username": "async_user"})
+        }
+        wrapped_view = acheck_tg_data_string(async_dummy_view)
+        response_data = await wrapped_view(request)
+
+        user = await User.objects.aget(telegram_id=42)
+        self.assertEqual(response_data["username"], user.username)
+
+    async def test_async_username_update(self):
+        await User.objects.acreate(telegram_id=43, username="old_name")
+        request = HttpRequest()
+        request.headers = {
+            "X-Telegram-Init-Data": sign_init_data({"id": 43, "username": "new_name"})
+        }
+        wrapped_view = acheck_tg_data_string(async_dummy_view)
+        await wrapped_view(request)
+
+        user = await User.objects.aget(telegram_id=43)
+        self.assertEqual(user.username, "new_name")
+
+
+class VerifiedSessionCacheTest(TestCase):
+    def setUp(self):
+        helper.verified_sessions.clear()
+        self.addCleanup(helper.verified_sessions.clear)
+        self.wrapped_view = check_tg_data_string(dummy_view)
+
+    def make_request(self, init_data):
+        request = HttpRequest()
+        request.headers = {"X-Telegram-Init-Data": init_data}
+        return request
+
+    def test_secret_key_computed_once(self):
+        helper.webapp_secret_key.cache_clear()
+        request = self.make_request(sign_init_data({"id": 50, "username": "a"}))
+        self.wrapped_view(request)
+        self.wrapped_view(
+            self.make_request(sign_init_data({"id": 51, "username": "b"}))
+        )
+
+        info = helper.webapp_secret_key.cache_info()
+        self.assertEqual(info.misses, 1)
+
+    def test_cached_session_skips_db(self):
+        init_data = sign_init_data({"id": 52, "username": "cached"})
+        self.wrapped_view(self.make_request(init_data))
+
+        with self.assertNumQueries(0):
+            response_data = self.wrapped_view(self.make_request(init_data))
+        self.assertEqual(response_data["username"], "cached")
+
+    def test_tampered_string_with_same_hash_not_served(self):
+        init_data = sign_init_data({"id": 53, "username": "real"})
+        self.wrapped_view(self.make_request(init_data))
+
+        tampered = init_data.replace("real", "fake")
+        response = self.wrapped_view(self.make_request(tampered))
+        self.assertEqual(response.status_code, 401)
+
+    def test_non_ascii_string_with_same_hash_not_served(self):
+        init_data = sign_init_data({"id": 56, "username": "real"})
+        self.wrapped_view(self.make_request(init_data))
+
+        tampered = init_data.replace("real", "réal")
+        response = self.wrapped_view(self.make_request(tampered))
+        self.assertEqual(response.status_code, 401)
+
+    def test_expired_session_not_served(self):
+        auth_date = int(time.time())
+        init_data = sign_init_data({"id": 54, "username": "old"}, auth_date=auth_date)
+        self.wrapped_view(self.make_request(init_data))
+
+        with patch("utils.helper.time.time", return_value=auth_date + 10**9):
+            self.assertIsNone(helper.verified_sessions.get(init_data))
+
+    def test_cache_is_bounded(self):
+        cache = helper.VerifiedSessionCache(maxsize=2, ttl=60)
+        user = User(telegram_id=55, username="lru")
+        now = int(time.time())
+        strings = [sign_init_data({"id": 55 + i, "username": "lru"}) for i in range(3)]
+        for init_data in strings:
+            cache.set(init_data, user, now)
+
+        self.assertIsNone(cache.get(strings[0]))
+        self.assertIsNotNone(cache.get(strings[2]))
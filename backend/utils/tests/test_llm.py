@@ -0,0 +1,265 @@
+import time
+import asyncio
+import threading
+from unittest.mock import patch, MagicMock
+from django.test import SimpleTestCase
+from utils.ai import WeatherInformationPipeline
+from utils.llm import (
+    LLM_DEADLINE_SECONDS,
+    LLM_TIMEOUT_SECONDS,
+    CircuitBreaker,
+    LlmUnavailable,
+    ResilientCaller,
+)
+from utils.ratelimit import CHAT_IN_FLIGHT_TTL_SECONDS
+
+
+class FakeProvider:
+    """
+    LLM stand-in, script[model] is a list of (latency, error) per call,
+    the last entry repeats
+    """
+
+    def __init__(self, script):
+        self.script = script
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def _next(self, model):
+        with self._lock:
+            index = sum(1 for called in self.calls if called == model)
+            self.calls.append(model)
+        steps = self.script[model]
+        return steps[min(index, len(steps) - 1)]
+
+    def __call__(self, model):
+        latency, error = self._next(model)
+        time.sleep(latency)
+        if error:
+            raise Exception(error)
+        return f"reply from {model}"
+
+    async def acall(self, model):
+        latency, error = self._next(model)
+        await asyncio.sleep(latency)
+        if error:
+            raise Exception(error)
+        return f"reply from {model}"
+
+
+OK = (0, None)
+FAIL = (0, "502 bad gateway")
+
+
+def caller(models=("primary",), **kwargs):
+    kwargs.setdefault("backoff", 0)
+    kwargs.setdefault("hedge", False)
+    return ResilientCaller(list(models), **kwargs)
+
+
+class RetryTests(SimpleTestCase):
+    def test_transient_errors_are_retried(self):
+        provider = FakeProvider({"primary": [FAIL, FAIL, OK]})
+
+        self.assertEqual(caller(max_retries=2).call(provider), "reply from primary")
+        self.assertEqual(len(provider.calls), 3)
+
+    def test_backoff_grows_and_is_bounded(self):
+        llm = caller(backoff=0.5, backoff_max=2)
+
+        with patch("utils.llm.random.uniform", side_effect=lambda low, high: high):
+            delays = [llm.retry_delay(attempt) for attempt in range(5)]
+
+        self.assertEqual(delays, [0.5, 1, 2, 2, 2])
+
+    def test_fallback_model_after_retries(self):
+        provider = FakeProvider({"primary": [FAIL], "backup": [OK]})
+
+        result = caller(["primary", "backup"], max_retries=1).call(provider)
+
+        self.assertEqual(result, "reply from backup")
+        self.assertEqual(provider.calls, ["primary", "primary", "backup"])
+
+    def test_all_models_failing_raise_unavailable(self):
+        provider = FakeProvider({"primary": [FAIL], "backup": [FAIL]})
+
+        with self.assertRaises(LlmUnavailable) as ctx:
+            caller(["primary", "backup"], max_retries=1).call(provider)
+
+        self.assertIn("502 bad gateway", str(ctx.exception))
+        self.assertEqual(len(provider.calls), 4)
+
+    def test_async_retries_and_fallback(self):
+        provider = FakeProvider({"primary": [FAIL], "backup": [FAIL, OK]})
+        llm = caller(["primary", "backup"], max_retries=1)
+
+        result = asyncio.run(llm.acall(provider.acall))
+
+        self.assertEqual(result, "reply from backup")
+        self.assertEqual(provider.calls, ["primary", "primary", "backup", "backup"])
+
+    def test_deadline_stops_retries_and_fallback(self):
+        """No attempt starts that could run past the deadline"""
+        provider = FakeProvider(
+            {"primary": [(0.1, "504 gateway timeout")], "backup": [OK]}
+        )
+        llm = caller(["primary", "backup"], attempt_timeout=0.1, deadline=0.25)
+
+        start = time.perf_counter()
+        with self.assertRaises(LlmUnavailable):
+            llm.call(provider)
+
+        self.assertLess(time.perf_counter() - start, 0.25)
+        self.assertEqual(provider.calls, ["primary", "primary"])
+
+    def test_async_deadline(self):
+        provider = FakeProvider(
+            {"primary": [(0.1, "504 gateway timeout")], "backup": [OK]}
+        )
+        llm = caller(["primary", "backup"], attempt_timeout=0.1, deadline=0.25)
+
+        with self.assertRaises(LlmUnavailable):
+            asyncio.run(llm.acall(provider.acall))
+        self.assertEqual(provider.calls, ["primary", "primary"])
+
+    def test_fast_failures_reach_the_fallback_within_deadline(self):
+        provider = FakeProvider({"primary": [FAIL], "backup": [OK]})
+        llm = caller(["primary", "backup"], attempt_timeout=0.1, deadline=0.25)
+
+        self.assertEqual(llm.call(provider), "reply from backup")
+        self.assertEqual(provider.calls, ["primary"] * 3 + ["backup"])
+
+    def test_default_deadline_fits_the_in_flight_ttl(self):
+        """A reply gives up before the rate limiter's slot expires"""
+        self.assertLess(LLM_DEADLINE_SECONDS, CHAT_IN_FLIGHT_TTL_SECONDS)
+        self.assertLessEqual(LLM_TIMEOUT_SECONDS, LLM_DEADLINE_SECONDS)
+
+
+class CircuitBreakerTests(SimpleTestCase):
+    def test_open_breaker_skips_model(self):
+        provider = FakeProvider({"primary": [FAIL], "backup": [OK]})
+        llm = caller(["primary", "backup"], max_retries=0, breaker_failures=2)
+
+        for _ in range(3):
+            self.assertEqual(llm.call(provider), "reply from backup")
+
+        # the third request went straight to the backup
+        self.assertEqual(provider.calls.count("primary"), 2)
+        self.assertEqual(llm.breakers["primary"].state, CircuitBreaker.OPEN)
+
+    def test_half_open_probe(self):
+        now = [1000.0]
+        breaker = CircuitBreaker(failures=1, reset_seconds=30, clock=lambda: now[0])
+        breaker.record_failure()
+        self.assertFalse(breaker.allow())
+
+        now[0] += 31
+        self.assertTrue(breaker.allow())
+        # only one probe at a time
+        self.assertFalse(breaker.allow())
+        breaker.record_failure()
+        self.assertEqual(breaker.state, CircuitBreaker.OPEN)
+
+        now[0] += 31
+        self.assertTrue(breaker.allow())
+        breaker.record_success()
+        self.assertEqual(breaker.state, CircuitBreaker.CLOSED)
+        self.assertTrue(breaker.allow())
+
+    def test_every_breaker_open(self):
+        provider = FakeProvider({"primary": [OK]})
+        llm = caller(breaker_failures=1)
+        llm.breakers["primary"].record_failure()
+
+        with self.assertRaises(LlmUnavailable):
+            llm.call(provider)
+        self.assertEqual(provider.calls, [])
+
+
+class HedgingTests(SimpleTestCase):
+    def test_slow_call_is_hedged(self):
+        provider = FakeProvider({"primary": [(1, None), (0.01, None)]})
+        llm = caller(hedge=True, hedge_min_seconds=0.05)
+
+        start = time.perf_counter()
+        result = llm.call(provider)
+        elapsed = time.perf_counter() - start
+
+        self.assertEqual(result, "reply from primary")
+        self.assertLess(elapsed, 0.5)
+        self.assertEqual(len(provider.calls), 2)
+
+    def test_fast_call_is_not_hedged(self):
+        provider = FakeProvider({"primary": [(0.01, None)]})
+
+        caller(hedge=True, hedge_min_seconds=0.2).call(provider)
+
+        self.assertEqual(len(provider.calls), 1)
+
+    def test_hedge_delay_follows_percentile(self):
+        llm = caller(hedge=True, hedge_min_seconds=0.01, hedge_percentile=95)
+        self.assertEqual(llm.hedge_delay("primary"), 0.01)
+
+        for ms in range(1, 101):
+            llm.latencies["primary"].add(ms / 1000)
+        self.assertAlmostEqual(llm.hedge_delay("primary"), 0.096)
+
+    def test_async_slow_call_is_hedged(self):
+        provider = FakeProvider({"primary": [(1, None), (0.01, None)]})
+        llm = caller(hedge=True, hedge_min_seconds=0.05)
+
+        start = time.perf_counter()
+        result = asyncio.run(llm.acall(provider.acall))
+
+        self.assertEqual(result, "reply from primary")
+        self.assertLess(time.perf_counter() - start, 0.5)
+
+    def test_hedging_cuts_tail_latency(self):
+        """every 10th call stalls, the hedged p99 stays near the median"""
+
+        def run(hedge):
+            provider = FakeProvider(
+                {"primary": [(0.25 if i % 10 == 0 else 0.005, None) for i in range(60)]}
+            )
+            llm = caller(hedge=hedge, hedge_min_seconds=0.03)
+            samples = []
+            for _ in range(30):
+                start = time.perf_counter()
+                llm.call(provider)
+                samples.append(time.perf_counter() - start)
+            return sorted(samples)[int(len(samples) * 0.99)]
+
+        self.assertGreaterEqual(run(hedge=False), 0.25)
+        self.assertLess(run(hedge=True), 0.15)
+
+
+class PipelineFailoverTests(SimpleTestCase):
+    @patch("utils.ai.LlmClient")
+    @patch("utils.ai.LlmConfig")
+    @patch("utils.ai.Executor")
+    def test_chat_falls_back_to_next_model(
+        self, mock_executor_cls, mock_config, mock_client_cls
+    ):
+        def executor_for(config, **kwargs):
+            executor = MagicMock()
+            result = executor.execute.return_value
+            result.is_success.return_value = config.model == "backup"
+            result.get_error.return_value = "timeout"
+            result.get_node_output.return_value = '{"reply": "from backup"}'
+            return executor
+
+        mock_config.openrouter.side_effect = lambda api_key, model: MagicMock(
+            model=model
+        )
+        mock_executor_cls.side_effect = executor_for
+
+        pipeline = WeatherInformationPipeline(
+            api_key="fake_api_key", model="primary", fallback_models=["backup"]
+        )
+        pipeline.caller.backoff = 0
+
+        self.assertEqual(pipeline.chat("hi", "no context"), '{"reply": "from backup"}')
+        self.assertEqual(
+            pipeline.backend("primary")[0].execute.call_count,
+            pipeline.caller.max_retries + 1,
+        )
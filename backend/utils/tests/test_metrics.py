@@ -0,0 +1,118 @@
+from unittest.mock import patch
+from django.test import SimpleTestCase, override_settings
+from utils import metrics
+from utils.metrics import Registry, STAGE_SECONDS, timer, timed
+
+
+class HistogramTests(SimpleTestCase):
+    def test_render_prometheus_text(self):
+        registry = Registry()
+        latency = registry.histogram("latency_seconds", "Latency", ["stage"], [0.1, 1])
+        requests = registry.counter("requests_total", "Requests", ["status"])
+        latency.observe(0.05, stage="auth")
+        latency.observe(0.5, stage="auth")
+        requests.inc(status=200)
+        requests.inc(2, status=200)
+
+        text = registry.render()
+
+        self.assertIn("# TYPE latency_seconds histogram", text)
+        self.assertIn('latency_seconds_bucket{stage="auth",le="0.1"} 1', text)
+        self.assertIn('latency_seconds_bucket{stage="auth",le="1.0"} 2', text)
+        self.assertIn('latency_seconds_bucket{stage="auth",le="+Inf"} 2', text)
+        self.assertIn('latency_seconds_count{stage="auth"} 2', text)
+        self.assertIn('requests_total{status="200"} 3', text)
+
+    def test_collectors_are_rendered(self):
+        registry = Registry()
+        registry.register_collector(
+            lambda: [("cache_total", "counter", "Cache", [({"result": "hit"}, 4)])]
+        )
+
+        self.assertIn('cache_total{result="hit"} 4', registry.render())
+
+    def test_label_values_are_escaped(self):
+        registry = Registry()
+        registry.counter("c_total", "C", ["route"]).inc(route='a"b')
+
+        self.assertIn('c_total{route="a\\"b"} 1', registry.render())
+
+
+class TimerTests(SimpleTestCase):
+    def test_timer_records_stage_and_request_timings(self):
+        before = STAGE_SECONDS.count(stage="test_block")
+        token = metrics.start_request()
+        with timer("test_block"):
+            pass
+        with timer("test_block"):
+            pass
+        timings = metrics.finish_request(token)
+
+        self.assertEqual(STAGE_SECONDS.count(stage="test_block"), before + 2)
+        self.assertEqual([stage for stage, _ in timings], ["test_block"] * 2)
+        # repeated stages are merged into one Server-Timing entry
+        header = metrics.server_timing(timings, total=0.5)
+        self.assertRegex(header, r"^test_block;dur=[\d.]+, total;dur=500\.00$")
+
+    def test_timer_records_failures(self):
+        before = STAGE_SECONDS.count(stage="test_failure")
+        with self.assertRaises(ValueError):
+            with timer("test_failure"):
+                raise ValueError
+
+        self.assertEqual(STAGE_SECONDS.count(stage="test_failure"), before + 1)
+
+    async def test_timed_async_function(self):
+        @timed("test_async")
+        async def work():
+            return 1
+
+        before = STAGE_SECONDS.count(stage="test_async")
+        self.assertEqual(await work(), 1)
+        self.assertEqual(STAGE_SECONDS.count(stage="test_async"), before + 1)
+
+
+class MetricsEndpointTests(SimpleTestCase):
+    def test_server_timing_header(self):
+        """The auth stage of a rejected request shows up in Server-Timing"""
+        response = self.client.get("/api-v2/chat/chat-list/")
+
+        self.assertEqual(response.status_code, 401)
+        self.assertRegex(
+            response["Server-Timing"], r"^auth;dur=[\d.]+, total;dur=[\d.]+$"
+        )
+
+    @override_settings(DEBUG=True)
+    def test_metrics_endpoint(self):
+        self.client.get("/api-v2/chat/chat-list/")
+        response = self.client.get("/api-v2/metrics/")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response["Content-Type"].startswith("text/plain"))
+        body = response.content.decode()
+        self.assertIn('chat_stage_duration_seconds_count{stage="auth"}', body)
+        self.assertIn(
+            'http_request_duration_seconds_count{method="GET",route="api-v2/chat/chat-list/",status="401"}',
+            body,
+        )
+        self.assertIn("weather_lookups_total", body)
+        self.assertIn("llm_response_cache_total", body)
+
+    def test_metrics_token(self):
+        with patch.object(metrics, "METRICS_TOKEN", "secret"):
+            denied = self.client.get("/api-v2/metrics/")
+            allowed = self.client.get(
+                "/api-v2/metrics/", headers={"Authorization": "Bearer secret"}
+            )
+
+        self.assertEqual(denied.status_code, 401)
+        self.assertEqual(allowed.status_code, 200)
+
+    def test_metrics_hidden_without_token(self):
+        with patch.object(metrics, "METRICS_TOKEN", None):
+            hidden = self.client.get("/api-v2/metrics/")
+            with self.settings(DEBUG=True):
+                shown = self.client.get("/api-v2/metrics/")
+
+        self.assertEqual(hidden.status_code, 404)
+        self.assertEqual(shown.status_code, 200)
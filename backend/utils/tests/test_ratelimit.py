@@ -0,0 +1,202 @@
+import json
+import threading
+from types import SimpleNamespace
+from unittest.mock import patch
+from django.http import JsonResponse, StreamingHttpResponse
+from django.test import RequestFactory, SimpleTestCase, override_settings
+from utils import ratelimit
+from utils.ratelimit import RateLimiter, chat_rate_limit, achat_rate_limit
+
+
+def chat_request(chat_id=1):
+    return RequestFactory().post(
+        "/api-v2/chat/chatting/",
+        data=json.dumps({"chat_id": chat_id, "content": "hi"}),
+        content_type="application/json",
+    )
+
+
+class TokenBucketTests(SimpleTestCase):
+    def test_burst_then_retry_after(self):
+        limiter = RateLimiter(rate_per_minute=60, burst=3, max_in_flight=0)
+
+        with patch("utils.ratelimit.time.time", return_value=1000.0):
+            accepted = [limiter.take_token(1) for _ in range(3)]
+            retry_after = limiter.take_token(1)
+            # other users have their own bucket
+            other = limiter.take_token(2)
+
+        self.assertEqual(accepted, [0, 0, 0])
+        self.assertAlmostEqual(retry_after, 1.0)
+        self.assertEqual(other, 0)
+
+        # one token is back a second later
+        with patch("utils.ratelimit.time.time", return_value=1001.0):
+            self.assertEqual(limiter.take_token(1), 0)
+            self.assertGreater(limiter.take_token(1), 0)
+
+    def test_disabled(self):
+        limiter = RateLimiter(rate_per_minute=0, burst=1, max_in_flight=0)
+
+        self.assertEqual([limiter.take_token(1) for _ in range(50)], [0] * 50)
+
+    def test_concurrent_load_is_capped_at_burst(self):
+        """64 threads hammering one user get exactly `burst` messages through"""
+        limiter = RateLimiter(rate_per_minute=1, burst=5, max_in_flight=0)
+        start = threading.Barrier(64)
+        accepted = []
+
+        def send():
+            start.wait()
+            for _ in range(10):
+                if limiter.take_token(42) == 0:
+                    accepted.append(1)
+
+        threads = [threading.Thread(target=send) for _ in range(64)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(accepted), 5)
+
+    @override_settings(
+        CACHES={
+            "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
+            "limits": {
+                "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+                "LOCATION": "rate-limit-test",
+            },
+        }
+    )
+    def test_shared_cache_alias(self):
+        """Limiters of different workers share one bucket through the cache"""
+        first = RateLimiter(rate_per_minute=1, burst=2, cache_alias="limits")
+        second = RateLimiter(rate_per_minute=1, burst=2, cache_alias="limits")
+
+        self.assertEqual(first.take_token(7), 0)
+        self.assertEqual(second.take_token(7), 0)
+        self.assertGreater(first.take_token(7), 0)
+
+        slot, error = first.acquire(8, chat_id=1)
+        _, busy = second.acquire(8, chat_id=1)
+        self.assertIsNone(error)
+        self.assertEqual(busy.status_code, 429)
+        slot.release()
+
+
+class InFlightTests(SimpleTestCase):
+    def setUp(self):
+        self.limiter = RateLimiter(rate_per_minute=0, max_in_flight=2)
+        patcher = patch.object(ratelimit, "chat_limiter", self.limiter)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.user = SimpleNamespace(telegram_id=1)
+
+    def test_second_message_to_busy_chat_is_rejected(self):
+        slot, error = self.limiter.acquire(1, chat_id=5)
+        _, busy = self.limiter.acquire(1, chat_id=5)
+
+        self.assertIsNone(error)
+        self.assertEqual(busy.status_code, 429)
+        self.assertEqual(busy["Retry-After"], "1")
+
+        slot.release()
+        slot.release()
+        slot, error = self.limiter.acquire(1, chat_id=5)
+        self.assertIsNone(error)
+
+    def test_concurrent_requests_capped_per_user(self):
+        release = threading.Event()
+        entered = threading.Semaphore(0)
+
+        @chat_rate_limit
+        def view(request, current_user):
+            entered.release()
+            release.wait(5)
+            return JsonResponse({}, status=201)
+
+        statuses = []
+
+        def send(chat_id):
+            statuses.append(view(chat_request(chat_id), self.user).status_code)
+
+        threads = [threading.Thread(target=send, args=(i,)) for i in range(6)]
+        for thread in threads[:2]:
+            thread.start()
+        # both slots are taken before the rest arrive
+        entered.acquire(timeout=5)
+        entered.acquire(timeout=5)
+        for thread in threads[2:]:
+            thread.start()
+        for thread in threads[2:]:
+            thread.join()
+        release.set()
+        for thread in threads[:2]:
+            thread.join()
+
+        self.assertEqual(sorted(statuses), [201, 201, 429, 429, 429, 429])
+        # slots are free again once the replies are done
+        self.assertEqual(view(chat_request(1), self.user).status_code, 201)
+
+    def test_view_error_releases_slot(self):
+        @chat_rate_limit
+        def view(request, current_user):
+            raise RuntimeError
+
+        with self.assertRaises(RuntimeError):
+            view(chat_request(), self.user)
+        slot, error = self.limiter.acquire(1, chat_id=1)
+        self.assertIsNone(error)
+
+    def test_streaming_slot_held_until_sent(self):
+        @chat_rate_limit
+        def view(request, current_user):
+            return StreamingHttpResponse(iter([b"a", b"b"]))
+
+        response = view(chat_request(3), self.user)
+        _, busy = self.limiter.acquire(1, chat_id=3)
+        self.assertEqual(busy.status_code, 429)
+
+        self.assertEqual(b"".join(response.streaming_content), b"ab")
+        slot, error = self.limiter.acquire(1, chat_id=3)
+        self.assertIsNone(error)
+
+    async def test_async_view(self):
+        @achat_rate_limit
+        async def view(request, current_user):
+            return JsonResponse({}, status=201)
+
+        response = await view(chat_request(), self.user)
+        self.assertEqual(response.status_code, 201)
+
+        slot, _ = self.limiter.acquire(1, chat_id=1)
+        response = await view(chat_request(), self.user)
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(
+            json.loads(response.content),
+            {"error": "A reply for this chat is still in progress."},
+        )
+        slot.release()
+
+    async def test_async_view_does_not_block_the_loop(self):
+        """The limiter (a shared cache is blocking I/O) runs off the loop"""
+        loop_thread = threading.get_ident()
+        threads = []
+        acquire = self.limiter.acquire
+
+        def tracked(*args, **kwargs):
+            threads.append(threading.get_ident())
+            return acquire(*args, **kwargs)
+
+        @achat_rate_limit
+        async def view(request, current_user):
+            return JsonResponse({}, status=201)
+
+        with patch.object(self.limiter, "acquire", tracked):
+            response = await view(chat_request(4), self.user)
+
+        self.assertEqual(response.status_code, 201)
+        self.assertNotIn(loop_thread, threads)
+        slot, error = self.limiter.acquire(1, chat_id=4)
+        self.assertIsNone(error)
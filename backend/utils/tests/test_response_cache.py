@@ -0,0 +1,159 @@
+import tempfile
+from unittest.mock import patch, MagicMock
+from django.core.cache import caches
+from django.test import SimpleTestCase, override_settings
+from utils.ai import WeatherInformationPipeline
+from utils.response_cache import ResponseCache
+from utils.weather import weather_client
+
+
+class ResponseCacheTests(SimpleTestCase):
+    def make_key(self, query, context="no context availabl"):
+        return ResponseCache.make_key("gpt-4o-mini", "system", context, query)
+
+    def test_disabled_cache_stores_nothing(self):
+        cache = ResponseCache(enabled=False)
+
+        self.assertFalse(cache.set(self.make_key("hi"), "hello"))
+        self.assertIsNone(cache.get(self.make_key("hi")))
+
+    def test_key_normalizes_input_but_not_context(self):
+        """Case and spacing of the message do not matter, the context does"""
+        self.assertEqual(self.make_key("Hi  there"), self.make_key(" hi there "))
+        self.assertNotEqual(
+            self.make_key("hi"), self.make_key("hi", context="asked about Dhaka")
+        )
+
+    def test_hit_miss_metrics(self):
+        cache = ResponseCache(enabled=True)
+        cache.get(self.make_key("hi"))
+        cache.set(self.make_key("hi"), "hello")
+
+        self.assertEqual(cache.get(self.make_key("HI")), "hello")
+        stats = cache.stats()
+        self.assertEqual((stats["hits"], stats["misses"]), (1, 1))
+        self.assertEqual(stats["hit_rate"], 0.5)
+
+    def test_tool_answers_expire_sooner(self):
+        cache = ResponseCache(enabled=True, ttl=3600, tool_ttl=60)
+        with patch("utils.cache.time.monotonic", return_value=1000):
+            cache.set(self.make_key("hi"), "hello")
+            cache.set(self.make_key("weather in london"), "rainy", used_tools=True)
+
+        with patch("utils.cache.time.monotonic", return_value=1100):
+            self.assertEqual(cache.get(self.make_key("hi")), "hello")
+            self.assertIsNone(cache.get(self.make_key("weather in london")))
+
+    def test_oversized_entries_are_skipped(self):
+        cache = ResponseCache(enabled=True, max_entry_bytes=10)
+
+        self.assertFalse(cache.set(self.make_key("hi"), "x" * 11))
+        self.assertIsNone(cache.get(self.make_key("hi")))
+        self.assertEqual(cache.stats()["too_large"], 1)
+
+    def test_lru_eviction(self):
+        cache = ResponseCache(enabled=True, maxsize=2)
+        for query in ("a", "b", "c"):
+            cache.set(self.make_key(query), query)
+
+        self.assertIsNone(cache.get(self.make_key("a")))
+        self.assertEqual(cache.get(self.make_key("c")), "c")
+
+    @override_settings(
+        CACHES={
+            "llm": {
+                "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+                "LOCATION": "llm-tests",
+            }
+        }
+    )
+    def test_locmem_backend(self):
+        self.addCleanup(caches["llm"].clear)
+        writer = ResponseCache(enabled=True, cache_alias="llm")
+        reader = ResponseCache(enabled=True, cache_alias="llm")
+
+        writer.set(self.make_key("hi"), "hello")
+
+        self.assertEqual(reader.get(self.make_key("hi")), "hello")
+
+    def test_file_backend(self):
+        with tempfile.TemporaryDirectory() as location, override_settings(
+            CACHES={
+                "llm": {
+                    "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+                    "LOCATION": location,
+                }
+            }
+        ):
+            writer = ResponseCache(enabled=True, cache_alias="llm")
+            reader = ResponseCache(enabled=True, cache_alias="llm")
+
+            writer.set(self.make_key("hi"), "hello")
+
+            self.assertEqual(reader.get(self.make_key("hi")), "hello")
+
+
+class PipelineResponseCacheTests(SimpleTestCase):
+    def setUp(self):
+        self.cache = ResponseCache(enabled=True, ttl=3600, tool_ttl=60)
+        patcher = patch("utils.ai.response_cache", self.cache)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        executor_patcher = patch("utils.ai.Executor")
+        self.executor = executor_patcher.start().return_value
+        self.addCleanup(executor_patcher.stop)
+
+        self.result = MagicMock()
+        self.result.is_success.return_value = True
+        self.result.get_node_output.return_value = '{"reply": "Hello!"}'
+        self.executor.execute.return_value = self.result
+
+        self.pipeline = WeatherInformationPipeline(
+            api_key="fake_api_key", model="gpt-4o-mini"
+        )
+
+    def test_repeated_opener_skips_the_model(self):
+        first = self.pipeline.chat("hi", "no context availabl")
+        second = self.pipeline.chat("Hi ", "no context availabl")
+
+        self.assertEqual(first, second)
+        self.assertEqual(self.executor.execute.call_count, 1)
+
+    def test_weather_answer_gets_tool_ttl(self):
+        """A weather lookup during the workflow shortens the entry's TTL"""
+
+        def execute(workflow):
+            weather_client._count("lookups")
+            return self.result
+
+        self.executor.execute.side_effect = execute
+        with patch("utils.cache.time.monotonic", return_value=1000):
+            self.pipeline.chat("weather in london", "no context availabl")
+        with patch("utils.cache.time.monotonic", return_value=1100):
+            self.pipeline.chat("weather in london", "no context availabl")
+
+        self.assertEqual(self.executor.execute.call_count, 2)
+
+    def test_failures_are_not_cached(self):
+        self.result.is_success.return_value = False
+        self.result.get_error.return_value = "boom"
+        # one model call per chat, retries are covered in test_llm
+        self.pipeline.caller.max_retries = 0
+
+        for _ in range(2):
+            with self.assertRaises(Exception):
+                self.pipeline.chat("hi", "no context availabl")
+
+        self.assertEqual(self.executor.execute.call_count, 2)
+
+    def test_unusable_outputs_are_not_cached(self):
+        for output in ("not json", '{"answer": "Hello!"}', '{"reply": "  "}'):
+            self.executor.execute.reset_mock()
+            self.result.get_node_output.return_value = output
+
+            self.pipeline.chat("hi", "no context availabl")
+            self.pipeline.chat("hi", "no context availabl")
+
+            self.assertEqual(self.executor.execute.call_count, 2)
+        self.assertEqual(self.cache.stats()["stores"], 0)
@@ -0,0 +1,56 @@
+import json
+from django.test import SimpleTestCase
+from utils.stream import ReplyStreamParser, sse_event
+
+
+class ReplyStreamParserTests(SimpleTestCase):
+    def feed_all(self, parser, chunks):
+        return [parser.feed(chunk) for chunk in chunks]
+
+    def test_streams_reply_across_chunks(self):
+        """Reply text is emitted as soon as it arrives"""
+        parser = ReplyStreamParser()
+        deltas = self.feed_all(
+            parser,
+            ['{"rep', 'ly": "It is ', "sunny", ' today", "context_summary": "x"}'],
+        )
+
+        self.assertEqual(deltas, ["", "It is ", "sunny", " today"])
+        self.assertEqual(parser.reply, "It is sunny today")
+        self.assertEqual(json.loads(parser.text)["context_summary"], "x")
+
+    def test_escape_split_between_chunks(self):
+        """Escape sequences are only decoded once complete"""
+        parser = ReplyStreamParser()
+        deltas = self.feed_all(
+            parser, ['{"reply": "a\\', "nb \\u00", 'e9 \\"q\\"', '"}']
+        )
+
+        self.assertEqual("".join(deltas), 'a\nb é "q"')
+
+    def test_surrogate_pair(self):
+        """Surrogate pairs split between chunks decode to one character"""
+        parser = ReplyStreamParser()
+        deltas = self.feed_all(parser, ['{"reply": "\\ud83d', '\\ude00"}'])
+
+        self.assertEqual(deltas, ["", "😀"])
+
+    def test_context_summary_first(self):
+        """Reply key is found even after context_summary"""
+        parser = ReplyStreamParser()
+        parser.feed('{"context_summary": "said \\"reply\\": hi", ')
+        delta = parser.feed('"reply": "hello"}')
+
+        self.assertEqual(delta, "hello")
+
+    def test_remainder(self):
+        """remainder returns the part of the final reply not streamed yet"""
+        parser = ReplyStreamParser()
+        parser.feed('{"reply": "hel')
+
+        self.assertEqual(parser.remainder("hello"), "lo")
+
+    def test_sse_event_format(self):
+        self.assertEqual(
+            sse_event("token", {"text": "hi"}), 'event: token\ndata: {"text": "hi"}\n\n'
+        )
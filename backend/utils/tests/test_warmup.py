@@ -0,0 +1,113 @@
+import os
+import sys
+import subprocess
+from unittest.mock import patch
+from django.db import DatabaseError
+from django.test import TestCase
+from utils import warmup
+
+
+class WarmupTests(TestCase):
+    def setUp(self):
+        warmup._reset_state()
+        self.addCleanup(warmup._reset_state)
+
+    def test_ready_when_never_warmed(self):
+        response = self.client.get("/api-v2/ready/")
+
+        self.assertEqual(response.status_code, 200)
+        body = response.json()
+        self.assertTrue(body["ready"])
+        self.assertTrue(body["database"])
+        self.assertEqual(body["warmup"]["status"], "cold")
+
+    def test_warmup_runs_every_step_once(self):
+        calls = []
+        steps = [(name, lambda name=name: calls.append(name)) for name in "ab"]
+        with patch.object(warmup, "WARMUP_STEPS", steps):
+            seconds = warmup.warmup()
+            self.assertEqual(warmup.warmup(), seconds)
+
+        self.assertEqual(calls, ["a", "b"])
+        self.assertEqual(set(seconds), {"a", "b"})
+        body = self.client.get("/api-v2/ready/").json()
+        self.assertTrue(body["ready"])
+        self.assertEqual(body["warmup"]["status"], "ready")
+
+    def test_not_ready_while_warming(self):
+        warmup._claim()
+
+        response = self.client.get("/api-v2/ready/")
+
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.json()["warmup"]["status"], "warming")
+
+    def test_failed_warmup_is_reported_and_retried(self):
+        def broken():
+            raise ImportError("no graphbit")
+
+        with patch.object(warmup, "WARMUP_STEPS", [("llm", broken)]):
+            with self.assertRaises(ImportError):
+                warmup.warmup()
+            thread = warmup.start_warmup()
+            thread.join()
+
+        response = self.client.get("/api-v2/ready/")
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.json()["warmup"]["error"], "no graphbit")
+
+    def test_not_ready_without_database(self):
+        with patch.object(
+            warmup.connection, "ensure_connection", side_effect=DatabaseError("down")
+        ):
+            response = self.client.get("/api-v2/ready/")
+
+        self.assertEqual(response.status_code, 503)
+        self.assertFalse(response.json()["database"])
+
+    def test_warmup_on_startup_follows_the_settings(self):
+        steps = [("noop", lambda: None)]
+        with patch.object(warmup, "WARMUP_STEPS", steps):
+            with patch.object(warmup, "WARM_PIPELINE_ON_STARTUP", False):
+                self.assertIsNone(warmup.warmup_on_startup())
+            self.assertEqual(warmup.warmup_state()["status"], "cold")
+
+            with patch.object(warmup, "WARM_PIPELINE_ON_STARTUP", True):
+                with patch.object(warmup, "WARMUP_IN_BACKGROUND", True):
+                    warmup.warmup_on_startup().join()
+        self.assertEqual(warmup.warmup_state()["status"], "ready")
+
+    def test_management_commands_do_not_warm_up(self):
+        # a fresh interpreter, this one has imported the entrypoints already
+        code = (
+            "import django;"
+            "django.setup();"
+            "from django.core.management import call_command;"
+            "call_command('check', verbosity=0);"
+            "from utils.warmup import warmup_state;"
+            "print(warmup_state()['status'])"
+        )
+        result = subprocess.run(
+            [sys.executable, "-c", code],
+            capture_output=True,
+            text=True,
+            check=True,
+            env=dict(os.environ, WARM_PIPELINE_ON_STARTUP="True"),
+        )
+
+        self.assertEqual(result.stdout.splitlines()[-1], "cold")
+
+    def test_setup_does_not_load_the_llm_stack(self):
+        # a fresh interpreter, this one has loaded everything already
+        code = (
+            "import sys, django;"
+            "django.setup();"
+            "from django.urls import get_resolver;"
+            "get_resolver().url_patterns;"
+            "print(sorted(m for m in ('graphbit', 'utils.ai') if m in sys.modules))"
+        )
+        result = subprocess.run(
+            [sys.executable, "-c", code], capture_output=True, text=True, check=True
+        )
+
+        self.assertEqual(result.stdout.strip(), "[]")
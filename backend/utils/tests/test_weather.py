@@ -0,0 +1,151 @@
+import json
+import time
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+from unittest.mock import patch
+from django.core.cache import caches
+from django.test import SimpleTestCase, override_settings
+from utils.cache import TTLCache
+from utils.weather import WeatherClient, WEATHER_ERROR
+
+
+class StubWeatherHandler(BaseHTTPRequestHandler):
+    """
+    answers like weatherapi.com, an unknown city returns an error body
+    """
+
+    def do_GET(self):
+        query = parse_qs(urlparse(self.path).query)
+        location = query.get("q", [""])[0]
+        self.server.calls.append(location)
+        time.sleep(self.server.delay)
+
+        if location == "nowhere":
+            body = {"error": {"code": 1006, "message": "No matching location found."}}
+        else:
+            body = {"location": {"name": location.title()}, "current": {"temp_c": 25}}
+
+        payload = json.dumps(body).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class WeatherClientTests(SimpleTestCase):
+    def setUp(self):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), StubWeatherHandler)
+        self.server.calls = []
+        self.server.delay = 0
+        thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        thread.start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        self.url = f"http://127.0.0.1:{self.server.server_port}/v1/current.json"
+
+    def make_client(self, **kwargs):
+        options = {"api_key": "test", "url": self.url, "timeout": 2, "ttl": 60}
+        options.update(kwargs)
+        return WeatherClient(**options)
+
+    def test_normalized_locations_share_one_upstream_call(self):
+        """Case and whitespace variants hit the cache"""
+        client = self.make_client()
+
+        first = client.current("Dhaka")
+        second = client.current("  dhaka ")
+
+        self.assertEqual(json.loads(first)["location"]["name"], "Dhaka")
+        self.assertEqual(first, second)
+        self.assertEqual(self.server.calls, ["dhaka"])
+        stats = client.stats()
+        self.assertEqual((stats["hits"], stats["misses"]), (1, 1))
+        self.assertEqual(stats["hit_rate"], 0.5)
+
+    def test_entries_expire_after_ttl(self):
+        """A lookup after the TTL goes upstream again"""
+        client = self.make_client(ttl=10)
+
+        with patch("utils.cache.time.monotonic", return_value=1000):
+            client.current("Dhaka")
+        with patch("utils.cache.time.monotonic", return_value=1011):
+            client.current("Dhaka")
+
+        self.assertEqual(self.server.calls, ["dhaka", "dhaka"])
+
+    def test_error_response_is_not_cached(self):
+        """Failed lookups return the error string and are retried next time"""
+        client = self.make_client()
+
+        self.assertEqual(client.current("nowhere"), WEATHER_ERROR)
+        self.assertEqual(client.current("nowhere"), WEATHER_ERROR)
+
+        self.assertEqual(len(self.server.calls), 2)
+        self.assertEqual(client.stats()["errors"], 2)
+
+    def test_slow_upstream_times_out(self):
+        """The read timeout bounds how long a lookup can block"""
+        self.server.delay = 0.5
+        client = self.make_client(timeout=0.1)
+
+        start = time.perf_counter()
+        self.assertEqual(client.current("Dhaka"), WEATHER_ERROR)
+        self.assertLess(time.perf_counter() - start, 0.45)
+
+    def test_identical_in_flight_lookups_are_coalesced(self):
+        """Concurrent lookups for one city send a single upstream request"""
+        self.server.delay = 0.2
+        client = self.make_client()
+        results = []
+
+        threads = [
+            threading.Thread(target=lambda: results.append(client.current("Dhaka")))
+            for _ in range(8)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(self.server.calls, ["dhaka"])
+        self.assertEqual(len(set(results)), 1)
+        self.assertEqual(client.stats()["coalesced"], 7)
+
+    @override_settings(
+        CACHES={
+            "weather": {
+                "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+                "LOCATION": "weather-tests",
+            }
+        }
+    )
+    def test_shared_cache_serves_other_clients(self):
+        """A django cache alias shares results between workers"""
+        self.addCleanup(caches["weather"].clear)
+        first = self.make_client(cache_alias="weather")
+        second = self.make_client(cache_alias="weather")
+
+        first.current("Dhaka")
+        second.current("DHAKA")
+
+        self.assertEqual(self.server.calls, ["dhaka"])
+        self.assertEqual(second.stats()["shared_hits"], 1)
+
+
+class TTLCacheTests(SimpleTestCase):
+    def test_evicts_least_recently_used(self):
+        """The oldest untouched entry goes first once full"""
+        cache = TTLCache(maxsize=2, ttl=60)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")
+        cache.set("c", 3)
+
+        self.assertEqual(cache.get("a"), 1)
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.get("c"), 3)
@@ -0,0 +1,183 @@
+"""
+Deferred loading of the LLM stack, and the warmup that loads it ahead of
+the first request.
+
+utils.ai imports graphbit, and the weather client imports requests on
+first use. Code outside the llm path gets get_pipeline from here, so
+loading the URL conf, manage.py commands and endpoints like chat-list/
+never pay for either. warmup() does all the loading up front, and
+WARM_PIPELINE_ON_STARTUP runs it when a server process boots: the WSGI
+and ASGI entrypoints call warmup_on_startup(), management commands
+(migrate, collectstatic, ...) never do.
+ready_view (GET api-v2/ready/) reports whether it is done and whether the
+database answers.
+"""
+
+import os
+import sys
+import time
+import logging
+import threading
+from dotenv import load_dotenv
+from django.db import DatabaseError, connection
+from django.http import JsonResponse
+
+load_dotenv()
+
+# load the views, graphbit and the llm pipeline when a server process
+# boots instead of on the first requests
+WARM_PIPELINE_ON_STARTUP = (
+    os.getenv("WARM_PIPELINE_ON_STARTUP", "False").lower() == "true"
+)
+# warm up in a background thread, api-v2/ready/ answers 503 until it is done
+WARMUP_IN_BACKGROUND = os.getenv("WARMUP_IN_BACKGROUND", "False").lower() == "true"
+
+# cold: warmup never ran, everything loads on first use
+# warming -> ready, or failed
+_state = {"status": "cold", "seconds": {}, "error": None}
+_state_lock = threading.Lock()
+
+
+def get_pipeline(*args, **kwargs):
+    """
+    utils.ai.get_pipeline, the llm stack is imported on the first call
+    """
+    from utils.ai import get_pipeline
+
+    return get_pipeline(*args, **kwargs)
+
+
+def _load_urls():
+    # imports every urls module and with it every view
+    from django.urls import get_resolver
+
+    get_resolver().url_patterns
+
+
+def _load_llm():
+    get_pipeline()
+
+
+def _load_weather():
+    from utils.weather import weather_client
+
+    weather_client.session
+
+
+WARMUP_STEPS = (
+    ("urls", _load_urls),
+    ("llm", _load_llm),
+    ("weather", _load_weather),
+)
+
+
+def warmup():
+    """
+    Load what the first requests would otherwise load: every view
+    through the URL conf, graphbit with the default pipeline, and the
+    weather session. Only the first call does the work.
+
+    Returns the seconds each step took.
+    """
+    if not _claim():
+        return dict(_state["seconds"])
+    return _warm()
+
+
+def start_warmup():
+    """
+    run warmup() in a background thread, requests are served meanwhile
+    and ready_view answers 503 until it is done
+    """
+    if not _claim():
+        return None
+    thread = threading.Thread(target=_warm_quietly, name="warmup", daemon=True)
+    thread.start()
+    return thread
+
+
+def warmup_on_startup():
+    """
+    called by djangoapp.wsgi and djangoapp.asgi once the app is loaded,
+    runs warmup as WARM_PIPELINE_ON_STARTUP and WARMUP_IN_BACKGROUND ask
+    """
+    if not WARM_PIPELINE_ON_STARTUP:
+        return None
+    if WARMUP_IN_BACKGROUND:
+        return start_warmup()
+    return warmup()
+
+
+def _claim():
+    with _state_lock:
+        if _state["status"] in ("warming", "ready"):
+            return False
+        _state.update(status="warming", error=None)
+        return True
+
+
+def _warm():
+    seconds = {}
+    try:
+        for name, step in WARMUP_STEPS:
+            start = time.perf_counter()
+            step()
+            seconds[name] = round(time.perf_counter() - start, 4)
+    except Exception as e:
+        logging.error(f"Warmup failed. error: {str(e)}")
+        _state.update(status="failed", seconds=seconds, error=str(e))
+        raise
+    _state.update(status="ready", seconds=seconds)
+    return seconds
+
+
+def _warm_quietly():
+    try:
+        _warm()
+    except Exception:
+        pass  # logged by _warm, reported by ready_view
+
+
+def warmup_state():
+    return {
+        "status": _state["status"],
+        "seconds": dict(_state["seconds"]),
+        "error": _state["error"],
+        "llm_loaded": "graphbit" in sys.modules,
+    }
+
+
+def _database_ready():
+    try:
+        connection.ensure_connection()
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT 1")
+        return True
+    except DatabaseError as e:
+        logging.error(f"Readiness check failed. error: {str(e)}")
+        return False
+
+
+def ready_view(request):
+    """
+    GET api-v2/ready/, 200 when this process can take traffic: warmup is
+    done (or was never asked for) and the database answers, 503 otherwise
+    """
+    state = warmup_state()
+    database = _database_ready()
+    ready = database and state["status"] in ("cold", "ready")
+    return JsonResponse(
+        {"ready": ready, "database": database, "warmup": state},
+        status=200 if ready else 503,
+    )
+
+
+def _reset_state():
+    global _state_lock
+    _state.update(status="cold", seconds={}, error=None)
+    _state_lock = threading.Lock()
+
+
+if hasattr(os, "register_at_fork"):
+    # the pipelines are rebuilt after fork (see utils.ai), so is the state
+    os.register_at_fork(after_in_child=_reset_state)
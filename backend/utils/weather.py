@@ -0,0 +1,249 @@
+import os
+import time
+import hashlib
+import logging
+import threading
+from dotenv import load_dotenv
+from utils.cache import TTLCache
+from utils.metrics import registry, timed
+
+load_dotenv()
+
+WEATHER_API = os.getenv("WEATHER_API")
+WEATHER_API_URL = os.getenv(
+    "WEATHER_API_URL", "http://api.weatherapi.com/v1/current.json"
+)
+WEATHER_TIMEOUT_SECONDS = float(os.getenv("WEATHER_TIMEOUT_SECONDS", "5"))
+WEATHER_POOL_SIZE = int(os.getenv("WEATHER_POOL_SIZE", "10"))
+WEATHER_CACHE_TTL_SECONDS = int(os.getenv("WEATHER_CACHE_TTL_SECONDS", "600"))
+WEATHER_CACHE_SIZE = int(os.getenv("WEATHER_CACHE_SIZE", "512"))
+# django cache alias shared by every worker, unset keeps the cache in-process
+WEATHER_CACHE_ALIAS = os.getenv("WEATHER_CACHE_ALIAS")
+
+WEATHER_ERROR = "Failed to fetching weather data!"
+
+
+class _InFlight:
+    """
+    an upstream call other threads can wait on
+    """
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = WEATHER_ERROR
+
+
+class WeatherClient:
+    """
+    weatherapi.com client shared by the whole process.
+
+    - one pooled requests.Session with strict timeouts
+    - in-process LRU with a TTL, keyed by the normalized location,
+      plus an optional django cache shared across workers
+    - identical lookups already in flight wait for that call instead
+      of sending their own
+    - hit/miss and upstream latency counters, see stats()
+    """
+
+    def __init__(
+        self,
+        api_key=WEATHER_API,
+        url=WEATHER_API_URL,
+        timeout=WEATHER_TIMEOUT_SECONDS,
+        ttl=WEATHER_CACHE_TTL_SECONDS,
+        maxsize=WEATHER_CACHE_SIZE,
+        cache_alias=WEATHER_CACHE_ALIAS,
+    ):
+        self.api_key = api_key
+        self.url = url
+        self.timeout = timeout
+        self.ttl = ttl
+        self.cache_alias = cache_alias
+        self.cache = TTLCache(maxsize, ttl)
+        self._session = None
+        self._lock = threading.Lock()
+        self._in_flight = {}
+        self._counters = {
+            "lookups": 0,
+            "hits": 0,
+            "shared_hits": 0,
+            "misses": 0,
+            "coalesced": 0,
+            "errors": 0,
+            "upstream_seconds": 0.0,
+            "upstream_max_seconds": 0.0,
+        }
+
+    @property
+    def session(self):
+        if self._session is None:
+            # requests is imported on first use, most processes never call
+            # the weather api and shouldn't pay for loading it
+            import requests
+            from requests.adapters import HTTPAdapter
+
+            session = requests.Session()
+            adapter = HTTPAdapter(
+                pool_connections=1, pool_maxsize=WEATHER_POOL_SIZE, max_retries=0
+            )
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            self._session = session
+        return self._session
+
+    def reset(self):
+        """
+        drop pooled connections and in-flight state, used after fork
+        """
+        self._session = None
+        self._lock = threading.Lock()
+        self._in_flight = {}
+
+    @staticmethod
+    def normalize(location):
+        return " ".join(str(location).lower().split())
+
+    @timed("weather")
+    def current(self, location):
+        """
+        current weather for location as the raw weatherapi JSON text,
+        or WEATHER_ERROR
+        """
+        self._count("lookups")
+        key = self.normalize(location)
+        if not key:
+            return WEATHER_ERROR
+
+        cached = self._cached(key)
+        if cached is not None:
+            return cached
+
+        with self._lock:
+            call = self._in_flight.get(key)
+            leader = call is None
+            if leader:
+                call = _InFlight()
+                self._in_flight[key] = call
+            else:
+                self._counters["coalesced"] += 1
+
+        if not leader:
+            call.done.wait(self.timeout * 2)
+            return call.result
+
+        try:
+            call.result = self._fetch(key)
+            if call.result != WEATHER_ERROR:
+                self._store(key, call.result)
+        finally:
+            with self._lock:
+                self._in_flight.pop(key, None)
+            call.done.set()
+        return call.result
+
+    @property
+    def lookups(self):
+        """
+        total current() calls, lets callers tell whether a tool ran
+        """
+        return self._counters["lookups"]
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counters)
+        cached = stats["hits"] + stats["shared_hits"]
+        resolved = cached + stats["misses"]
+        stats["hit_rate"] = cached / resolved if resolved else 0.0
+        stats["upstream_avg_seconds"] = (
+            stats["upstream_seconds"] / stats["misses"] if stats["misses"] else 0.0
+        )
+        return stats
+
+    def _cached(self, key):
+        value = self.cache.get(key)
+        if value is not None:
+            self._count("hits")
+            return value
+
+        shared = self._shared_cache()
+        if shared is not None:
+            value = shared.get(self._shared_key(key))
+            if value is not None:
+                self._count("shared_hits")
+                self.cache.set(key, value)
+                return value
+        return None
+
+    def _store(self, key, value):
+        self.cache.set(key, value)
+        shared = self._shared_cache()
+        if shared is not None:
+            shared.set(self._shared_key(key), value, self.ttl)
+
+    def _fetch(self, key):
+        self._count("misses")
+        start = time.perf_counter()
+        try:
+            response = self.session.get(
+                self.url, params={"key": self.api_key, "q": key}, timeout=self.timeout
+            )
+            if "error" in response.json():
+                logging.error("Weather api error response")
+                self._count("errors")
+                return WEATHER_ERROR
+            return response.text
+        except Exception as e:
+            logging.error(f"Failed to call weather api. error: {str(e)}")
+            self._count("errors")
+            return WEATHER_ERROR
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                self._counters["upstream_seconds"] += elapsed
+                self._counters["upstream_max_seconds"] = max(
+                    self._counters["upstream_max_seconds"], elapsed
+                )
+
+    def _shared_cache(self):
+        if not self.cache_alias:
+            return None
+        from django.core.cache import caches
+
+        return caches[self.cache_alias]
+
+    @staticmethod
+    def _shared_key(key):
+        # stable across workers and safe for memcached style keys
+        return "weather:" + hashlib.sha1(key.encode("utf-8")).hexdigest()
+
+    def _count(self, name):
+        with self._lock:
+            self._counters[name] += 1
+
+
+weather_client = WeatherClient()
+
+
+def _collect_weather():
+    stats = weather_client.stats()
+    outcomes = ("hits", "shared_hits", "misses", "coalesced", "errors")
+    return [
+        (
+            "weather_lookups_total",
+            "counter",
+            "Weather tool lookups by outcome",
+            [({"result": name}, stats[name]) for name in outcomes],
+        ),
+        (
+            "weather_upstream_seconds_total",
+            "counter",
+            "Time spent waiting on weatherapi",
+            [({}, stats["upstream_seconds"])],
+        ),
+    ]
+
+
+registry.register_collector(_collect_weather)
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=weather_client.reset)